@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+本地 BM25 检索基准
+
+生成 N 条模拟售后段落（中文词汇 + 型号），建立索引后测量：
+- 建索引耗时、冷启动打开索引（mmap）耗时
+- 查询延迟 p50 / p95 / max（numpy 与纯 Python 两种实现）
+- 增量 add/delete 后的查询延迟（多段 + 墓碑）
+
+用法：
+    python bench_bm25.py [段落数，默认 100000]
+"""
+
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, 'src')
+
+import agent_app.knowledge.retrieval as retrieval
+from agent_app.knowledge.retrieval import BM25Index
+
+WORDS = (
+    "控制器 电机 电池 充电器 保护板 空开 线径 霍尔 刹车 断电 转把 仪表 电压 电流 功率 欠压 过流 "
+    "短路 缺相 飞车 异响 抖动 发热 续航 里程 锂电 铅酸 接线 插头 保险丝 防盗器 喇叭 大灯 转向灯 "
+    "检查 更换 测量 万用表 拆开 固定 松动 氧化 烧毁 正常 异常 显示 故障码 报警 重启 升级"
+).split()
+MODELS = ["lingbo-72182", "leiting-6018", "meidisi-7230", "zhike-4815", "e100", "n70c", "a2z"]
+
+QUERIES = [
+    "控制器 霍尔 故障", "电池欠压 报警", "刹车断电 接线", "lingbo-72182 过流", "充电器 不充电",
+    "电机 异响 抖动", "仪表 显示 故障码", "保护板 烧毁 更换", "转把 飞车", "续航 里程 锂电",
+]
+
+
+def make_passage(rng: random.Random, i: int) -> dict:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(20, 60))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(MODELS))
+    return {"id": f"doc-{i}", "source": f"manual-{i % 500}.md", "text": "，".join(words)}
+
+
+def measure(index: BM25Index, rounds: int = 20) -> dict:
+    latencies = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            started = time.perf_counter()
+            index.search(query, top_k=5)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "max": latencies[-1],
+    }
+
+
+def report(label: str, result: dict) -> None:
+    print(f"{label:<28} p50 {result['p50']:6.2f}ms  p95 {result['p95']:6.2f}ms  max {result['max']:6.2f}ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+    path = tempfile.mkdtemp(prefix="bench_bm25_")
+    try:
+        docs = [make_passage(rng, i) for i in range(n)]
+
+        started = time.perf_counter()
+        index = BM25Index(path, reload_interval=60)
+        index.add(docs)
+        index.commit()
+        print(f"建索引 {n:,} 段落: {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        index = BM25Index(path, reload_interval=60)
+        print(f"打开索引（mmap）: {(time.perf_counter() - started) * 1000:.2f}ms")
+        index.search("预热", top_k=5)
+
+        report("numpy", measure(index))
+        numpy = retrieval._numpy
+        retrieval._numpy = lambda: None
+        try:
+            report("纯 Python", measure(index, rounds=2))
+        finally:
+            retrieval._numpy = numpy
+
+        # 增量更新：新增 1% 段落、删除 1% 段落
+        index.add(make_passage(rng, n + i) for i in range(n // 100))
+        index.delete(f"doc-{i}" for i in range(0, n, 100))
+        index.commit()
+        report(f"增量后（{index.stats()['segments']} 段）", measure(index))
+
+        started = time.perf_counter()
+        index.optimize()
+        print(f"optimize: {time.perf_counter() - started:.2f}s")
+        report("optimize 后", measure(index))
+        index.close()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
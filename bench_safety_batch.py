@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+SafetyCalculator 批量计算基准
+
+对比逐条 calculate_max_bus_current（含 VehicleSpecs 校验）与向量化 calculate_batch
+的吞吐，并核对两者结果一致。
+
+用法：
+    python bench_safety_batch.py [记录数，默认 200000]
+"""
+
+import sys
+import time
+
+sys.path.insert(0, 'src')
+
+import numpy as np
+
+from agent_app.agents.validator import BOTTLENECK_COMPONENTS, SafetyCalculator, VehicleSpecs
+
+
+def make_columns(n: int, seed: int = 42):
+    """生成 n 条随机车辆参数（列式）"""
+    rng = np.random.default_rng(seed)
+    battery_type = rng.choice(np.array(["lead_acid", "lithium"]), n)
+    lead_acid = battery_type == "lead_acid"
+    return {
+        "battery_type": battery_type,
+        "voltage": rng.choice([48.0, 60.0, 72.0, 84.0, 96.0], n),
+        "capacity_ah": np.where(lead_acid, rng.choice([20.0, 30.0, 32.0, 45.0], n), np.nan),
+        "bms_current": np.where(lead_acid, np.nan, np.round(rng.uniform(20, 120, n), 1)),
+        "motor_power_rated": rng.choice([800.0, 1000.0, 1200.0, 1500.0, 2000.0, 3000.0], n),
+        "motor_type": rng.choice(np.array(["standard", "performance"]), n),
+        "wire_gauge": rng.choice([2.5, 4.0, 6.0, 8.0, 10.0], n),
+        "breaker_rating": rng.choice([40.0, 63.0, 80.0, 100.0], n),
+        "controller_max_current": np.round(rng.uniform(30, 200, n), 1),
+    }
+
+
+def row(columns, i: int):
+    record = {name: values[i].item() for name, values in columns.items()}
+    for name in ("capacity_ah", "bms_current"):
+        if record[name] != record[name]:  # NaN -> 未填写
+            record[name] = None
+    return record
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    columns = make_columns(n)
+    records = [row(columns, i) for i in range(n)]
+
+    print("=" * 60)
+    print(f"SafetyCalculator 基准：{n} 条记录")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    scalar = [SafetyCalculator.calculate_max_bus_current(VehicleSpecs(**r)) for r in records]
+    scalar_seconds = time.perf_counter() - started
+    print(f"逐条计算:   {scalar_seconds:8.3f}s  ({n / scalar_seconds:12,.0f} 条/秒)")
+
+    started = time.perf_counter()
+    batch = SafetyCalculator.calculate_batch(columns)
+    batch_seconds = time.perf_counter() - started
+    print(f"批量计算:   {batch_seconds:8.3f}s  ({n / batch_seconds:12,.0f} 条/秒)")
+    print(f"加速比:     {scalar_seconds / batch_seconds:8.1f}x")
+
+    mismatches = sum(
+        1 for i, result in enumerate(scalar)
+        if batch["safe_bus_current"][i] != result["safe_bus_current"]
+        or BOTTLENECK_COMPONENTS[batch["bottleneck"][i]] != result["bottleneck_component"]
+    )
+    print(f"结果不一致: {mismatches} 条")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+VehicleSpecs 校验开销基准
+
+对比三种方式评估候选配置的吞吐：
+1. pydantic VehicleSpecs + calculate_max_bus_current
+2. FastSpecs.create + calculate_max_bus_current
+3. FastSpecs.create + calculate_fast（结果缓存，候选配置重复时命中）
+
+用法：
+    python bench_specs_fast_path.py [候选数，默认 200000]
+"""
+
+import random
+import sys
+import time
+
+sys.path.insert(0, 'src')
+
+from agent_app.agents.validator import FastSpecs, SafetyCalculator, VehicleSpecs
+
+
+def candidates(n: int, seed: int = 42):
+    """模拟升级搜索：在有限的配件组合中生成候选配置（大量重复）"""
+    rng = random.Random(seed)
+    return [
+        {
+            "battery_type": "lithium",
+            "voltage": 72.0,
+            "bms_current": rng.choice([40.0, 60.0, 80.0, 100.0]),
+            "motor_power_rated": rng.choice([1000.0, 1500.0, 2000.0, 3000.0]),
+            "motor_type": rng.choice(["standard", "performance"]),
+            "wire_gauge": rng.choice([4.0, 6.0, 8.0, 10.0]),
+            "breaker_rating": rng.choice([63.0, 80.0, 100.0]),
+            "controller_max_current": rng.choice([100.0, 150.0, 200.0]),
+        }
+        for _ in range(n)
+    ]
+
+
+def bench(label: str, func, items) -> float:
+    started = time.perf_counter()
+    for kwargs in items:
+        func(kwargs)
+    seconds = time.perf_counter() - started
+    print(f"{label:<36} {seconds:8.3f}s  ({len(items) / seconds:12,.0f} 次/秒)")
+    return seconds
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    items = candidates(n)
+
+    print("=" * 72)
+    print(f"VehicleSpecs 快速路径基准：{n} 个候选配置")
+    print("=" * 72)
+
+    base = bench(
+        "VehicleSpecs + calculate",
+        lambda kw: SafetyCalculator.calculate_max_bus_current(VehicleSpecs(**kw)),
+        items,
+    )
+    fast = bench(
+        "FastSpecs + calculate",
+        lambda kw: SafetyCalculator.calculate_max_bus_current(FastSpecs.create(**kw)),
+        items,
+    )
+    cached = bench(
+        "FastSpecs + calculate_fast（缓存）",
+        lambda kw: SafetyCalculator.calculate_fast(FastSpecs.create(**kw)),
+        items,
+    )
+    print(f"加速比: FastSpecs {base / fast:.1f}x，FastSpecs + 缓存 {base / cached:.1f}x")
+    print(f"缓存: {SafetyCalculator.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
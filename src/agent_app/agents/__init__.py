@@ -1,14 +1,27 @@
 from .planner import planner_node
-from .executor import diagnostic_agent
+from .executor import get_diagnostic_agent
 from .collector import collector_node
+from .extractor import extractor_node
 
 # validator 中没有导出 validator_node，而是 SafetyCalculator 和 VehicleSpecs
 from .validator import SafetyCalculator, VehicleSpecs
+from .upgrade import UpgradeCatalog, UpgradeOption
 
 __all__ = [
     "planner_node",
     "diagnostic_agent",
+    "get_diagnostic_agent",
     "collector_node",
+    "extractor_node",
     "SafetyCalculator",
-    "VehicleSpecs"
+    "VehicleSpecs",
+    "UpgradeCatalog",
+    "UpgradeOption"
 ]
+
+
+def __getattr__(name: str):
+    # diagnostic_agent 延迟创建，见 executor.get_diagnostic_agent
+    if name == "diagnostic_agent":
+        return get_diagnostic_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
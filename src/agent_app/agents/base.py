@@ -1,21 +1,383 @@
 from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Dict
-from langchain_openai import ChatOpenAI
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+from langchain_core.messages import AIMessage
+from agent_app.agents.llm_cache import LLMResponseCache, get_llm_cache, make_cache_key
+from agent_app.agents.semantic_cache import SemanticCache, get_semantic_cache
+from agent_app.concurrency import run_in_threadpool
 from agent_app.settings import settings
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class AgentResult:
     ok: bool
     data: Dict[str, Any]
     error: str | None = None
 
-class BaseAgent:
-    """所有 Agent 的基类，提供 LLM 访问"""
-    def __init__(self):
-        self.llm = ChatOpenAI(
+class SlotLimiter:
+    """
+    同步与异步调用共享的并发上限
+
+    同步调用在 Condition 上阻塞等待；异步调用在事件循环中等待 Future，不占用线程池。
+    释放时同时唤醒一个同步和一个异步等待者，由它们重新竞争空位（没有抢到的继续等待），
+    因此等待中的协程被取消不会带走空位：被取消的协程如果已经收到唤醒，就把唤醒转交给下一个。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._free = threading.Condition(self._lock)
+        self._used = 0
+        # 等待中的异步调用：(事件循环, Future)
+        self._waiters: deque = deque()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def acquire(self) -> None:
+        """同步获取空位（阻塞当前线程）"""
+        with self._lock:
+            while self._used >= self.limit:
+                self._free.wait()
+            self._used += 1
+
+    async def acquire_async(self) -> None:
+        """异步获取空位（只挂起当前协程）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._used < self.limit:
+                    self._used += 1
+                    return
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._waiters.remove(waiter)
+                        woken = False
+                    except ValueError:
+                        woken = waiter[1].done() and not waiter[1].cancelled()
+                # 已经收到的唤醒交给下一个等待者；Future 被取消时由 _wake 转交
+                if woken:
+                    self._wake_next()
+                raise
+
+    def __enter__(self) -> "SlotLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._used <= 0:
+                raise ValueError("SlotLimiter released too many times")
+            self._used -= 1
+            self._free.notify()
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                return
+            loop, future = self._waiters.popleft()
+        try:
+            loop.call_soon_threadsafe(self._wake, future)
+        except RuntimeError:
+            # 等待者所在的事件循环已经关闭
+            self._wake_next()
+
+    def _wake(self, future: asyncio.Future) -> None:
+        if future.done():
+            self._wake_next()
+        else:
+            future.set_result(None)
+
+
+class LLMGateway:
+    """
+    进程级 LLM 网关
+
+    所有 Agent 共用一个模型客户端和一组 HTTP keep-alive 连接，并提供：
+    - 并发上限：同时在途的 LLM 请求数不超过 max_concurrency（同步与异步调用共享）
+    - 同步 invoke / 异步 ainvoke 两套接口
+    - 每次调用的耗时与 token 统计，见 stats()
+    - 可选的响应缓存：传入 cache 时先查缓存，命中则不发起请求
+
+    model 为空时按 settings 创建 ChatOpenAI；测试和基准可以传入本地假模型
+    （例如 langchain_core 的 FakeListChatModel）。
+    """
+
+    def __init__(self, model: Any = None, *, max_concurrency: Optional[int] = None):
+        self._model = model
+        self._model_lock = threading.Lock()
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self._slots = SlotLimiter(self.max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=1024)
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    @property
+    def model(self):
+        """底层聊天模型，首次使用时才创建"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._create_model()
+        return self._model
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self._model, "model_name", None) or settings.OPENAI_MODEL_NAME
+
+    @staticmethod
+    def _create_model():
+        """按 settings 创建 OpenAI 模型，HTTP 连接池在所有 Agent 之间共享"""
+        if settings.LLM_BACKEND == "fake":
+            from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+            return FakeListChatModel(responses=[settings.LLM_FAKE_RESPONSE])
+
+        import httpx
+        from langchain_openai import ChatOpenAI
+
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        timeout = httpx.Timeout(settings.LLM_TIMEOUT_SECONDS)
+        logger.info(f"创建 LLM 客户端: {settings.OPENAI_MODEL_NAME}（连接池上限 {settings.LLM_MAX_CONNECTIONS}）")
+        return ChatOpenAI(
             model=settings.OPENAI_MODEL_NAME,
             api_key=settings.OPENAI_API_KEY,
             base_url=settings.OPENAI_BASE_URL,
-            temperature=0
+            temperature=0,
+            http_client=httpx.Client(limits=limits, timeout=timeout),
+            http_async_client=httpx.AsyncClient(limits=limits, timeout=timeout),
         )
+
+    def _record(self, started: float, response: Any = None, failed: bool = False) -> None:
+        latency = time.perf_counter() - started
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._stats_lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self.errors += int(failed)
+            self.total_latency += latency
+            self._latencies.append(latency)
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.output_tokens += usage.get("output_tokens", 0)
+
+    def _begin(self) -> float:
+        with self._stats_lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def _cached(self, cache: Optional[LLMResponseCache], messages: Sequence[Any], kwargs: Dict[str, Any]):
+        """查询响应缓存，返回 (缓存键, 命中的响应)"""
+        if cache is None:
+            return None, None
+        key = make_cache_key(self.model_name, messages, kwargs)
+        return key, self._hit(cache.get(key))
+
+    def _hit(self, text: Optional[str]) -> Optional[AIMessage]:
+        if text is None:
+            return None
+        with self._stats_lock:
+            self.cache_hits += 1
+        return AIMessage(content=text, response_metadata={"cache_hit": True})
+
+    async def _acached(self, cache: Optional[LLMResponseCache], messages: Sequence[Any], kwargs: Dict[str, Any]):
+        """异步查询响应缓存：内存在事件循环中直接查询，磁盘交给线程池"""
+        if cache is None:
+            return None, None
+        key = make_cache_key(self.model_name, messages, kwargs)
+        text = cache.get_memory(key)
+        if text is None:
+            text = await run_in_threadpool(cache.get_disk, key) if cache.has_disk else cache.get_disk(key)
+        return key, self._hit(text)
+
+    @staticmethod
+    def _store(cache: Optional[LLMResponseCache], key: Optional[str], response: Any) -> None:
+        if cache is not None and key is not None and isinstance(getattr(response, "content", None), str):
+            cache.set(key, response.content)
+
+    @staticmethod
+    async def _astore(cache: Optional[LLMResponseCache], key: Optional[str], response: Any) -> None:
+        if cache is not None and key is not None and isinstance(getattr(response, "content", None), str):
+            cache.set_memory(key, response.content)
+            if cache.has_disk:
+                await run_in_threadpool(cache.set_disk, key, response.content)
+
+    def invoke(self, messages: Sequence[Any], *, cache: Optional[LLMResponseCache] = None, **kwargs: Any) -> Any:
+        """同步调用 LLM"""
+        key, hit = self._cached(cache, messages, kwargs)
+        if hit is not None:
+            return hit
+        with self._slots:
+            started = self._begin()
+            try:
+                response = self.model.invoke(messages, **kwargs)
+            except Exception:
+                self._record(started, failed=True)
+                raise
+            self._record(started, response)
+        self._store(cache, key, response)
+        return response
+
+    async def ainvoke(self, messages: Sequence[Any], *, cache: Optional[LLMResponseCache] = None, **kwargs: Any) -> Any:
+        """异步调用 LLM（并发已满时在事件循环中等待空位，不阻塞事件循环也不占用线程池）"""
+        key, hit = await self._acached(cache, messages, kwargs)
+        if hit is not None:
+            return hit
+        await self._slots.acquire_async()
+        try:
+            started = self._begin()
+            try:
+                response = await self.model.ainvoke(messages, **kwargs)
+            except Exception:
+                self._record(started, failed=True)
+                raise
+            self._record(started, response)
+        finally:
+            self._slots.release()
+        await self._astore(cache, key, response)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """调用统计"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            return {
+                "calls": self.calls,
+                "cache_hits": self.cache_hits,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "avg_latency_ms": round(self.total_latency / self.calls * 1000, 2) if self.calls else 0.0,
+                "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2) if latencies else 0.0,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+# 全局单例
+_llm_gateway: Optional[LLMGateway] = None
+_llm_gateway_lock = threading.Lock()
+
+def get_llm_gateway() -> LLMGateway:
+    """获取 LLM 网关单例"""
+    global _llm_gateway
+    if _llm_gateway is None:
+        with _llm_gateway_lock:
+            if _llm_gateway is None:
+                _llm_gateway = LLMGateway()
+    return _llm_gateway
+
+def set_llm_gateway(gateway: Optional[LLMGateway]) -> None:
+    """替换 LLM 网关（测试、基准或切换后端时使用），None 表示恢复默认"""
+    global _llm_gateway
+    with _llm_gateway_lock:
+        _llm_gateway = gateway
+
+class BaseAgent:
+    """所有 Agent 的基类，通过共享的 LLM 网关访问模型"""
+
+    # 是否对本 Agent 的 LLM 调用启用响应缓存（输出依赖外部状态的 Agent 应关闭）
+    use_llm_cache: bool = True
+    # 是否对本 Agent 的自由文本问答（ask_llm）启用语义近重复缓存
+    use_semantic_cache: bool = True
+
+    @property
+    def llm(self) -> LLMGateway:
+        return get_llm_gateway()
+
+    def call_llm(self, messages: Sequence[Any], **kwargs: Any) -> Any:
+        """调用 LLM（按 use_llm_cache 决定是否使用响应缓存）"""
+        return self.llm.invoke(messages, cache=get_llm_cache() if self.use_llm_cache else None, **kwargs)
+
+    async def acall_llm(self, messages: Sequence[Any], **kwargs: Any) -> Any:
+        """call_llm 的异步版本"""
+        return await self.llm.ainvoke(messages, cache=get_llm_cache() if self.use_llm_cache else None, **kwargs)
+
+    def _semantic_lookup(
+        self, question: str, context: Optional[Mapping[str, Any]]
+    ) -> Tuple[Optional[SemanticCache], Optional[AIMessage]]:
+        """查询语义缓存，返回 (缓存, 命中的响应)"""
+        cache = get_semantic_cache() if self.use_semantic_cache else None
+        if cache is None:
+            return None, None
+        hit = cache.get(question, context)
+        if hit is None:
+            return cache, None
+        metadata = {"cache_hit": True, "semantic_similarity": hit.similarity, "cached_question": hit.question}
+        return cache, AIMessage(content=hit.answer, response_metadata=metadata)
+
+    @staticmethod
+    def _semantic_store(
+        cache: Optional[SemanticCache], question: str, context: Optional[Mapping[str, Any]], response: Any
+    ) -> None:
+        if cache is not None and isinstance(getattr(response, "content", None), str):
+            cache.set(question, response.content, context)
+
+    def ask_llm(
+        self,
+        question: str,
+        messages: Sequence[Any],
+        *,
+        context: Optional[Mapping[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        回答客户的自由文本：同义改写的问题先从语义缓存取回答，未命中再调用 LLM
+
+        Args:
+            question: 客户原话（用于近重复匹配）
+            messages: 发给 LLM 的完整消息
+            context: 影响回答的上下文，通常为 semantic_context(customer_info, ...)
+        """
+        cache, hit = self._semantic_lookup(question, context)
+        if hit is not None:
+            if cache.needs_flush:
+                cache.flush()
+            return hit
+        response = self.call_llm(messages, **kwargs)
+        self._semantic_store(cache, question, context, response)
+        return response
+
+    async def aask_llm(
+        self,
+        question: str,
+        messages: Sequence[Any],
+        *,
+        context: Optional[Mapping[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """ask_llm 的异步版本（语义缓存只在事件循环中查内存，落盘交给线程池）"""
+        cache, hit = self._semantic_lookup(question, context)
+        if hit is not None:
+            if cache.needs_flush:
+                await run_in_threadpool(cache.flush)
+            return hit
+        response = await self.acall_llm(messages, **kwargs)
+        if cache is not None and cache.has_disk:
+            await run_in_threadpool(self._semantic_store, cache, question, context, response)
+        else:
+            self._semantic_store(cache, question, context, response)
+        return response
@@ -0,0 +1,260 @@
+"""
+SOP 步骤校验 - 确定性规则优先，LLM 只处理模糊回复
+
+SOP 中的步骤可以声明机器可判定的校验规则：
+- check_logic.type == "range_check"：从回复中提取数值，按标称值的比例区间判断
+  （例如 72V 电池显示应在 min_ratio × 72 ~ max_ratio × 72 之间）
+- expected_answer：肯定回复的关键词列表，结合否定词判断"是/否"
+
+规则的判定结果为 PASS / FAIL / AMBIGUOUS，只有 AMBIGUOUS（例如"插了但还是不转"、
+没有给出数值）才调用 LLM。没有规则的步骤返回 None，由调用方沿用默认流程。
+规则按 check_logic.type 注册（register_check），新增规则类型不需要修改 DiagnosticAgent。
+
+所有规则都是纯函数，单次判定为微秒级；stats() 统计无需 LLM 即可判定的轮次比例。
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence
+
+from agent_app.knowledge.sop import CompiledStep
+
+logger = logging.getLogger(__name__)
+
+PASS = "pass"
+FAIL = "fail"
+AMBIGUOUS = "ambiguous"
+
+
+@dataclass(frozen=True)
+class CheckResult:
+    """一次校验的结果"""
+
+    outcome: str                 # PASS / FAIL / AMBIGUOUS
+    rule: str                    # 做出判定的规则（range_check / expected_answer / llm）
+    value: Any = None            # 提取到的值，用于格式化 on_fail.message 中的 {value}
+    reason: str = ""
+
+    @property
+    def settled(self) -> bool:
+        return self.outcome != AMBIGUOUS
+
+
+# check_logic.type -> 规则函数 (步骤, 回复, 状态) -> CheckResult | None
+CheckFunc = Callable[[CompiledStep, str, Mapping[str, Any]], Optional[CheckResult]]
+_CHECKS: Dict[str, CheckFunc] = {}
+
+
+def register_check(check_type: str) -> Callable[[CheckFunc], CheckFunc]:
+    """注册 check_logic.type 对应的规则函数"""
+    def decorator(func: CheckFunc) -> CheckFunc:
+        _CHECKS[check_type] = func
+        return func
+    return decorator
+
+
+def _normalize(text: str) -> str:
+    """NFKC 归一化（全角转半角）、小写并去掉空白"""
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+_NUMBER = re.compile(r"(\d+(?:\.\d+)?)(v|伏)?")
+# 仪表读数的引导词："72V电池显示70" 中 72 是标称值，70 才是读数
+_READING = re.compile(r"(?:显示|表上|读数|测出|测得|只有|才)(?:是|为|了|的|有)?(\d+(?:\.\d+)?)")
+
+
+def extract_number(text: str) -> Optional[float]:
+    """
+    从回复中提取一个数值
+
+    只有一个数值时直接返回；有多个时只认"显示/表上"等引导词后的唯一读数。没有引导词时
+    （"72V电池70"）无法区分标称值与读数，返回 None，交给 LLM 或重新提问。
+    """
+    text = _normalize(text)
+    matches = _NUMBER.findall(text)
+    values = {float(number) for number, _ in matches}
+    if len(values) == 1:
+        return values.pop()
+    readings = {float(number) for number in _READING.findall(text)}
+    if len(readings) == 1:
+        return readings.pop()
+    return None
+
+
+@register_check("range_check")
+def range_check(step: CompiledStep, reply: str, state: Mapping[str, Any]) -> Optional[CheckResult]:
+    """数值落在 [min_ratio × 标称值, max_ratio × 标称值] 内为 PASS"""
+    logic = step.check_logic
+    nominal = (state.get("customer_info") or {}).get("battery_voltage") or logic.get("nominal")
+    if not nominal:
+        return None
+    value = extract_number(reply)
+    if value is None:
+        return CheckResult(AMBIGUOUS, "range_check", reason="回复中没有唯一的数值")
+    low, high = nominal * logic.get("min_ratio", 0), nominal * logic.get("max_ratio", float("inf"))
+    if low <= value <= high:
+        return CheckResult(PASS, "range_check", value, f"{value:g} 在 {low:.1f}~{high:.1f} 之间")
+    return CheckResult(FAIL, "range_check", value, f"{value:g} 不在 {low:.1f}~{high:.1f} 之间")
+
+
+# 否定词，以及含否定字但表示肯定的惯用语（判断前先去掉）
+NEGATIONS = ("没有", "没", "不", "未", "否", "还没")
+AFFIRMATIVE_IDIOMS = ("没问题", "没毛病", "不错", "没错")
+# 含否定字但表示不确定的惯用语，不能当作否定回答
+UNCERTAIN_IDIOMS = ("不知道", "不清楚", "不确定", "不记得", "不太清楚", "不太确定", "不懂", "说不准", "说不好")
+
+
+def expected_answer_check(step: CompiledStep, reply: str, state: Mapping[str, Any]) -> Optional[CheckResult]:
+    """
+    关键词 + 否定词判断肯定/否定回复
+
+    - 否定词紧挨在关键词前（"没插紧"、"不是"）或只有否定词：FAIL
+    - 只有关键词：PASS
+    - 都没有，关键词与不相邻的否定词同时出现（"插紧了但还是不转"），
+      或表示不确定（"不知道"、"不太清楚"）：AMBIGUOUS
+    """
+    text = _normalize(reply)
+    if any(idiom in text for idiom in UNCERTAIN_IDIOMS):
+        return CheckResult(AMBIGUOUS, "expected_answer", reply, "用户不确定")
+    for idiom in AFFIRMATIVE_IDIOMS:
+        text = text.replace(idiom, "是")
+    keywords = [_normalize(k) for k in step.expected_answer]
+    negated = any(neg + kw in text or neg + "是" + kw in text for kw in keywords for neg in NEGATIONS)
+    if negated:
+        return CheckResult(FAIL, "expected_answer", reply, "否定回答")
+    has_keyword = any(kw in text for kw in keywords)
+    has_negation = any(neg in text for neg in NEGATIONS)
+    if has_keyword and not has_negation:
+        return CheckResult(PASS, "expected_answer", reply, "肯定回答")
+    if has_negation and not has_keyword:
+        return CheckResult(FAIL, "expected_answer", reply, "否定回答")
+    return CheckResult(AMBIGUOUS, "expected_answer", reply, "无法从关键词判断")
+
+
+_LLM_SYSTEM_PROMPT = (
+    "你是电动车售后诊断助手，负责判断用户的回复是否满足当前排查步骤的要求。"
+    "只回答一个词：PASS（满足）、FAIL（不满足）或 UNKNOWN（无法判断）。"
+)
+
+
+class CheckEngine:
+    """
+    步骤校验引擎
+
+    Args:
+        llm_fallback: 规则无法判定时是否调用 LLM；关闭时模糊回复按"无法判定"处理
+    """
+
+    def __init__(self, *, llm_fallback: bool = True):
+        self.llm_fallback = llm_fallback
+        self._lock = threading.Lock()
+        self.turns = 0              # 有规则的轮次
+        self.rule_settled = 0       # 规则直接判定的轮次
+        self.llm_calls = 0
+        self.llm_settled = 0
+        self.llm_errors = 0
+        self.outcomes: Dict[str, int] = {PASS: 0, FAIL: 0, AMBIGUOUS: 0}
+
+    def evaluate(self, step: CompiledStep, reply: str, state: Mapping[str, Any]) -> Optional[CheckResult]:
+        """
+        用确定性规则校验回复
+
+        Returns:
+            CheckResult；步骤没有可执行的规则时返回 None
+        """
+        result = None
+        check_type = (step.check_logic or {}).get("type")
+        if check_type in _CHECKS:
+            result = _CHECKS[check_type](step, reply, state)
+        elif step.expected_answer:
+            result = expected_answer_check(step, reply, state)
+        if result is None:
+            return None
+        with self._lock:
+            self.turns += 1
+            self.rule_settled += int(result.settled)
+        return result
+
+    def _llm_messages(self, step: CompiledStep, reply: str) -> List[Any]:
+        expectation = "、".join(step.expected_answer) or dict(step.check_logic or {})
+        return [
+            ("system", _LLM_SYSTEM_PROMPT),
+            ("human", f"步骤：{step.title}\n问题：{step.prompt}\n期望：{expectation}\n用户回复：{reply}"),
+        ]
+
+    def _llm_result(self, result: CheckResult, response: Any) -> CheckResult:
+        verdict = str(getattr(response, "content", "")).strip().upper()
+        outcome = PASS if verdict.startswith("PASS") else FAIL if verdict.startswith("FAIL") else AMBIGUOUS
+        with self._lock:
+            self.llm_settled += int(outcome != AMBIGUOUS)
+        return CheckResult(outcome, "llm", result.value, verdict[:50])
+
+    def _llm_failed(self, result: CheckResult, error: Exception) -> CheckResult:
+        logger.warning(f"LLM 校验失败，按无法判定处理: {error}")
+        with self._lock:
+            self.llm_errors += 1
+        return result
+
+    def _record_outcome(self, result: CheckResult) -> CheckResult:
+        with self._lock:
+            self.outcomes[result.outcome] += 1
+        return result
+
+    def _should_escalate(self, result: CheckResult) -> bool:
+        if result.settled or not self.llm_fallback:
+            return False
+        with self._lock:
+            self.llm_calls += 1
+        return True
+
+    def resolve(
+        self,
+        step: CompiledStep,
+        reply: str,
+        result: CheckResult,
+        call_llm: Callable[[Sequence[Any]], Any],
+    ) -> CheckResult:
+        """
+        规则无法判定时交给 LLM（call_llm 通常是 BaseAgent.call_llm）
+
+        判定只走逐字匹配的 LLMResponseCache，不能用语义近重复缓存：
+        "指示灯一直亮着"与"一直灭着"字面相似，但判定相反。
+        """
+        if self._should_escalate(result):
+            try:
+                result = self._llm_result(result, call_llm(self._llm_messages(step, reply)))
+            except Exception as e:
+                result = self._llm_failed(result, e)
+        return self._record_outcome(result)
+
+    async def aresolve(
+        self,
+        step: CompiledStep,
+        reply: str,
+        result: CheckResult,
+        acall_llm: Callable[[Sequence[Any]], Awaitable[Any]],
+    ) -> CheckResult:
+        """resolve 的异步版本"""
+        if self._should_escalate(result):
+            try:
+                result = self._llm_result(result, await acall_llm(self._llm_messages(step, reply)))
+            except Exception as e:
+                result = self._llm_failed(result, e)
+        return self._record_outcome(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """规则判定比例等监控指标"""
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "rule_settled": self.rule_settled,
+                "llm_calls": self.llm_calls,
+                "llm_settled": self.llm_settled,
+                "llm_errors": self.llm_errors,
+                "outcomes": dict(self.outcomes),
+                "rule_settled_ratio": round(self.rule_settled / self.turns, 4) if self.turns else 0.0,
+            }
@@ -1,5 +1,7 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+from langchain_core.runnables import RunnableConfig
 from agent_app.graph.state import AgentState
+from agent_app.tools.prefetch import get_prefetcher
 
 def check_missing_info(info: Dict) -> List[str]:
     """[cite: 10-30] 检查核心字段缺失"""
@@ -23,7 +25,20 @@ def check_missing_info(info: Dict) -> List[str]:
         
     return missing
 
-def collector_node(state: AgentState) -> Dict:
+def prefetch_compatibility(info: Dict, config: Optional[RunnableConfig]) -> None:
+    """信息刚收集完整时，提前在后台查询 step_2_match 需要的兼容性结果"""
+    prefetcher = get_prefetcher()
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    if prefetcher is None or not thread_id:
+        return
+    prefetcher.start(
+        thread_id,
+        info["vehicle_model"],
+        info["controller_model"],
+        info.get("controller_brand"),
+    )
+
+def collector_node(state: AgentState, config: Optional[RunnableConfig] = None) -> Dict:
     """Collector Agent 的简单实现"""
     info = state.get("customer_info", {})
     missing_fields = check_missing_info(info)
@@ -36,7 +51,13 @@ def collector_node(state: AgentState) -> Dict:
             "is_info_complete": False
         }
     else:
+        if not state.get("is_info_complete"):
+            prefetch_compatibility(info, config)
         return {
             "messages": [("assistant", "信息收集完整，开始为您排查...")],
             "is_info_complete": True
-        }
\ No newline at end of file
+        }
+
+async def acollector_node(state: AgentState, config: Optional[RunnableConfig] = None) -> Dict:
+    """collector_node 的异步版本（纯内存计算，预取在后台线程池中执行）"""
+    return collector_node(state, config)
@@ -1,258 +1,473 @@
-import yaml
-from pathlib import Path
-from typing import Dict, Any
+import asyncio
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 import json
-from langchain_core.prompts import ChatPromptTemplate
+from concurrent.futures import Future
+from langchain_core.runnables import RunnableConfig
 from agent_app.agents.base import BaseAgent
+from agent_app.agents.checks import AMBIGUOUS, FAIL, CheckEngine, CheckResult
+from agent_app.agents.planner import MODE_RESOLVED
 from agent_app.graph.state import AgentState
+from agent_app.knowledge.loader import get_template_cache
+from agent_app.knowledge.sop import CompiledSOP, CompiledStep, SOPCompileError, compile_sop
 from agent_app.tools import get_mcp_client
+from agent_app.settings import settings
+from agent_app.tools.prefetch import get_prefetcher
 
 logger = logging.getLogger(__name__)
 
+# SOP 中可以配置的 MCP 工具（编译 SOP 时校验）
+SUPPORTED_MCP_TOOLS = frozenset({"query_controller_compatibility"})
+
+SOP_TEMPLATE = "sop_diagnostic"
+
+# 等待执行的 MCP 工具步骤：(步骤下标, 本轮已生成的回复片段)
+Pending = Tuple[int, List[str]]
+
+# on_fail.message 中包含 {value} 的括号注释，以及按句读切分的分句
+_VALUE_PAREN = re.compile(r"[（(][^（）()]*\{value\}[^（）()]*[）)]")
+_SENTENCE = re.compile(r"[^。！？；]*[。！？；]?")
+
+
+def format_fail_message(message: Optional[str], value: Any) -> Optional[str]:
+    """
+    填充 on_fail.message 中的 {value}
+
+    没有提取到值时（例如模糊回复经 LLM 判定为失败）去掉包含 {value} 的括号注释或分句，
+    不输出"显示为NoneV"或未填充的占位符；去掉后没有内容时返回 None，由调用方使用默认话术。
+    """
+    if not message or "{value}" not in message:
+        return message
+    if value is not None and value != "":
+        return message.replace("{value}", f"{value:g}" if isinstance(value, float) else str(value))
+    message = _VALUE_PAREN.sub("", message)
+    message = "".join(part for part in _SENTENCE.findall(message) if "{value}" not in part)
+    return message.strip() or None
+
+
 class DiagnosticAgent(BaseAgent):
     def __init__(self):
         super().__init__()
-        self.sop_config = self._load_sop_config()
+        self._sop_sha256: Optional[str] = None
+        # 配置错误（缺少 prompt、跳转目标不存在、未知工具）在这里抛出 SOPCompileError
+        self._refresh_sop()
         self.mcp_client = get_mcp_client()
+        self.checks = CheckEngine(llm_fallback=settings.CHECK_LLM_FALLBACK)
+
+    def _refresh_sop(self) -> None:
+        """
+        从模板缓存获取 SOP，模板内容变化时重新编译
+
+        运行中修改的模板编译失败时记录错误并继续使用旧版本。
+        """
+        entry = get_template_cache().entry(SOP_TEMPLATE)
+        if entry.sha256 == self._sop_sha256:
+            return
+        try:
+            sop = compile_sop(entry.data, tools=SUPPORTED_MCP_TOOLS)
+        except SOPCompileError as e:
+            if self._sop_sha256 is None:
+                raise
+            logger.error(f"SOP 模板更新后编译失败，继续使用旧版本: {e}")
+            self._sop_sha256 = entry.sha256
+            return
+        if self._sop_sha256 is not None:
+            logger.info(f"SOP 模板已更新: {entry.sha256[:12]}")
+        self.sop_config: Dict[str, Any] = entry.data
+        self.sop: CompiledSOP = sop
+        self.sop_version = entry.sha256
+        self._sop_sha256 = entry.sha256
+
+    def current_sop(self) -> Tuple[CompiledSOP, str]:
+        """当前使用的编译后 SOP 及其版本（模板内容哈希），供 planner 使用"""
+        self._refresh_sop()
+        return self.sop, self.sop_version
+
+    def _mcp_tool_params(self, step: CompiledStep, state: AgentState) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        解析 MCP 工具调用参数（工具名称已在编译 SOP 时校验）
+
+        Returns:
+            (参数, 错误结果)：参数缺失时返回 (None, 错误结果)
+        """
+        logger.info(f"执行 MCP 工具: {step.tool.name}")
+
+        # 从状态中获取参数
+        customer_info = state.get("customer_info", {})
+        vehicle_model = customer_info.get("vehicle_model")
+        controller_model = customer_info.get("controller_model")
 
-    def _load_sop_config(self):
-        """加载 YAML 配置"""
-        # __file__ 是 .../src/agent_app/agents/executor.py
-        # parent 是 .../src/agent_app/agents
-        # parent.parent 是 .../src/agent_app
-        path = Path(__file__).parent.parent / "knowledge/templates/sop_diagnostic.yaml"
-        with open(path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        if not vehicle_model or not controller_model:
+            logger.warning("缺少必要参数：vehicle_model 或 controller_model")
+            return None, {
+                "success": False,
+                "error": "缺少车型或控制器型号信息",
+                "data": None
+            }
 
-    def _execute_mcp_tool(self, step: Dict[str, Any], state: AgentState) -> Dict[str, Any]:
+        return {
+            "vehicle_model": vehicle_model,
+            "controller_model": controller_model,
+            "controller_brand": customer_info.get("controller_brand")
+        }, None
+
+    @staticmethod
+    def _session_id(config: Optional[RunnableConfig]) -> Optional[str]:
+        return (config or {}).get("configurable", {}).get("thread_id")
+
+    @staticmethod
+    def _take_prefetched(session_id: Optional[str], params: Dict[str, Any]) -> Optional[Future]:
+        """取出 collector 阶段为本会话预取的查询结果"""
+        prefetcher = get_prefetcher()
+        if prefetcher is None or not session_id:
+            return None
+        future = prefetcher.take(session_id, **params)
+        if future is not None:
+            logger.info(f"使用预取的兼容性查询结果: 会话={session_id}")
+        return future
+
+    @staticmethod
+    def _discard_prefetched(session_id: Optional[str], response: Dict[str, Any]) -> Dict[str, Any]:
+        """诊断流程结束时丢弃未使用的预取"""
+        prefetcher = get_prefetcher()
+        if prefetcher is not None and session_id and response.get("diagnostic_result"):
+            prefetcher.discard(session_id)
+        return response
+
+    def _execute_mcp_tool(self, step: CompiledStep, state: AgentState, session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         执行 MCP 工具调用
 
         Args:
             step: 当前步骤配置
             state: 当前状态
+            session_id: 会话 ID，用于取出预取结果
 
         Returns:
             工具调用结果
         """
-        tool_config = step.get("mcp_tool", {})
-        tool_name = tool_config.get("name")
-
-        logger.info(f"执行 MCP 工具: {tool_name}")
-
-        if tool_name == "query_controller_compatibility":
-            # 从状态中获取参数
-            customer_info = state.get("customer_info", {})
-            vehicle_model = customer_info.get("vehicle_model")
-            controller_model = customer_info.get("controller_model")
-            controller_brand = customer_info.get("controller_brand")
-
-            if not vehicle_model or not controller_model:
-                logger.warning("缺少必要参数：vehicle_model 或 controller_model")
-                return {
-                    "success": False,
-                    "error": "缺少车型或控制器型号信息",
-                    "data": None
-                }
-
-            # 调用 MCP 工具
-            try:
-                result = self.mcp_client.query_controller_compatibility(
-                    vehicle_model=vehicle_model,
-                    controller_model=controller_model,
-                    controller_brand=controller_brand
-                )
-
-                logger.info(f"MCP 工具调用成功: {json.dumps(result, ensure_ascii=False)}")
+        params, error = self._mcp_tool_params(step, state)
+        if error:
+            return error
+
+        # 调用 MCP 工具（优先使用预取结果）
+        try:
+            prefetched = self._take_prefetched(session_id, params)
+            if prefetched is not None:
+                result = prefetched.result()
+            else:
+                result = self.mcp_client.query_controller_compatibility(**params)
+        except Exception as e:
+            logger.error(f"MCP 工具调用失败: {e}", exc_info=True)
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
 
-                return {
-                    "success": True,
-                    "error": None,
-                    "data": result
-                }
-            except Exception as e:
-                logger.error(f"MCP 工具调用失败: {e}", exc_info=True)
-                return {
-                    "success": False,
-                    "error": str(e),
-                    "data": None
-                }
-        else:
-            logger.error(f"未知的 MCP 工具: {tool_name}")
+        logger.info(f"MCP 工具调用成功: {json.dumps(result, ensure_ascii=False)}")
+        return {
+            "success": True,
+            "error": None,
+            "data": result
+        }
+
+    async def _aexecute_mcp_tool(self, step: CompiledStep, state: AgentState, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """_execute_mcp_tool 的异步版本，使用 MCP 客户端的异步连接池"""
+        params, error = self._mcp_tool_params(step, state)
+        if error:
+            return error
+
+        try:
+            prefetched = self._take_prefetched(session_id, params)
+            if prefetched is not None:
+                result = await asyncio.wrap_future(prefetched)
+            else:
+                result = await self.mcp_client.aquery_controller_compatibility(**params)
+        except Exception as e:
+            logger.error(f"MCP 工具调用失败: {e}", exc_info=True)
             return {
                 "success": False,
-                "error": f"未知的工具: {tool_name}",
+                "error": str(e),
                 "data": None
             }
 
-    def invoke(self, state: AgentState) -> Dict[str, Any]:
+        logger.info(f"MCP 工具调用成功: {json.dumps(result, ensure_ascii=False)}")
+        return {
+            "success": True,
+            "error": None,
+            "data": result
+        }
+
+    def invoke(self, state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
         """执行诊断逻辑"""
+        self._refresh_sop()
+        session_id = self._session_id(config)
+        step, reply, check = self._check_reply(state)
+        if check is not None:
+            check = self.checks.resolve(step, reply, check, self.call_llm)
+        plan = self._plan_steps(state)
+        response, pending = self._advance(state, check, plan)
+        # 按计划连续执行自动查询步骤，直到需要客户回复
+        while pending is not None:
+            tool_step_idx, parts = pending
+            tool_result = self._execute_mcp_tool(self.sop.steps[tool_step_idx], state, session_id)
+            response, pending = self._handle_tool_result(tool_step_idx, tool_result, parts, plan)
+        return self._discard_prefetched(session_id, response)
+
+    async def ainvoke(self, state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        """执行诊断逻辑（异步版本，供 graph.ainvoke 使用）"""
+        self._refresh_sop()
+        session_id = self._session_id(config)
+        step, reply, check = self._check_reply(state)
+        if check is not None:
+            check = await self.checks.aresolve(step, reply, check, self.acall_llm)
+        plan = self._plan_steps(state)
+        response, pending = self._advance(state, check, plan)
+        while pending is not None:
+            tool_step_idx, parts = pending
+            tool_result = await self._aexecute_mcp_tool(self.sop.steps[tool_step_idx], state, session_id)
+            response, pending = self._handle_tool_result(tool_step_idx, tool_result, parts, plan)
+        return self._discard_prefetched(session_id, response)
+
+    def _plan_steps(self, state: AgentState) -> Dict[str, Dict[str, Any]]:
+        """planner_node 生成的步骤计划；没有计划或计划基于其他 SOP 版本时返回空（逐步执行）"""
+        plan = state.get("plan")
+        if not plan or not plan.get("key", "").startswith(self.sop_version[:16]):
+            return {}
+        return plan.get("steps") or {}
+
+    def _check_reply(self, state: AgentState) -> Tuple[Optional[CompiledStep], str, Optional[CheckResult]]:
+        """
+        用步骤声明的规则校验用户对当前步骤的回复（不包含 IO）
+
+        Returns:
+            (当前步骤, 回复, 校验结果)：不是用户回复或步骤没有规则时校验结果为 None
+        """
+        step = self.sop.step(state.get("current_step", 0))
+        last_message = state["messages"][-1]
+        if step is None or last_message.type != "human":
+            return None, "", None
+        reply = last_message.content if isinstance(last_message.content, str) else str(last_message.content)
+        return step, reply, self.checks.evaluate(step, reply, state)
+
+    def _advance(
+        self,
+        state: AgentState,
+        check: Optional[CheckResult] = None,
+        plan: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Pending]]:
+        """
+        推进 SOP 流程（不包含 IO）
+
+        Args:
+            state: 当前状态
+            check: 用户回复的校验结果（已经过 LLM 兜底），None 表示当前步骤没有规则、按通过处理
+            plan: 步骤计划（见 planner.py），None 表示逐步执行
+
+        Returns:
+            (response, pending)：
+            - 无需调用工具时返回 (响应, None)
+            - 需要调用 MCP 工具时返回 (None, (步骤索引, 已生成的回复片段))，由调用方执行工具后
+              交给 _handle_tool_result 处理
+        """
         current_step_idx = state.get("current_step", 0)
-        steps = self.sop_config["steps"]
+        sop = self.sop
+        plan = plan or {}
 
-        logger.info(f"DiagnosticAgent 执行 - 当前步骤: {current_step_idx}/{len(steps)}")
+        logger.info(f"DiagnosticAgent 执行 - 当前步骤: {current_step_idx}/{len(sop)}")
 
         # 1. 检查流程是否结束
-        if current_step_idx >= len(steps):
+        step = sop.step(current_step_idx)
+        if step is None:
             logger.info("诊断流程已完成")
             return {
                 "messages": [("assistant", "标准诊断流程已结束。")],
                 "diagnostic_result": "completed"
-            }
-
-        step = steps[current_step_idx]
-        logger.debug(f"当前步骤配置: {step}")
-
-        # 检查 prompt 字段是否存在
-        if "prompt" not in step:
-            logger.error(f"步骤 {current_step_idx} 缺少 'prompt' 字段: {step}")
-            return {
-                "messages": [("assistant", f"配置错误：步骤 {step.get('id', current_step_idx)} 缺少提示信息")],
-                "diagnostic_result": "error"
-            }
+            }, None
 
-        # 2. 生成 LLM 的执行 Prompt
-        # 这里我们利用 LLM 来判断用户的上一条回复是否满足了当前步骤的要求
-        # 如果是刚进入该步骤，则直接输出 Prompt
+        logger.debug(f"当前步骤: {step.id}")
 
         last_message = state["messages"][-1]
         logger.debug(f"最后一条消息类型: {last_message.type}")
 
-        if last_message.type == "human":
-            # 用户回复了，需要校验逻辑
-            logger.info(f"用户已回复，准备进入下一步")
-
-            # TODO: 这里应该调用 LLM 进行校验
-            # validation_prompt = ChatPromptTemplate.from_template(...)
-            # result = self.llm.invoke(...)
-
-            # 简化逻辑：假设通过，进入下一步
-            next_step_idx = current_step_idx + 1
-            logger.info(f"进入下一步: {next_step_idx}")
+        if last_message.type != "human":
+            # 刚进入诊断，从当前步骤开始执行
+            logger.info(f"首次进入步骤 {current_step_idx}")
+            return self._enter(current_step_idx, [], plan)
+
+        # 用户回复了，按校验结果走 on_fail / on_success
+        if check is not None and check.outcome == FAIL:
+            logger.info(f"步骤 {step.id} 校验未通过（{check.rule}: {check.reason}）")
+            return self._enter_fail(step, check, [], plan)
+        if check is not None and check.outcome == AMBIGUOUS:
+            logger.info(f"步骤 {step.id} 无法判定回复，重新提问")
+            prompt = plan.get(str(step.index), {}).get("prompt", step.prompt)
+            return {
+                "messages": [("assistant", f"抱歉，没能确认您的回答。{prompt}")],
+                "current_step": current_step_idx
+            }, None
+
+        # 校验通过（或步骤没有规则），进入 on_success.next（编译时已解析为下标）
+        logger.info(f"用户已回复，准备进入下一步")
+        return self._enter_next(step, [], plan)
+
+    def _enter(
+        self,
+        index: Optional[int],
+        parts: List[str],
+        plan: Dict[str, Dict[str, Any]],
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Pending]]:
+        """
+        从步骤 index 开始执行：计划中已判定的步骤直接完成，遇到 MCP 工具步骤时交给调用方，
+        遇到需要客户回答的步骤时输出问题。各步骤的输出合并为一条回复。
 
-            if next_step_idx >= len(steps):
-                # 已经是最后一步，返回完成消息
+        Args:
+            index: 步骤下标，None 表示流程结束
+            parts: 本轮已生成的回复片段
+        """
+        # 最多经过每个步骤一次，防止已判定步骤之间的循环跳转
+        for _ in range(len(self.sop) + 1):
+            if index is None:
                 logger.info("已到达最后一步，诊断完成")
+                parts.append("诊断步骤已全部完成，感谢您的配合！")
                 return {
-                    "messages": [("assistant", "诊断步骤已全部完成，感谢您的配合！")],
-                    "current_step": next_step_idx,
+                    "messages": [("assistant", "\n\n".join(parts))],
+                    "current_step": self.sop.end_index,
                     "diagnostic_result": "completed"
-                }
-            else:
-                # 输出下一步的问题
-                next_step = steps[next_step_idx]
-
-                # 检查下一步是否有 prompt
-                if "prompt" not in next_step:
-                    logger.error(f"下一步骤 {next_step_idx} 缺少 'prompt' 字段: {next_step}")
-                    return {
-                        "messages": [("assistant", f"配置错误：步骤 {next_step.get('id', next_step_idx)} 缺少提示信息")],
-                        "current_step": next_step_idx,
-                        "diagnostic_result": "error"
-                    }
-
-                # 检查下一步是否需要调用 MCP 工具
-                if "mcp_tool" in next_step:
-                    logger.info(f"下一步需要调用 MCP 工具: {next_step.get('mcp_tool', {}).get('name')}")
-
-                    # 执行 MCP 工具调用
-                    tool_result = self._execute_mcp_tool(next_step, state)
-
-                    if tool_result["success"]:
-                        # 工具调用成功，根据结果决定下一步
-                        data = tool_result["data"]
-
-                        # 检查兼容性结果
-                        if data.get("compatible") is True:
-                            # 兼容，自动继续到下一步
-                            logger.info(f"控制器兼容，自动进入下一步")
-
-                            # 获取 on_success 配置
-                            on_success = next_step.get("on_success", {})
-                            next_next_step_id = on_success.get("next")
-
-                            # 查找下一步的索引
-                            next_next_step_idx = next_step_idx + 1
-                            if next_next_step_id:
-                                # 如果配置了 next，查找对应的步骤
-                                for idx, s in enumerate(steps):
-                                    if s.get("id") == next_next_step_id:
-                                        next_next_step_idx = idx
-                                        break
-
-                            # 检查是否超出范围
-                            if next_next_step_idx >= len(steps):
-                                logger.info("已到达最后一步")
-                                response_msg = f"{next_step['prompt']}\n\n✅ 核对结果：{data.get('reason', '兼容')}\n\n诊断步骤已全部完成，感谢您的配合！"
-                                return {
-                                    "messages": [("assistant", response_msg)],
-                                    "current_step": next_next_step_idx,
-                                    "diagnostic_result": "completed",
-                                    "tool_result": tool_result
-                                }
-
-                            # 获取下一步配置
-                            next_next_step = steps[next_next_step_idx]
-
-                            # 生成包含兼容性结果和下一步问题的消息
-                            response_msg = f"{next_step['prompt']}\n\n✅ 核对结果：{data.get('reason', '兼容')}\n\n{next_next_step['prompt']}"
-
-                            logger.info(f"自动进入步骤 {next_next_step_idx}: {next_next_step.get('id')}")
-                            return {
-                                "messages": [("assistant", response_msg)],
-                                "current_step": next_next_step_idx,
-                                "tool_result": tool_result
-                            }
-                        elif data.get("compatible") is False:
-                            # 不兼容，返回失败消息，流程结束
-                            on_fail = next_step.get("on_fail", {})
-                            fail_msg = on_fail.get("message", "控制器与车型不匹配")
-
-                            # 如果有推荐的替代型号，添加到消息中
-                            if data.get("alternative"):
-                                fail_msg += f"\n\n💡 推荐使用：{data['alternative']}"
-
-                            response_msg = fail_msg
-
-                            logger.info(f"控制器不兼容，流程结束")
-                            return {
-                                "messages": [("assistant", response_msg)],
-                                "current_step": next_step_idx,
-                                "diagnostic_result": "failed",
-                                "tool_result": tool_result
-                            }
-                        else:
-                            # 未知，返回提示，等待用户确认
-                            response_msg = f"{next_step['prompt']}\n\n⚠️ {data.get('reason', '无法确定兼容性')}\n\n请确认是否继续排查？"
-
-                            logger.info(f"兼容性未知，等待用户确认")
-                            return {
-                                "messages": [("assistant", response_msg)],
-                                "current_step": next_step_idx,
-                                "tool_result": tool_result
-                            }
-                    else:
-                        # 工具调用失败，降级处理
-                        logger.warning(f"MCP 工具调用失败: {tool_result['error']}")
-                        response_msg = f"{next_step['prompt']}\n\n⚠️ 自动核对失败，将为您人工核对"
-                        return {
-                            "messages": [("assistant", response_msg)],
-                            "current_step": next_step_idx
-                        }
-                else:
-                    # 不需要调用工具，直接输出问题
-                    logger.info(f"输出下一步问题: {next_step['prompt'][:50]}...")
-                    return {
-                        "messages": [("assistant", next_step["prompt"])],
-                        "current_step": next_step_idx
-                    }
+                }, None
+
+            step = self.sop.steps[index]
+            entry = plan.get(str(index), {})
+
+            if entry.get("mode") == MODE_RESOLVED:
+                check = CheckResult(entry["outcome"], "plan", entry.get("value"), entry.get("note", ""))
+                logger.info(f"步骤 {step.id} 已根据客户信息判定: {check.outcome}")
+                if check.outcome == FAIL:
+                    return self._enter_fail(step, check, parts, plan)
+                parts.append(f"✅ {step.title or step.id}：根据您提供的信息已确认（{check.reason}）")
+                if step.success_message:
+                    parts.append(step.success_message)
+                index = step.next_index
+                continue
+
+            if step.tool is not None:
+                logger.info(f"步骤 {step.id} 需要调用 MCP 工具: {step.tool.name}")
+                return None, (index, parts)
+
+            logger.info(f"输出步骤 {step.id} 的问题")
+            parts.append(entry.get("prompt", step.prompt))
+            return {
+                "messages": [("assistant", "\n\n".join(parts))],
+                "current_step": index
+            }, None
+
+        logger.error(f"SOP 已判定步骤之间存在循环，停在步骤 {index}")
+        parts.append(self.sop.steps[index].prompt)
+        return {"messages": [("assistant", "\n\n".join(parts))], "current_step": index}, None
+
+    def _enter_next(
+        self,
+        step: CompiledStep,
+        parts: List[str],
+        plan: Dict[str, Dict[str, Any]],
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Pending]]:
+        """步骤通过：输出 on_success.message，进入 on_success.next"""
+        if step.success_message:
+            parts.append(step.success_message)
+        return self._enter(step.next_index, parts, plan)
+
+    def _enter_fail(
+        self,
+        step: CompiledStep,
+        check: CheckResult,
+        parts: List[str],
+        plan: Dict[str, Dict[str, Any]],
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Pending]]:
+        """校验未通过：输出 on_fail.message（{value} 替换为提取到的值），进入 on_fail.next 或结束流程"""
+        message = format_fail_message(step.fail_message, check.value)
+
+        if step.fail_index is None:
+            parts.append(message or "该步骤未通过校验，请按提示排查后重新咨询。")
+            return {
+                "messages": [("assistant", "\n\n".join(parts))],
+                "current_step": step.index,
+                "diagnostic_result": "failed"
+            }, None
+
+        logger.info(f"进入失败分支: {self.sop.steps[step.fail_index].id}")
+        if message:
+            parts.append(message)
+        return self._enter(step.fail_index, parts, plan)
+
+    def _handle_tool_result(
+        self,
+        next_step_idx: int,
+        tool_result: Dict[str, Any],
+        parts: Optional[List[str]] = None,
+        plan: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Pending]]:
+        """根据 MCP 工具调用结果决定下一步（兼容时继续按计划执行后续步骤）"""
+        next_step = self.sop.steps[next_step_idx]
+        parts = list(parts or [])
+        prompt = (plan or {}).get(str(next_step_idx), {}).get("prompt", next_step.prompt)
+
+        if not tool_result["success"]:
+            # 工具调用失败，降级处理
+            logger.warning(f"MCP 工具调用失败: {tool_result['error']}")
+            parts += [prompt, "⚠️ 自动核对失败，将为您人工核对"]
+            return {
+                "messages": [("assistant", "\n\n".join(parts))],
+                "current_step": next_step_idx
+            }, None
+
+        # 工具调用成功，根据结果决定下一步
+        data = tool_result["data"]
+
+        # 检查兼容性结果
+        if data.get("compatible") is True:
+            # 兼容，自动继续到 on_success.next
+            logger.info(f"控制器兼容，自动进入下一步")
+            parts += [prompt, f"✅ 核对结果：{data.get('reason', '兼容')}"]
+            response, pending = self._enter_next(next_step, parts, plan or {})
+            if response is not None:
+                response["tool_result"] = tool_result
+            return response, pending
+        elif data.get("compatible") is False:
+            # 不兼容，返回失败消息，流程结束
+            fail_msg = next_step.fail_message or "控制器与车型不匹配"
+
+            # 如果有推荐的替代型号，添加到消息中
+            if data.get("alternative"):
+                fail_msg += f"\n\n💡 推荐使用：{data['alternative']}"
+
+            logger.info(f"控制器不兼容，流程结束")
+            parts.append(fail_msg)
+            return {
+                "messages": [("assistant", "\n\n".join(parts))],
+                "current_step": next_step_idx,
+                "diagnostic_result": "failed",
+                "tool_result": tool_result
+            }, None
         else:
-            # 刚进入步骤，输出问题
-            logger.info(f"首次进入步骤 {current_step_idx}，输出问题")
+            # 未知，返回提示，等待用户确认
+            logger.info(f"兼容性未知，等待用户确认")
+            parts += [prompt, f"⚠️ {data.get('reason', '无法确定兼容性')}", "请确认是否继续排查？"]
             return {
-                "messages": [("assistant", step["prompt"])],
-                "current_step": current_step_idx
-            }
-
-diagnostic_agent = DiagnosticAgent()
\ No newline at end of file
+                "messages": [("assistant", "\n\n".join(parts))],
+                "current_step": next_step_idx,
+                "tool_result": tool_result
+            }, None
+
+@lru_cache(maxsize=1)
+def get_diagnostic_agent() -> DiagnosticAgent:
+    """获取 DiagnosticAgent 单例（首次调用时加载 SOP 配置）"""
+    return DiagnosticAgent()
+
+def __getattr__(name: str):
+    # 兼容旧的模块级实例 `diagnostic_agent`，访问时才创建
+    if name == "diagnostic_agent":
+        return get_diagnostic_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+槽位抽取 - 从客户的自由文本中提取 customer_info 字段
+
+客户经常一次性发来"72V 锂电 保护板50A 九号E100"这样的描述，如果只看结构化的
+customer_info，collector 会把这些信息再问一遍。抽取节点在 collector 之前运行（仅在
+信息收集阶段），用预编译的正则和型号前缀树提取字段，不调用 LLM：
+
+- 数值：电压(V/伏)、电机功率(W/瓦)、容量(Ah)、线径(mm²/平方)、保护板/空开电流(A/安，需要上下文关键词)；
+  "显示/只有"等引导词后的电压是仪表读数（voltage_display），不是电池标称电压
+- 电池类型关键词：锂电/铅酸等，取位置最靠后且未被否定（"不是锂电"）的一个
+- 型号：兼容性表中的车型与控制器型号建成前缀树（按 normalize_key 规范化），做最长匹配；
+  控制器品牌从型号推断，中文品牌名（凌博、雷霆……）加数字也能识别为控制器型号
+
+抽取到的字段附带来源（customer_info_sources），合并规则：
+- 空字段直接填入
+- 已有值来自文本抽取时，新的抽取结果覆盖（客户更正）
+- 已有值来自结构化输入（前端表单/订单系统，来源 SOURCE_STRUCTURED，由 state.structured_input 记录）时不覆盖
+"""
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_app.graph.state import AgentState
+from agent_app.knowledge.compatibility import CompatibilityIndex, get_compatibility_table, normalize_key
+
+SOURCE_TEXT = "text"
+
+# 中文品牌名 -> 兼容性表中的品牌
+BRAND_ALIASES: Dict[str, str] = {
+    "凌博": "Lingbo",
+    "雷霆": "Leiting",
+    "美迪斯": "Meidisi",
+    "智科": "Zhike",
+}
+
+_NUM = r"(\d+(?:\.\d+)?)"
+
+# (字段, 正则)，取值在第一个分组
+_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("battery_capacity", re.compile(_NUM + r"(?:ah|安时)")),
+    ("battery_voltage", re.compile(_NUM + r"(?:v|伏)(?![a-z])")),
+    ("motor_power", re.compile(_NUM + r"(?:w|瓦)(?![a-z])")),
+    ("wire_gauge", re.compile(_NUM + r"(?:mm2|平方|平(?=线|的线))")),
+]
+
+# 电流需要上下文关键词区分字段：关键词在前（保护板50A）或在后（50A的保护板）
+_CURRENT_FIELDS = {"保护板": "bms_current", "bms": "bms_current", "空开": "breaker_rating", "断路器": "breaker_rating"}
+_CURRENT_KEYWORDS = "|".join(_CURRENT_FIELDS)
+_CURRENT_BEFORE = re.compile(rf"({_CURRENT_KEYWORDS})[^\d]{{0,4}}?{_NUM}(?:a|安)(?!h|时)")
+_CURRENT_AFTER = re.compile(rf"{_NUM}(?:a|安)(?!h|时)的?({_CURRENT_KEYWORDS})")
+
+# 电压前的读数引导词（"电压显示只有30v"），匹配电压之前的一小段文本
+_VOLTAGE_READING = re.compile(r"(?:显示|只有|才|表上|读数|测出|测得)[^\d]{0,3}$")
+
+_BATTERY_TYPES: List[Tuple["re.Pattern[str]", str]] = [
+    (re.compile(r"锂|lithium|lifepo"), "lithium"),
+    (re.compile(r"铅酸|石墨烯|lead"), "lead_acid"),
+]
+# 电池类型关键词前的否定（"不是锂电"、"没用铅酸"）
+_TYPE_NEGATED = re.compile(r"(?:不是|不用|没有|没用|没|非)$")
+
+# 数值的合理范围，超出视为误识别
+_RANGES = {
+    "battery_voltage": (24, 120),
+    "voltage_display": (1, 150),
+    "motor_power": (100, 10000),
+    "battery_capacity": (5, 200),
+    "wire_gauge": (0.5, 16),
+    "bms_current": (5, 300),
+    "breaker_rating": (5, 300),
+}
+
+
+def _normalize_text(text: str) -> str:
+    """NFKC 归一化、小写并去掉空白（保留小数点）"""
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+@dataclass(frozen=True)
+class Slot:
+    """一个抽取到的字段"""
+
+    field: str
+    value: Any
+    span: str       # 匹配到的原文片段（规范化后）
+
+
+class ModelTrie:
+    """车型与控制器型号的前缀树（键为 normalize_key 规范化后的字符）"""
+
+    _END = ""
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self.size = 0
+
+    def add(self, key: str, value: Tuple[str, str, Optional[str]]) -> None:
+        """value: (字段, 规范名称, 控制器品牌)"""
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        if self._END not in node:
+            self.size += 1
+        node[self._END] = value
+
+    def find_all(self, text: str) -> List[Tuple[str, Tuple[str, str, Optional[str]]]]:
+        """从左到右做最长匹配，返回 [(匹配片段, value)]，匹配片段之间不重叠"""
+        found = []
+        i = 0
+        while i < len(text):
+            node, best, j = self._root, None, i
+            while j < len(text) and text[j] in node:
+                node = node[text[j]]
+                j += 1
+                if self._END in node:
+                    best = (j, node[self._END])
+            if best is None:
+                i += 1
+                continue
+            found.append((text[i:best[0]], best[1]))
+            i = best[0]
+        return found
+
+    @classmethod
+    def from_index(cls, index: CompatibilityIndex) -> "ModelTrie":
+        """由兼容性表建树；控制器型号同时以中文品牌名开头的形式加入（凌博72182）"""
+        trie = cls()
+        aliases: Dict[str, List[str]] = {}
+        for alias, brand in BRAND_ALIASES.items():
+            aliases.setdefault(normalize_key(brand), []).append(alias)
+        for record in index.exact.values():
+            brand = record.get("controller_brand")
+            trie.add(normalize_key(record["vehicle_model"]), ("vehicle_model", record["vehicle_model"], None))
+            controller = normalize_key(record["controller_model"])
+            trie.add(controller, ("controller_model", record["controller_model"], brand))
+            brand_key = normalize_key(brand)
+            if brand_key and controller.startswith(brand_key):
+                for alias in aliases.get(brand_key, ()):
+                    trie.add(alias + controller[len(brand_key):], ("controller_model", record["controller_model"], brand))
+        return trie
+
+
+# 未收录的控制器型号：品牌（中英文）+ 型号数字，例如"凌博72183"、"lingbo-72183"
+_BRAND_NAMES = sorted({*BRAND_ALIASES, *(normalize_key(b) for b in BRAND_ALIASES.values())}, key=len, reverse=True)
+_CONTROLLER_PATTERN = re.compile(rf"({'|'.join(map(re.escape, _BRAND_NAMES))})(\d{{4,6}})")
+
+
+def _brand_of(name: str) -> str:
+    return BRAND_ALIASES.get(name) or next(b for b in BRAND_ALIASES.values() if normalize_key(b) == name)
+
+
+class SlotExtractor:
+    """
+    自由文本槽位抽取器
+
+    型号前缀树随兼容性表热加载而重建（按表的索引对象判断）。
+    """
+
+    def __init__(self, table=None):
+        self._table = table
+        self._lock = threading.Lock()
+        self._trie: Optional[ModelTrie] = None
+        self._trie_index: Optional[CompatibilityIndex] = None
+
+    @property
+    def trie(self) -> ModelTrie:
+        index = (self._table or get_compatibility_table()).index
+        if self._trie_index is not index:
+            with self._lock:
+                if self._trie_index is not index:
+                    self._trie = ModelTrie.from_index(index)
+                    self._trie_index = index
+        return self._trie
+
+    def extract(self, text: str) -> List[Slot]:
+        """抽取字段；同一字段出现多次时取最后一次（客户往往在后面更正）"""
+        normalized = _normalize_text(text)
+        slots: Dict[str, Slot] = {}
+
+        def put(field: str, value: Any, span: str) -> None:
+            low, high = _RANGES.get(field, (None, None))
+            if low is not None and not low <= value <= high:
+                return
+            slots[field] = Slot(field, value, span)
+
+        for field, pattern in _PATTERNS:
+            for match in pattern.finditer(normalized):
+                reading = field == "battery_voltage" and _VOLTAGE_READING.search(normalized, max(0, match.start() - 6), match.start())
+                put("voltage_display" if reading else field, float(match.group(1)), match.group(0))
+        for match in _CURRENT_BEFORE.finditer(normalized):
+            put(_CURRENT_FIELDS[match.group(1)], float(match.group(2)), match.group(0))
+        for match in _CURRENT_AFTER.finditer(normalized):
+            put(_CURRENT_FIELDS[match.group(2)], float(match.group(1)), match.group(0))
+
+        # 电池类型按出现位置取最后一个（"以前是锂电现在换了铅酸"），跳过被否定的关键词
+        mentions = [
+            (match.start(), battery_type, match.group(0))
+            for pattern, battery_type in _BATTERY_TYPES
+            for match in pattern.finditer(normalized)
+            if not _TYPE_NEGATED.search(normalized, max(0, match.start() - 2), match.start())
+        ]
+        if mentions:
+            _, battery_type, span = max(mentions)
+            slots["battery_type"] = Slot("battery_type", battery_type, span)
+
+        keyed = normalize_key(text)
+        for span, (field, name, brand) in self.trie.find_all(keyed):
+            put(field, name, span)
+            if brand:
+                put("controller_brand", brand, span)
+        if "controller_model" not in slots:
+            match = _CONTROLLER_PATTERN.search(keyed)
+            if match:
+                brand = _brand_of(match.group(1))
+                put("controller_model", f"{brand}-{match.group(2)}", match.group(0))
+                put("controller_brand", brand, match.group(0))
+        return list(slots.values())
+
+    def merge(
+        self,
+        slots: List[Slot],
+        info: Dict[str, Any],
+        sources: Dict[str, Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """
+        按来源规则决定哪些字段写入 customer_info
+
+        Returns:
+            (customer_info 更新, customer_info_sources 更新)
+        """
+        updates: Dict[str, Any] = {}
+        provenance: Dict[str, Dict[str, Any]] = {}
+        for slot in slots:
+            current = info.get(slot.field)
+            from_text = (sources.get(slot.field) or {}).get("source") == SOURCE_TEXT
+            if current not in (None, "") and not from_text:
+                continue
+            if current == slot.value:
+                continue
+            updates[slot.field] = slot.value
+            provenance[slot.field] = {"source": SOURCE_TEXT, "span": slot.span}
+        return updates, provenance
+
+
+# 全局单例
+_extractor: Optional[SlotExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def get_slot_extractor() -> SlotExtractor:
+    """获取槽位抽取器单例"""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = SlotExtractor()
+    return _extractor
+
+
+def extractor_node(state: AgentState) -> Dict:
+    """从最新的客户消息中抽取字段，合并进 customer_info（纯内存计算）"""
+    messages = state.get("messages") or []
+    if not messages or messages[-1].type != "human" or not isinstance(messages[-1].content, str):
+        return {}
+    extractor = get_slot_extractor()
+    updates, provenance = extractor.merge(
+        extractor.extract(messages[-1].content),
+        state.get("customer_info") or {},
+        state.get("customer_info_sources") or {},
+    )
+    if not updates:
+        return {}
+    return {"customer_info": updates, "customer_info_sources": provenance}
+
+
+async def aextractor_node(state: AgentState) -> Dict:
+    """extractor_node 的异步版本"""
+    return extractor_node(state)
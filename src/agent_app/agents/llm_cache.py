@@ -0,0 +1,275 @@
+"""
+LLM 响应缓存
+
+BaseAgent 使用 temperature=0，相同的输入会得到相同的输出。SOP 步骤校验等提示词
+在不同客户之间高度重复，缓存命中可以同时节省延迟和 API 费用。
+
+两级缓存：
+- 内存 LRU：进程内，命中最快
+- 磁盘 SQLite：跨进程/重启共享，命中后回填内存
+
+异步调用方只在事件循环中查询内存（get_memory / set_memory），磁盘读写（get_disk / set_disk）
+交给线程池执行，SQLite 的锁等待和 fsync 不会阻塞事件循环。
+
+缓存键为 (模型名, 规范化后的消息列表, 调用参数) 的 SHA-256。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 统一消息角色的不同写法
+_ROLE_ALIASES = {"user": "human", "assistant": "ai"}
+
+
+def _normalize_text(text: str) -> str:
+    """NFKC 归一化（全角转半角）并压缩空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def normalize_messages(messages: Sequence[Any]) -> List[Tuple[str, str]]:
+    """把 (role, content) 元组、dict 或 BaseMessage 统一为 [(role, content)]"""
+    normalized = []
+    for message in messages:
+        if isinstance(message, tuple):
+            role, content = message
+        elif isinstance(message, dict):
+            role, content = message.get("role", ""), message.get("content", "")
+        elif isinstance(message, str):
+            role, content = "human", message
+        else:
+            role, content = message.type, message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+        normalized.append((_ROLE_ALIASES.get(role, role), _normalize_text(content)))
+    return normalized
+
+
+def make_cache_key(model_name: str, messages: Sequence[Any], params: Optional[Dict[str, Any]] = None) -> str:
+    """计算缓存键"""
+    payload = json.dumps(
+        [model_name, normalize_messages(messages), sorted((params or {}).items())],
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    两级 LLM 响应缓存
+
+    Args:
+        path: SQLite 文件路径，None 表示只使用内存缓存
+        max_memory_entries: 内存 LRU 的最大条目数
+        max_disk_entries: 磁盘缓存的最大条目数，超出后按最近访问时间淘汰
+        ttl_seconds: 条目有效期，0 表示永不过期
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at);
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        *,
+        max_memory_entries: int = 1024,
+        max_disk_entries: int = 100_000,
+        ttl_seconds: float = 0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (response, created_at)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self._SCHEMA)
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    @property
+    def has_disk(self) -> bool:
+        """是否启用了磁盘缓存（异步调用方据此决定是否把磁盘读写交给线程池）"""
+        return self._conn is not None
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存（先内存后磁盘），未命中或已过期返回 None"""
+        response = self.get_memory(key)
+        if response is not None:
+            return response
+        return self.get_disk(key)
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """
+        只查询内存缓存（不涉及 IO，可以在事件循环中直接调用）
+
+        未命中时不计入 misses，调用方应继续调用 get_disk。
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if not self._is_expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            del self._memory[key]
+            # 有磁盘层时同一条目在 get_disk 中计入过期
+            self.expired += int(self._conn is None)
+            return None
+
+    def get_disk(self, key: str) -> Optional[str]:
+        """查询磁盘缓存，命中后回填内存；没有磁盘缓存时直接计为未命中"""
+        now = self._clock()
+        with self._lock:
+            if self._conn is not None:
+                found = self._conn.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if found is not None:
+                    response, created_at = found
+                    if not self._is_expired(created_at, now):
+                        with self._conn:
+                            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._remember(key, response, created_at)
+                        self.disk_hits += 1
+                        return response
+                    with self._conn:
+                        self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.expired += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: str, response: str) -> None:
+        """写入缓存（内存与磁盘两级）"""
+        self.set_memory(key, response)
+        self.set_disk(key, response)
+
+    def set_memory(self, key: str, response: str) -> None:
+        """只写入内存缓存"""
+        now = self._clock()
+        with self._lock:
+            self._remember(key, response, now)
+
+    def set_disk(self, key: str, response: str) -> None:
+        """只写入磁盘缓存（没有磁盘缓存时不做任何事）"""
+        if self._conn is None:
+            return
+        now = self._clock()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+            self._disk_writes += 1
+            # 每写入一批检查一次容量，避免每次写入都做 COUNT
+            if self._disk_writes % 100 == 0 or self.max_disk_entries < 100:
+                self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等监控指标"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = 0
+            if self._conn is not None:
+                (disk_entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+
+# 全局单例
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """获取 LLM 响应缓存单例，settings.LLM_CACHE_ENABLED 为 False 时返回 None"""
+    global _llm_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(
+                    settings.LLM_CACHE_PATH or None,
+                    max_memory_entries=settings.LLM_CACHE_MAX_MEMORY_ENTRIES,
+                    max_disk_entries=settings.LLM_CACHE_MAX_DISK_ENTRIES,
+                    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                )
+    return _llm_cache
+
+
+def set_llm_cache(cache: Optional[LLMResponseCache]) -> None:
+    """替换 LLM 响应缓存（测试时使用）"""
+    global _llm_cache
+    with _llm_cache_lock:
+        _llm_cache = cache
@@ -1,23 +1,96 @@
 """
 Planner Agent - 电动车售后诊断规划器
 
-注意：此模块当前未在主工作流中使用。
-电动车售后诊断主要使用 DiagnosticAgent (executor.py) 执行 SOP 流程。
-此文件保留用于未来可能的扩展需求。
+每个需要客户回复的 SOP 步骤都意味着一次完整的请求与图执行。planner_node 在进入
+诊断前，用当前的 customer_info 对编译后的 SOP 做静态分析，标出哪些步骤不需要等待客户：
+
+- tool：自动查询的步骤（例如 step_2_match），参数齐全时与前后步骤在同一轮内完成
+- resolved：校验规则的输入已在 customer_info 中（check_logic.target_field），
+  直接判定通过/失败，不再提问
+- 分支步骤（branches）按 customer_info 选出适用的检查项，提问时只问相关内容
+
+DiagnosticAgent 按计划批量执行：从当前步骤开始连续完成 tool / resolved 步骤，
+把结果合并进同一条回复，直到遇到需要客户回答的步骤。
+
+计划只取决于 SOP 版本和 customer_info，按二者的摘要缓存在 state["plan"] 中，
+信息不变时后续轮次不会重新计算。
 """
 from __future__ import annotations
-from typing import Any, Dict
 
-def planner_node(state: Dict[str, Any]) -> Dict[str, Any]:
+import hashlib
+import json
+from typing import Any, Dict, Mapping, Optional
+
+from agent_app.agents.checks import AMBIGUOUS, range_check
+from agent_app.knowledge.sop import CompiledSOP, CompiledStep
+
+MODE_ASK = "ask"
+MODE_TOOL = "tool"
+MODE_RESOLVED = "resolved"
+
+
+def plan_key(sop_version: str, info: Mapping[str, Any]) -> str:
+    """计划的缓存键：SOP 版本 + customer_info 摘要"""
+    payload = json.dumps(info, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{sop_version[:16]}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _plan_step(step: CompiledStep, info: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """单个步骤的计划，按默认方式（直接提问）执行时返回 None"""
+    if step.tool is not None:
+        return {"mode": MODE_TOOL}
+
+    logic = step.check_logic or {}
+    target = logic.get("target_field")
+    if logic.get("type") == "range_check" and target and info.get(target) is not None:
+        result = range_check(step, str(info[target]), {"customer_info": info})
+        if result is not None and result.outcome != AMBIGUOUS:
+            return {"mode": MODE_RESOLVED, "outcome": result.outcome, "value": result.value, "note": result.reason}
+
+    checks = [branch.check for branch in step.branches if branch.predicate(info)]
+    if checks:
+        return {"mode": MODE_ASK, "prompt": f"{step.prompt}\n请重点检查：{'；'.join(checks)}"}
+    return None
+
+
+def build_plan(sop: CompiledSOP, info: Mapping[str, Any], key: str) -> Dict[str, Any]:
     """
-    规划 Agent（预留）
+    生成执行计划
 
-    当前电动车售后诊断使用固定的 SOP 流程（sop_diagnostic.yaml），
-    不需要动态规划。此函数保留用于未来可能的复杂场景规划需求。
+    Returns:
+        {
+            "key": 缓存键,
+            "steps": {"步骤下标": {"mode": ..., ...}},   # 只包含非默认的步骤
+            "turns": 按成功路径完成诊断预计需要的客户回复次数
+        }
     """
-    # 当前未实现，返回空规划
-    return {
-        "plan": {},
-        "actions": [],
-        "step": "planned"
-    }
+    steps: Dict[str, Dict[str, Any]] = {}
+    for step in sop.steps:
+        entry = _plan_step(step, info)
+        if entry is not None:
+            steps[str(step.index)] = entry
+
+    turns, index, seen = 0, 0, set()
+    while index is not None and index not in seen:
+        seen.add(index)
+        mode = steps.get(str(index), {}).get("mode", MODE_ASK)
+        turns += int(mode == MODE_ASK)
+        index = sop.steps[index].next_index
+    return {"key": key, "steps": steps, "turns": turns}
+
+
+def planner_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """根据 SOP 与 customer_info 更新执行计划（二者未变化时不更新）"""
+    from agent_app.agents.executor import get_diagnostic_agent
+
+    sop, version = get_diagnostic_agent().current_sop()
+    info = state.get("customer_info") or {}
+    key = plan_key(version, info)
+    if (state.get("plan") or {}).get("key") == key:
+        return {}
+    return {"plan": build_plan(sop, info, key)}
+
+
+async def aplanner_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """planner_node 的异步版本（纯内存计算）"""
+    return planner_node(state)
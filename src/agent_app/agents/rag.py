@@ -0,0 +1,66 @@
+"""
+RAG Agent - 从本地手册、SOP 模板和 changeLog 中检索答案
+
+客户或售后人员以 settings.RAG_QUERY_PREFIXES 中的前缀（例如"/ask 刹车断电怎么接"）
+提问时，supervisor 把这一轮交给 rag_node：在本地 BM25 索引（knowledge/retrieval.py）
+中检索最相关的段落并直接回复出处与原文片段。不调用 LLM，也不改动诊断进度
+（current_step、customer_info 等），下一条普通消息继续原来的流程。
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+from agent_app.concurrency import run_in_threadpool
+from agent_app.graph.state import AgentState
+from agent_app.knowledge.retrieval import get_retrieval_index
+from agent_app.settings import settings
+
+# 回复中每个段落最多展示的字符数
+SNIPPET_CHARS = 160
+
+
+def rag_query(state: AgentState) -> Optional[str]:
+    """最新的客户消息以检索前缀开头时返回去掉前缀的问题，否则返回 None"""
+    messages = state.get("messages") or []
+    if not messages or messages[-1].type != "human" or not isinstance(messages[-1].content, str):
+        return None
+    text = messages[-1].content.strip()
+    for prefix in settings.RAG_QUERY_PREFIXES:
+        if prefix and text.startswith(prefix):
+            return text[len(prefix):].lstrip(" ：:，,")
+    return None
+
+
+def format_hits(query: str, hits: List[Dict]) -> str:
+    """把检索结果整理成回复文本"""
+    if not hits:
+        return f"没有在资料库中找到与「{query}」相关的内容，请换个说法或联系技术支持。"
+    lines = [f"为您找到以下与「{query}」相关的资料："]
+    for i, hit in enumerate(hits, 1):
+        snippet = " ".join(hit["text"].split())
+        if len(snippet) > SNIPPET_CHARS:
+            snippet = snippet[:SNIPPET_CHARS] + "…"
+        title = f"{hit['title']}（{hit['source']}）" if hit.get("title") else hit.get("source", "")
+        lines.append(f"{i}. {title}\n   {snippet}")
+    return "\n".join(lines)
+
+
+def rag_node(state: AgentState) -> Dict:
+    """检索本地资料并回复"""
+    query = rag_query(state)
+    if not query:
+        content = f"请在「{settings.RAG_QUERY_PREFIXES[0]}」后输入要查询的问题，例如：{settings.RAG_QUERY_PREFIXES[0]} 刹车断电线怎么接"
+    else:
+        index = get_retrieval_index()
+        if index is None:
+            content = "资料库索引尚未建立，请联系管理员运行 `agent_app index build`。"
+        else:
+            content = format_hits(query, index.search(query, top_k=settings.RAG_TOP_K))
+    return {"messages": [AIMessage(content=content)]}
+
+
+async def arag_node(state: AgentState) -> Dict:
+    """rag_node 的异步版本（打开/热加载索引涉及文件 IO，放到共享线程池中执行）"""
+    return await run_in_threadpool(rag_node, state)
@@ -0,0 +1,458 @@
+"""
+语义近重复缓存 - 同义改写的问题复用已有的 LLM 回答
+
+LLMResponseCache 只命中逐字相同的提示词，而客户的问题大量是同义改写
+（"我想调大电流" / "电流能调大吗"）。SemanticCache 放在 LLM 调用之前：
+
+- 规范化：NFKC、小写，去掉标点空白与"请问/我想/能不能/吗"等不影响语义的虚词
+- 特征：规范化文本的字符 1-gram + 2-gram 集合（对语序改写不敏感）
+- MinHash 签名（num_perm 个哈希）按 bands 分段做 LSH，只与同一桶中的条目比较，
+  候选按精确 Jaccard 相似度复核，达到 threshold 才算命中
+- 上下文隔离：customer_info 中影响回答的字段（settings.SEMANTIC_CACHE_CONTEXT_FIELDS）、
+  问题中的数值以及否定词的数量必须完全一致，"电流能调大吗"与"电流不能调大吗"、
+  "60V 充电器能用吗"与"48V 充电器能用吗"不会互相命中
+- 内存 LRU + SQLite 持久化（写穿），进程重启后按最近访问时间恢复；查询只读内存，
+  命中后的访问时间与过期删除先记在内存中，随下一次写入或攒够一批后一起落盘
+
+只适合自由文本问答：反义词不改变否定词与数值（"指示灯一直亮着"/"一直灭着"相似度 0.8），
+因此不能用于 PASS/FAIL 这类判定结果，SOP 校验只使用逐字匹配的 LLMResponseCache。
+
+stats() 输出命中率以及每次查询最高相似度的分布，用于调整阈值。
+纯 Python 实现，不依赖外部向量数据库。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 不影响语义的虚词（较长的在前，避免"能不能"只去掉一半）
+FILLERS = ("请问", "可不可以", "能不能", "可以", "能否", "我想", "我要", "想要", "一下", "能")
+PARTICLES = "吗呢吧啊呀哦嘛么"
+# 否定词的数量作为上下文的一部分，避免语义相反的问题互相命中
+NEGATION_CHARS = "不没未别无非"
+
+_FILLER_PATTERN = re.compile("|".join(map(re.escape, FILLERS)) + f"|[{PARTICLES}]")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# 相似度分布的分桶（下界）
+_SIMILARITY_BUCKETS = (0.9, 0.8, 0.7, 0.6, 0.5)
+
+
+def normalize_question(text: str) -> str:
+    """规范化问题文本：NFKC、小写，只保留文字与数字，去掉虚词"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(ch for ch in text if ch.isalnum())
+    return _FILLER_PATTERN.sub("", text)
+
+
+def shingles(normalized: str) -> FrozenSet[str]:
+    """字符 1-gram + 2-gram 集合"""
+    return frozenset(normalized) | frozenset(normalized[i:i + 2] for i in range(len(normalized) - 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def context_key(context: Optional[Mapping[str, Any]], normalized: str) -> str:
+    """上下文字段 + 问题中的数值 + 否定词数量的摘要，只有摘要相同的条目才会互相比较"""
+    negations = sum(normalized.count(ch) for ch in NEGATION_CHARS)
+    numbers = sorted(_NUMBER.findall(normalized))
+    payload = json.dumps([context or {}, numbers, negations], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class MinHasher:
+    """MinHash 签名：num_perm 个 (a * h + b) mod p 形式的哈希函数（固定种子，跨进程一致）"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, features: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(f.encode("utf-8")) for f in features]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._params)
+
+
+@dataclass(frozen=True)
+class SemanticHit:
+    """一次命中"""
+
+    answer: str
+    similarity: float
+    question: str           # 命中条目的原始问题
+
+
+@dataclass
+class _Entry:
+    id: int
+    context: str
+    normalized: str
+    question: str
+    features: FrozenSet[str]
+    bands: Tuple[int, ...]
+    answer: str
+    created_at: float
+
+
+class SemanticCache:
+    """
+    MinHash/LSH 近重复问答缓存
+
+    Args:
+        path: SQLite 文件路径，None 表示只使用内存
+        threshold: 命中所需的最低 Jaccard 相似度
+        max_entries: 最大条目数，超出后按最近访问淘汰（内存与磁盘同步淘汰）
+        ttl_seconds: 条目有效期，0 表示永不过期
+        num_perm, bands: MinHash 哈希个数与 LSH 分段数（num_perm 须能被 bands 整除）；
+            默认 64/16（每段 4 行），相似度 0.7 的候选被召回的概率约 98.8%
+        flush_interval: 访问时间最多延迟多少秒落盘（攒够 FLUSH_BATCH 条时立即落盘）
+    """
+
+    FLUSH_BATCH = 256
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS semantic_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        context TEXT NOT NULL,
+        normalized TEXT NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        UNIQUE (context, normalized)
+    );
+    CREATE INDEX IF NOT EXISTS idx_semantic_cache_accessed ON semantic_cache (accessed_at);
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        *,
+        threshold: float = 0.7,
+        max_entries: int = 20_000,
+        ttl_seconds: float = 0,
+        num_perm: int = 64,
+        bands: int = 16,
+        flush_interval: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) 必须能被 bands ({bands}) 整除")
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bands = bands
+        self._rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._buckets: Dict[int, set] = {}
+        self._next_id = 1
+        self._conn: Optional[sqlite3.Connection] = None
+        # 尚未落盘的访问时间（id -> accessed_at）与待删除的过期条目
+        self._touched: Dict[int, float] = {}
+        self._dropped: List[int] = []
+        self.flush_interval = flush_interval
+        self._flushed_at = clock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.expired = 0
+        self.evictions = 0
+        self.similarity: Dict[str, int] = {label: 0 for label in self._bucket_labels()}
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self._SCHEMA)
+            self._load()
+
+    # -- 索引维护 ----------------------------------------------------------------
+
+    def _band_keys(self, context: str, features: FrozenSet[str]) -> Tuple[int, ...]:
+        signature = self._hasher.signature(features)
+        rows = self._rows
+        return tuple(hash((context, i, signature[i * rows:(i + 1) * rows])) for i in range(self.bands))
+
+    def _insert(self, entry: _Entry) -> None:
+        self._entries[entry.id] = entry
+        self._exact[(entry.context, entry.normalized)] = entry.id
+        for key in entry.bands:
+            self._buckets.setdefault(key, set()).add(entry.id)
+        self._next_id = max(self._next_id, entry.id + 1)
+
+    def _remove(self, entry_id: int) -> Optional[_Entry]:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return None
+        self._exact.pop((entry.context, entry.normalized), None)
+        for key in entry.bands:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+        return entry
+
+    def _evict(self) -> None:
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            entry_id, _ = next(iter(self._entries.items()))
+            self._remove(entry_id)
+            evicted.append((entry_id,))
+        if evicted:
+            self.evictions += len(evicted)
+            if self._conn is not None:
+                for entry_id, in evicted:
+                    self._touched.pop(entry_id, None)
+                with self._conn:
+                    self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", evicted)
+
+    def _load(self) -> None:
+        """
+        从磁盘恢复最近访问的 max_entries 条（按访问时间从旧到新插入，保持 LRU 顺序）
+
+        恢复前删除已过期和超出 max_entries 的行，磁盘文件不会随重启无限增长。
+        """
+        now = self._clock()
+        with self._conn:
+            if self.ttl_seconds:
+                self._conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM semantic_cache WHERE id NOT IN "
+                "(SELECT id FROM semantic_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+        rows = self._conn.execute(
+            "SELECT id, context, normalized, question, answer, created_at FROM semantic_cache "
+            "ORDER BY accessed_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for entry_id, context, normalized, question, answer, created_at in reversed(rows):
+            features = shingles(normalized)
+            self._insert(_Entry(entry_id, context, normalized, question, features, self._band_keys(context, features), answer, created_at))
+        if rows:
+            logger.info(f"语义缓存从磁盘恢复 {len(self._entries)} 条")
+
+    def _flush(self) -> None:
+        """把积攒的访问时间与过期删除写入磁盘（调用方持有 self._lock）"""
+        if self._conn is None or not (self._touched or self._dropped):
+            return
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE semantic_cache SET accessed_at = ? WHERE id = ?",
+                [(accessed_at, entry_id) for entry_id, accessed_at in self._touched.items()],
+            )
+            self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(i,) for i in self._dropped])
+        self._touched.clear()
+        self._dropped.clear()
+        self._flushed_at = self._clock()
+
+    def _flush_due(self, now: float) -> bool:
+        pending = len(self._touched) + len(self._dropped)
+        return pending >= self.FLUSH_BATCH or (pending > 0 and now - self._flushed_at >= self.flush_interval)
+
+    @property
+    def needs_flush(self) -> bool:
+        """积攒的访问时间是否该落盘（攒够一批或超过 flush_interval）"""
+        return self._conn is not None and self._flush_due(self._clock())
+
+    @property
+    def has_disk(self) -> bool:
+        """是否启用了磁盘持久化（异步调用方据此把写入交给线程池）"""
+        return self._conn is not None
+
+    def flush(self) -> None:
+        """落盘积攒的访问时间与过期删除（查询命中后 needs_flush 为真时、服务退出时调用）"""
+        with self._lock:
+            self._flush()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    # -- 查询与写入 ----------------------------------------------------------------
+
+    @staticmethod
+    def _bucket_labels() -> List[str]:
+        labels = ["exact"]
+        upper = 1.0
+        for low in _SIMILARITY_BUCKETS:
+            labels.append(f"{low:.1f}-{upper:.1f}")
+            upper = low
+        return labels + [f"<{upper:.1f}", "no_candidate"]
+
+    def _record_similarity(self, similarity: Optional[float], exact: bool) -> None:
+        if exact:
+            label = "exact"
+        elif similarity is None:
+            label = "no_candidate"
+        else:
+            upper, label = 1.0, None
+            for low in _SIMILARITY_BUCKETS:
+                if similarity >= low:
+                    label = f"{low:.1f}-{upper:.1f}"
+                    break
+                upper = low
+            label = label or f"<{_SIMILARITY_BUCKETS[-1]:.1f}"
+        self.similarity[label] += 1
+
+    def get(self, question: str, context: Optional[Mapping[str, Any]] = None) -> Optional[SemanticHit]:
+        """查找近重复的问题，未命中返回 None"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        ctx = context_key(context, normalized)
+        now = self._clock()
+        with self._lock:
+            self.lookups += 1
+            best_id, best, exact = self._exact.get((ctx, normalized)), None, False
+            if best_id is not None:
+                best, exact = 1.0, True
+            else:
+                features = shingles(normalized)
+                candidates = set()
+                for key in self._band_keys(ctx, features):
+                    candidates |= self._buckets.get(key, set())
+                for entry_id in candidates:
+                    similarity = jaccard(features, self._entries[entry_id].features)
+                    if best is None or similarity > best:
+                        best_id, best = entry_id, similarity
+            self._record_similarity(best, exact)
+
+            if best is None or best < self.threshold:
+                return None
+            entry = self._entries[best_id]
+            if self._is_expired(entry.created_at, now):
+                self._remove(best_id)
+                self.expired += 1
+                if self._conn is not None:
+                    self._touched.pop(best_id, None)
+                    self._dropped.append(best_id)
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self.exact_hits += int(exact)
+            if self._conn is not None:
+                self._touched[best_id] = now
+            return SemanticHit(entry.answer, round(best, 4), entry.question)
+
+    def set(self, question: str, answer: str, context: Optional[Mapping[str, Any]] = None) -> None:
+        """写入问答（规范化后相同的问题覆盖旧回答）；启用磁盘时会写 SQLite，异步代码应放到线程池执行"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        ctx = context_key(context, normalized)
+        features = shingles(normalized)
+        bands = self._band_keys(ctx, features)
+        now = self._clock()
+        with self._lock:
+            old_id = self._exact.get((ctx, normalized))
+            if old_id is not None:
+                self._remove(old_id)
+                self._touched.pop(old_id, None)
+            entry_id = self._next_id
+            if self._conn is not None:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        "INSERT OR REPLACE INTO semantic_cache "
+                        "(context, normalized, question, answer, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (ctx, normalized, question, answer, now, now),
+                    )
+                entry_id = cursor.lastrowid
+            self._insert(_Entry(entry_id, ctx, normalized, question, features, bands, answer, now))
+            self._evict()
+            if self._flush_due(now):
+                self._flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._buckets.clear()
+            self._touched.clear()
+            self._dropped.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM semantic_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率与相似度分布"""
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.lookups - self.hits,
+                "hit_ratio": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "similarity": dict(self.similarity),
+            }
+
+
+def semantic_context(info: Optional[Mapping[str, Any]], **extra: Any) -> Dict[str, Any]:
+    """从 customer_info 中取出影响回答的字段（settings.SEMANTIC_CACHE_CONTEXT_FIELDS），附加 extra"""
+    info = info or {}
+    context = {name: info.get(name) for name in settings.SEMANTIC_CACHE_CONTEXT_FIELDS if info.get(name) not in (None, "")}
+    context.update(extra)
+    return context
+
+
+# 全局单例
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """获取语义缓存单例，settings.SEMANTIC_CACHE_ENABLED 为 False 时返回 None"""
+    global _semantic_cache
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    settings.SEMANTIC_CACHE_PATH or None,
+                    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+                )
+    return _semantic_cache
+
+
+def set_semantic_cache(cache: Optional[SemanticCache]) -> None:
+    """替换语义缓存（测试时使用）"""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        _semantic_cache = cache
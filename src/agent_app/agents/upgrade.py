@@ -0,0 +1,239 @@
+"""
+升级方案求解器 - "想要更大电流需要换什么？"
+
+安全母线电流 = min(各组件电流上限)，而每个组件的上限只取决于该组件自身的参数
+（电压不参与升级）。因此"让安全电流达到目标值 T"等价于"每个组件的上限都不低于 T"，
+各组件可以独立选择：对每个上限低于 T 的组件，选出上限 ≥ T 的最便宜配件，
+总成本即为各组件最便宜选择之和，这就是全局最优解，无需搜索组合空间。
+
+配件目录按组件建立索引：按"等效额定值"排序，并预先计算后缀最小成本；
+查询时把目标电流换算成所需的最小额定值，bisect 定位后 O(1) 取得最便宜配件。
+查询耗时与目录规模基本无关（O(组件数 × log 配件数)）。
+
+组件与配件的对应关系：
+- wire:       主线线径(mm²)          上限 = 线径 × 12
+- breaker:    空开额定电流(A)        上限 = 额定值 × 0.8
+- controller: 控制器标称电流(A)      上限 = 标称值 × 0.8
+- bms:        锂电保护板电流(A)      上限 = 保护板电流（仅锂电）
+- battery:    铅酸电池容量(Ah)       上限 = 容量 × 2.5（仅铅酸）
+- motor:      电机额定功率(W)+类型   上限 = 功率 × 系数 / 电压
+"""
+from __future__ import annotations
+
+import json
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from agent_app.agents.validator import (
+    MOTOR_COEFF_PERFORMANCE,
+    MOTOR_COEFF_STANDARD,
+    WIRE_CURRENT_PER_SQMM,
+    FastSpecs,
+    SafetyCalculator,
+    VehicleSpecs,
+)
+from agent_app.settings import settings
+
+DEFAULT_CATALOG_PATH = Path(__file__).parent.parent / "knowledge" / "data" / "upgrade_catalog.jsonl"
+
+Specs = Union[VehicleSpecs, FastSpecs]
+
+# 配件组件 -> (对应的短板组件, 升级后修改的 VehicleSpecs 字段)
+UPGRADE_COMPONENTS: Dict[str, Tuple[str, str]] = {
+    "wire": ("wire", "wire_gauge"),
+    "breaker": ("breaker", "breaker_rating"),
+    "controller": ("controller", "controller_max_current"),
+    "bms": ("battery", "bms_current"),
+    "battery": ("battery", "capacity_ah"),
+    "motor": ("motor", "motor_power_rated"),
+}
+
+
+@dataclass(frozen=True)
+class UpgradeOption:
+    """一个可选配件"""
+
+    component: str      # UPGRADE_COMPONENTS 中的键
+    name: str
+    rating: float       # 线径 / 额定电流 / 标称电流 / 保护板电流 / 容量 / 电机功率
+    cost: float
+    motor_type: str = "standard"  # 仅电机配件
+
+    @property
+    def key(self) -> float:
+        """等效额定值：同一辆车上，上限随 key 单调递增"""
+        if self.component == "motor":
+            coeff = MOTOR_COEFF_PERFORMANCE if self.motor_type == "performance" else MOTOR_COEFF_STANDARD
+            return self.rating * coeff
+        return self.rating
+
+
+def _limit_from_key(component: str, key: float, specs: Specs) -> float:
+    """由等效额定值计算组件电流上限（与 SafetyCalculator 的运算逐位一致）"""
+    if component == "wire":
+        return key * WIRE_CURRENT_PER_SQMM
+    if component in ("breaker", "controller"):
+        return key * 0.8
+    if component == "battery":
+        return key * 2.5
+    if component == "motor":
+        return key / specs.voltage
+    return key
+
+
+def _required_key(component: str, target: float, specs: Specs) -> float:
+    """达到目标电流所需的最小等效额定值（近似值，bisect 后再用精确上限校正）"""
+    if component == "wire":
+        return target / WIRE_CURRENT_PER_SQMM
+    if component in ("breaker", "controller"):
+        return target / 0.8
+    if component == "battery":
+        return target / 2.5
+    if component == "motor":
+        return target * specs.voltage
+    return target
+
+
+def _applies(component: str, specs: Specs) -> bool:
+    """保护板只适用于锂电，电池容量只适用于铅酸"""
+    if component == "bms":
+        return specs.battery_type == "lithium"
+    if component == "battery":
+        return specs.battery_type == "lead_acid"
+    return True
+
+
+class _ComponentIndex:
+    """单个组件的配件索引：按 key 升序，suffix_best[i] 为 options[i:] 中成本最低者的下标"""
+
+    def __init__(self, options: List[UpgradeOption]):
+        self.options = sorted(options, key=lambda o: (o.key, o.cost))
+        self.keys = [o.key for o in self.options]
+        self.suffix_best: List[int] = [0] * len(self.options)
+        best = None
+        for i in range(len(self.options) - 1, -1, -1):
+            if best is None or self.options[i].cost <= self.options[best].cost:
+                best = i
+            self.suffix_best[i] = best
+
+    def cheapest(self, component: str, target: float, specs: Specs) -> Optional[UpgradeOption]:
+        """上限不低于 target 的最便宜配件"""
+        i = bisect_left(self.keys, _required_key(component, target, specs))
+        # 换算存在浮点误差，按精确上限向两侧校正
+        while i > 0 and _limit_from_key(component, self.keys[i - 1], specs) >= target:
+            i -= 1
+        while i < len(self.keys) and _limit_from_key(component, self.keys[i], specs) < target:
+            i += 1
+        if i >= len(self.keys):
+            return None
+        return self.options[self.suffix_best[i]]
+
+
+class UpgradeCatalog:
+    """配件目录（构建后只读，可在多个请求间共享）"""
+
+    def __init__(self, options: Iterable[UpgradeOption]):
+        grouped: Dict[str, List[UpgradeOption]] = {component: [] for component in UPGRADE_COMPONENTS}
+        for option in options:
+            if option.component not in grouped:
+                raise ValueError(f"未知的配件组件: {option.component}")
+            grouped[option.component].append(option)
+        self._index = {component: _ComponentIndex(opts) for component, opts in grouped.items()}
+
+    def __len__(self) -> int:
+        return sum(len(index.options) for index in self._index.values())
+
+    @classmethod
+    def from_file(cls, path: Path | str) -> "UpgradeCatalog":
+        """从 JSONL 加载，每行为 UpgradeOption 的字段"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(UpgradeOption(**json.loads(line)) for line in f if line.strip())
+
+    def solve(self, specs: Specs, target_current: float) -> Dict[str, Any]:
+        """
+        求使安全母线电流达到 target_current 的最低成本升级方案
+
+        以未取整的组件上限判断是否达标（比 safe_bus_current 的一位小数更保守）。
+        specs 可以是 VehicleSpecs 或 FastSpecs，内部统一使用 FastSpecs 和带缓存的计算。
+
+        Returns:
+            {
+                "feasible": bool,           # 目录中的配件能否达到目标
+                "target_current": float,
+                "total_cost": float,        # 不可行时为 None
+                "upgrades": [...],          # 需要更换的配件及更换前后的组件上限
+                "blocking": [...],          # 无法达标的短板组件
+                "before": {...},            # 当前计算结果
+                "after": {...} | None       # 升级后的计算结果
+            }
+        """
+        if isinstance(specs, VehicleSpecs):
+            specs = specs.to_fast()
+        before = SafetyCalculator.calculate_fast(specs)
+        limits = before["details"]
+        upgrades: List[Dict[str, Any]] = []
+        changes: Dict[str, Any] = {}
+        blocking: List[str] = []
+
+        for limit_name in limits:
+            if limits[limit_name] >= target_current:
+                continue
+            candidates = [
+                (component, self._index[component].cheapest(component, target_current, specs))
+                for component, (limit, _) in UPGRADE_COMPONENTS.items()
+                if limit == limit_name and _applies(component, specs)
+            ]
+            candidates = [(component, option) for component, option in candidates if option is not None]
+            if not candidates:
+                blocking.append(limit_name)
+                continue
+            component, option = min(candidates, key=lambda c: c[1].cost)
+            changes[UPGRADE_COMPONENTS[component][1]] = option.rating
+            if component == "motor":
+                changes["motor_type"] = option.motor_type
+            upgrades.append({
+                "component": component,
+                "name": option.name,
+                "rating": option.rating,
+                "cost": option.cost,
+                "limit_before": limits[limit_name],
+                "limit_after": _limit_from_key(component, option.key, specs),
+            })
+
+        if blocking:
+            return {
+                "feasible": False,
+                "target_current": target_current,
+                "total_cost": None,
+                "upgrades": upgrades,
+                "blocking": blocking,
+                "before": before,
+                "after": None,
+            }
+        return {
+            "feasible": True,
+            "target_current": target_current,
+            "total_cost": sum(u["cost"] for u in upgrades),
+            "upgrades": upgrades,
+            "blocking": [],
+            "before": before,
+            "after": SafetyCalculator.calculate_fast(specs._replace(**changes)),
+        }
+
+
+# 全局单例
+_catalog: Optional[UpgradeCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_upgrade_catalog() -> UpgradeCatalog:
+    """获取配件目录单例（首次使用时加载 settings.UPGRADE_CATALOG_PATH）"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = UpgradeCatalog.from_file(settings.UPGRADE_CATALOG_PATH or DEFAULT_CATALOG_PATH)
+    return _catalog
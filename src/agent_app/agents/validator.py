@@ -1,4 +1,5 @@
-from typing import Literal, Optional, Dict, Any
+from functools import lru_cache
+from typing import Literal, Optional, Dict, Any, List, Mapping, NamedTuple
 from pydantic import BaseModel, Field, model_validator
 import math
 
@@ -9,6 +10,23 @@ WIRE_CURRENT_PER_SQMM = 12.0  # 每平方毫米线径承载电流
 SAFE_TEMP_MOTOR = 100.0       # 电机安全温度
 SAFE_TEMP_CONTROLLER = 90.0   # 控制器安全温度
 
+# 批量计算中短板组件的编码（calculate_batch 返回的 bottleneck 为该元组的下标，-1 表示无效行）
+BOTTLENECK_COMPONENTS = ("battery", "motor", "wire", "breaker", "controller")
+# 批量输入中电池类型、电机类型的整数编码（也可以直接传字符串数组）
+BATTERY_TYPE_CODES = {"lead_acid": 0, "lithium": 1}
+MOTOR_TYPE_CODES = {"standard": 0, "performance": 1}
+# 必填的数值列
+_REQUIRED_COLUMNS = ("voltage", "motor_power_rated", "wire_gauge", "breaker_rating", "controller_max_current")
+# SafetyCalculator.calculate_fast 的结果缓存条目数
+CALCULATION_CACHE_SIZE = 65536
+
+# 各短板组件的风险提示话术
+_WARNING_TEMPLATES = {
+    "battery": "系统短板在电池。建议母线电流不超过 {}A，否则可能导致电池过热或保护板断电。",
+    "wire": "系统短板在主线。建议母线电流不超过 {}A，否则可能导致线路发热熔断。",
+    "motor": "系统短板在电机。建议母线电流不超过 {}A，强行加大电流可能导致电机退磁。",
+}
+
 class VehicleSpecs(BaseModel):
     """车辆参数输入模型"""
     
@@ -39,6 +57,108 @@ class VehicleSpecs(BaseModel):
             raise ValueError("锂电池必须提供保护板持续电流(A) [cite: 26]")
         return self
 
+    def to_fast(self) -> "FastSpecs":
+        """转换为 FastSpecs（已校验过，不再重复校验）"""
+        return FastSpecs(
+            self.battery_type, self.voltage, self.capacity_ah, self.bms_current,
+            self.motor_power_rated, self.motor_type, self.wire_gauge,
+            self.breaker_rating, self.controller_max_current,
+        )
+
+class FastSpecs(NamedTuple):
+    """
+    车辆参数的轻量表示（不可变、无实例字典、可哈希）
+
+    用于批量评估大量候选配置：构造开销只有 VehicleSpecs 的一小部分，且可以直接
+    作为缓存键。字段与 VehicleSpecs 相同，SafetyCalculator 两者都接受。
+    对外接口（API 入参、LLM 输出）仍使用 VehicleSpecs。
+    """
+    battery_type: str
+    voltage: float
+    capacity_ah: Optional[float]
+    bms_current: Optional[float]
+    motor_power_rated: float
+    motor_type: str
+    wire_gauge: float
+    breaker_rating: float
+    controller_max_current: float
+
+    @classmethod
+    def create(
+        cls,
+        battery_type: str,
+        voltage: float,
+        motor_power_rated: float,
+        wire_gauge: float,
+        breaker_rating: float,
+        controller_max_current: float,
+        capacity_ah: Optional[float] = None,
+        bms_current: Optional[float] = None,
+        motor_type: str = "standard",
+    ) -> "FastSpecs":
+        """校验并构造，规则与 VehicleSpecs 相同，校验失败抛出 ValueError"""
+        return _validate_fast(
+            battery_type, voltage, capacity_ah, bms_current, motor_power_rated,
+            motor_type, wire_gauge, breaker_rating, controller_max_current,
+        )
+
+    def to_model(self) -> VehicleSpecs:
+        """转换为 VehicleSpecs（已校验过，使用 model_construct 跳过重复校验）"""
+        return VehicleSpecs.model_construct(**self._asdict())
+
+def _compile_fast_validator():
+    """预先生成 FastSpecs 的校验函数：电池类型规则查表，避免逐条分支"""
+    motor_types = frozenset(VehicleSpecs.model_fields["motor_type"].annotation.__args__)
+    # 电池类型 -> (必填字段在参数中的位置, 错误信息)
+    battery_rules = {
+        "lead_acid": (2, "铅酸电池必须提供容量(Ah)"),
+        "lithium": (3, "锂电池必须提供保护板持续电流(A) [cite: 26]"),
+    }
+    # 可以为 None 的数值字段
+    optional = frozenset({"capacity_ah", "bms_current"})
+    make = tuple.__new__
+
+    def numeric_error(args) -> str:
+        """数值转换失败时找出具体字段（只在出错时执行，不影响正常路径）"""
+        for name, value in zip(FastSpecs._fields, args):
+            if name in ("battery_type", "motor_type") or (value is None and name in optional):
+                continue
+            if value is None:
+                return f"缺少必填字段: {name}"
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                return f"字段 {name} 不是数值: {value!r}"
+        return "参数不是数值"
+
+    def validate(battery_type, voltage, capacity_ah, bms_current, motor_power_rated,
+                 motor_type, wire_gauge, breaker_rating, controller_max_current) -> FastSpecs:
+        rule = battery_rules.get(battery_type)
+        if rule is None:
+            raise ValueError(f"未知的电池类型: {battery_type!r}")
+        if motor_type not in motor_types:
+            raise ValueError(f"未知的电机类型: {motor_type!r}")
+        try:
+            values = [
+                battery_type, float(voltage),
+                None if capacity_ah is None else float(capacity_ah),
+                None if bms_current is None else float(bms_current),
+                float(motor_power_rated), motor_type, float(wire_gauge),
+                float(breaker_rating), float(controller_max_current),
+            ]
+        except (TypeError, ValueError):
+            raise ValueError(numeric_error((
+                battery_type, voltage, capacity_ah, bms_current, motor_power_rated,
+                motor_type, wire_gauge, breaker_rating, controller_max_current,
+            ))) from None
+        if not values[rule[0]]:
+            raise ValueError(rule[1])
+        return make(FastSpecs, values)
+
+    return validate
+
+_validate_fast = _compile_fast_validator()
+
 class SafetyCalculator:
     """木桶原理计算器 [cite: 103-111]"""
 
@@ -82,15 +202,186 @@ class SafetyCalculator:
             "warning": SafetyCalculator._generate_warning(bottleneck, safe_current)
         }
 
+    @staticmethod
+    def calculate_fast(specs: FastSpecs) -> Dict[str, Any]:
+        """
+        带缓存的 calculate_max_bus_current，以 FastSpecs 元组为键
+
+        返回值是缓存结果的浅拷贝（details 也复制一份），调用方可以放心修改。
+        """
+        result = _calculate_cached(specs)
+        return {**result, "details": dict(result["details"])}
+
+    @staticmethod
+    def cache_info():
+        """calculate_fast 的缓存命中统计"""
+        return _calculate_cached.cache_info()
+
+    @staticmethod
+    def calculate_batch(columns: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        批量计算安全母线电流（向量化，用于全车队安全审计）
+
+        Args:
+            columns: 列名到数组的映射，或带同名字段的 NumPy 结构化数组（record array）。
+                列名与 VehicleSpecs 字段一致；battery_type / motor_type 可以是字符串数组或
+                BATTERY_TYPE_CODES / MOTOR_TYPE_CODES 中的整数编码，motor_type 缺省为 standard；
+                数值列中的 NaN 表示未填写。
+
+        Returns:
+            {
+                "safe_bus_current": float64 数组，保留一位小数，无效行为 NaN,
+                "bottleneck": int8 数组，BOTTLENECK_COMPONENTS 的下标，无效行为 -1,
+                "details": {组件: float64 数组},  # 各组件电流上限，无效行为 NaN
+                "valid": bool 数组,
+                "errors": {错误类型: bool 数组}  # 各校验规则未通过的行
+            }
+
+        有效行的结果与 calculate_max_bus_current 逐条计算完全一致；单条计算会抛出
+        异常的行（VehicleSpecs 校验失败、电压为 0）在 valid 中标记为 False。
+        """
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("批量计算需要安装 numpy：pip install numpy") from e
+
+        def column(name: str, default: Any = None):
+            if name in _field_names(columns):
+                return np.asarray(columns[name])
+            return default
+
+        def codes(name: str, mapping: Dict[str, int], default: Optional[str] = None):
+            values = column(name)
+            if values is None:
+                values = np.full(n, default if default is not None else "", dtype=object)
+            if values.dtype.kind in "iu":
+                return values.astype(np.int8)
+            result = np.full(values.shape, -1, dtype=np.int8)
+            for label, code in mapping.items():
+                result[values == label] = code
+            return result
+
+        def numeric(name: str):
+            values = column(name)
+            if values is None:
+                return np.full(n, np.nan)
+            # None（object 数组）同样视为未填写
+            return np.asarray(values, dtype=np.float64) if values.dtype != object else np.array(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+
+        n = len(columns[next(iter(_field_names(columns)))])
+        battery_type = codes("battery_type", BATTERY_TYPE_CODES)
+        motor_type = codes("motor_type", MOTOR_TYPE_CODES, default="standard")
+        voltage = numeric("voltage")
+        capacity_ah = numeric("capacity_ah")
+        bms_current = numeric("bms_current")
+        motor_power = numeric("motor_power_rated")
+        wire_gauge = numeric("wire_gauge")
+        breaker_rating = numeric("breaker_rating")
+        controller_max = numeric("controller_max_current")
+
+        lead_acid = battery_type == BATTERY_TYPE_CODES["lead_acid"]
+        lithium = battery_type == BATTERY_TYPE_CODES["lithium"]
+        numbers = {
+            "voltage": voltage,
+            "motor_power_rated": motor_power,
+            "wire_gauge": wire_gauge,
+            "breaker_rating": breaker_rating,
+            "controller_max_current": controller_max,
+        }
+        errors = {
+            "invalid_battery_type": ~(lead_acid | lithium),
+            "invalid_motor_type": (motor_type != 0) & (motor_type != 1),
+            # 与 VehicleSpecs 一致：铅酸必须提供容量，锂电必须提供保护板电流（0 视为未提供）
+            "missing_capacity_ah": lead_acid & (np.isnan(capacity_ah) | (capacity_ah == 0)),
+            "missing_bms_current": lithium & (np.isnan(bms_current) | (bms_current == 0)),
+            "missing_field": np.logical_or.reduce([np.isnan(numbers[name]) for name in _REQUIRED_COLUMNS]),
+            "zero_voltage": voltage == 0,
+        }
+        valid = ~np.logical_or.reduce(list(errors.values()))
+
+        # 运算顺序与单条计算保持一致，保证浮点结果逐位相同
+        coeff = np.where(motor_type == MOTOR_TYPE_CODES["performance"], MOTOR_COEFF_PERFORMANCE, MOTOR_COEFF_STANDARD)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            limits = np.stack([
+                np.where(lead_acid, capacity_ah * 2.5, bms_current),
+                (motor_power * coeff) / voltage,
+                wire_gauge * WIRE_CURRENT_PER_SQMM,
+                breaker_rating * 0.8,
+                controller_max * 0.8,
+            ])
+        limits[:, ~valid] = np.nan
+
+        # argmin 在并列时取第一个，与 min(limits, key=limits.get) 的字典顺序一致
+        bottleneck = np.full(n, -1, dtype=np.int8)
+        bottleneck[valid] = np.argmin(limits[:, valid], axis=0)
+        safe_current = limits.min(axis=0, initial=np.inf, where=valid)
+        safe_current[~valid] = np.nan
+
+        return {
+            "safe_bus_current": _round_like_python(np, safe_current, 1),
+            "bottleneck": bottleneck,
+            "details": dict(zip(BOTTLENECK_COMPONENTS, limits)),
+            "valid": valid,
+            "errors": errors,
+        }
+
+    @staticmethod
+    def record_errors(record: Mapping[str, Any]) -> List[str]:
+        """
+        单条记录未通过的校验规则（不依赖 numpy）
+
+        规则名称与 calculate_batch 返回的 errors 键一致，逐条计算的调用方在 VehicleSpecs
+        校验失败时用它生成与向量化计算相同的错误描述。
+        """
+        def number(name: str) -> float:
+            value = record.get(name)
+            try:
+                return math.nan if value in (None, "") else float(value)
+            except (TypeError, ValueError):
+                return math.nan
+
+        battery_type = record.get("battery_type")
+        capacity_ah, bms_current = number("capacity_ah"), number("bms_current")
+        errors = {
+            "invalid_battery_type": battery_type not in BATTERY_TYPE_CODES,
+            "invalid_motor_type": (record.get("motor_type") or "standard") not in MOTOR_TYPE_CODES,
+            "missing_capacity_ah": battery_type == "lead_acid" and (math.isnan(capacity_ah) or capacity_ah == 0),
+            "missing_bms_current": battery_type == "lithium" and (math.isnan(bms_current) or bms_current == 0),
+            "missing_field": any(math.isnan(number(name)) for name in _REQUIRED_COLUMNS),
+            "zero_voltage": number("voltage") == 0,
+        }
+        return [name for name, failed in errors.items() if failed]
+
     @staticmethod
     def _generate_warning(bottleneck: str, value: float) -> str:
         """生成风险提示话术 [cite: 79]"""
-        msgs = {
-            "battery": f"系统短板在电池。建议母线电流不超过 {value}A，否则可能导致电池过热或保护板断电。",
-            "wire": f"系统短板在主线。建议母线电流不超过 {value}A，否则可能导致线路发热熔断。",
-            "motor": f"系统短板在电机。建议母线电流不超过 {value}A，强行加大电流可能导致电机退磁。",
-        }
-        return msgs.get(bottleneck, f"建议最大母线电流设定为 {value}A。")
+        # 只格式化用到的那一条，批量评估时这里是热点
+        return _WARNING_TEMPLATES.get(bottleneck, "建议最大母线电流设定为 {}A。").format(value)
+
+@lru_cache(maxsize=CALCULATION_CACHE_SIZE)
+def _calculate_cached(specs: FastSpecs) -> Dict[str, Any]:
+    return SafetyCalculator.calculate_max_bus_current(specs)
+
+def _field_names(columns: Any):
+    """结构化数组返回字段名，映射返回键"""
+    dtype = getattr(columns, "dtype", None)
+    return dtype.names if dtype is not None and dtype.names else columns.keys()
+
+def _round_like_python(np, values, ndigits: int):
+    """
+    与内置 round() 结果逐位一致的向量化取整
+
+    np.round 先乘 10**ndigits 再取整，恰好落在 .5 附近的值可能与 round()
+    （按二进制真实值做银行家舍入）不同；这类值很少，逐个改用 round() 计算。
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
 
 # 使用示例
 if __name__ == "__main__":
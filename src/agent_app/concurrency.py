@@ -0,0 +1,65 @@
+"""
+并发执行工具
+
+FastAPI 的异步接口运行在事件循环上，任何同步阻塞调用（LLM、MCP、文件 IO）
+都必须放到线程池里执行，否则会卡住同一 worker 上的所有会话。
+线程池大小由 settings.GRAPH_THREAD_POOL_SIZE 控制。
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 全局线程池（延迟创建）
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取进程级共享线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                size = max(1, settings.GRAPH_THREAD_POOL_SIZE)
+                _executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="agent-sync")
+                logger.info(f"创建同步任务线程池，大小: {size}")
+    return _executor
+
+
+def install_default_executor(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """
+    将共享线程池设置为事件循环的默认 executor
+
+    LangGraph 在 ainvoke 时会通过 run_in_executor(None, ...) 执行同步节点，
+    设置默认 executor 后这些调用也会使用可配置大小的线程池。
+    """
+    loop = loop or asyncio.get_running_loop()
+    loop.set_default_executor(get_executor())
+
+
+async def run_in_threadpool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在共享线程池中执行同步函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    return await loop.run_in_executor(get_executor(), func, *args)
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """关闭共享线程池（服务退出时调用）"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
@@ -5,6 +5,7 @@ import json
 
 # 后端 API 地址
 API_URL = "http://localhost:8000/chat"
+STREAM_API_URL = "http://localhost:8000/chat/stream"
 
 # 页面配置
 try:
@@ -83,6 +84,36 @@ def get_mock_info():
     # 过滤空值，模拟真实数据缺失的情况
     return {k: v for k, v in info.items() if v}
 
+def stream_chat(payload: dict, final: dict):
+    """
+    调用流式接口，逐段产出回复文本
+
+    节点输出和 LLM token 到达即显示；最终的 final 事件写入 final 字典，
+    供调用方读取 is_info_complete 等字段。
+    """
+    with requests.post(STREAM_API_URL, json=payload, stream=True, timeout=(5, 300)) as response:
+        response.raise_for_status()
+        event = None
+        shown = False
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                # 空 token、只删除旧消息的节点（history）不输出空白片段
+                texts = [text for text in data.get("messages", []) if text] if event == "node" else []
+                if event == "token" and data["content"]:
+                    shown = True
+                    yield data["content"]
+                elif texts:
+                    # 节点消息即最新回复，逐个节点显示
+                    yield ("\n\n" if shown else "") + "\n\n".join(texts)
+                    shown = True
+                elif event == "final":
+                    final.update(data)
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+
 # --- 4. 聊天界面渲染 ---
 st.title("🔧 普小售后智能诊断系统")
 
@@ -98,30 +129,26 @@ if prompt := st.chat_input("描述您的问题，例如：我想调大电流..."
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # 2. 调用后端 API
-    try:
-        payload = {
-            "message": prompt,
-            "thread_id": st.session_state.session_id,
-            "mock_info": get_mock_info()  # 实时传入侧边栏数据
-        }
-        
-        with st.spinner("AI 正在诊断中..."):
-            response = requests.post(API_URL, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            
-            ai_reply = data["response"]
-            
+    # 2. 调用后端流式 API，边执行边显示
+    payload = {
+        "message": prompt,
+        "thread_id": st.session_state.session_id,
+        "mock_info": get_mock_info()  # 实时传入侧边栏数据
+    }
+    final = {}
+    with st.chat_message("assistant"):
+        try:
+            st.write_stream(stream_chat(payload, final))
+            ai_reply = final.get("response", "")
+
             # 可视化调试信息（可选）
-            if not data.get("is_info_complete"):
+            if not final.get("is_info_complete"):
                 with st.expander("🔍 系统提示：信息不全", expanded=False):
                     st.warning("Agent 正在尝试收集更多信息，请配合回答。")
 
-    except Exception as e:
-        ai_reply = f"❌ 连接服务器失败: {str(e)}\n请确保后端服务 (`server.py`) 已在端口 8000 启动。"
+        except Exception as e:
+            ai_reply = f"❌ 连接服务器失败: {str(e)}\n请确保后端服务 (`server.py`) 已在端口 8000 启动。"
+            st.markdown(ai_reply)
 
-    # 3. 显示 AI 回复
+    # 3. 记录 AI 回复（以最终结果为准）
     st.session_state.messages.append({"role": "assistant", "content": ai_reply})
-    with st.chat_message("assistant"):
-        st.markdown(ai_reply)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from .build import build_graph
+from .build import build_graph, get_graph
 from .state import AgentState
 
-__all__ = ["build_graph", "AgentState"]
+__all__ = ["build_graph", "get_graph", "AgentState"]
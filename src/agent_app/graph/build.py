@@ -1,40 +1,68 @@
+from functools import lru_cache
+from typing import Optional
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langchain_core.runnables import RunnableLambda
 from agent_app.graph.state import AgentState
 from agent_app.graph.constants import *
 from agent_app.graph.routing import route_supervisor, route_after_collector
+from agent_app.graph.checkpoints import get_checkpointer
+from agent_app.graph.history import compact_history, acompact_history
 
-# 导入具体的 Agent 函数
-from agent_app.agents.executor import diagnostic_agent
-from agent_app.agents.collector import collector_node
+def build_graph(checkpointer: Optional[BaseCheckpointSaver] = None):
+    """
+    构建 LangGraph 工作流
 
-def build_graph():
-    """构建 LangGraph 工作流"""
+    Args:
+        checkpointer: 会话状态存储，默认按 settings.CHECKPOINT_BACKEND 创建
+    """
+    # 导入具体的 Agent 函数（延迟导入，避免 agents 与 graph 之间的循环依赖）
+    from agent_app.agents.executor import get_diagnostic_agent
+    from agent_app.agents.collector import collector_node, acollector_node
+    from agent_app.agents.extractor import extractor_node, aextractor_node
+    from agent_app.agents.planner import planner_node, aplanner_node
+    from agent_app.agents.rag import rag_node, arag_node
+
+    diagnostic_agent = get_diagnostic_agent()
     workflow = StateGraph(AgentState)
 
     # 1. 添加节点
-    workflow.add_node(NODE_COLLECTOR, collector_node)
-    workflow.add_node(NODE_DIAGNOSTICIAN, diagnostic_agent.invoke)
+    # 同时注册同步与异步实现：graph.invoke 走同步路径，graph.ainvoke 走异步路径
+    # 信息收集阶段先从自由文本中抽取字段，减少追问轮次
+    workflow.add_node(NODE_EXTRACTOR, RunnableLambda(extractor_node, afunc=aextractor_node))
+    workflow.add_node(NODE_COLLECTOR, RunnableLambda(collector_node, afunc=acollector_node))
+    # 进入诊断前按 customer_info 生成执行计划，诊断节点据此把可自动完成的步骤合并到同一轮
+    workflow.add_node(NODE_PLANNER, RunnableLambda(planner_node, afunc=aplanner_node))
+    workflow.add_node(NODE_DIAGNOSTICIAN, RunnableLambda(diagnostic_agent.invoke, afunc=diagnostic_agent.ainvoke))
+    # 查资料：在本地 BM25 索引中检索手册、SOP 模板与 changeLog
+    workflow.add_node(NODE_RAG, RunnableLambda(rag_node, afunc=arag_node))
+    # 每轮结束前折叠窗口外的历史消息，控制 checkpoint 大小
+    workflow.add_node(NODE_HISTORY, RunnableLambda(compact_history, afunc=acompact_history))
 
     # 2. 设置条件入口点（使用 Supervisor 路由逻辑）
     # 注意：使用 set_conditional_entry_point 时不需要 set_entry_point
     workflow.set_conditional_entry_point(
         route_supervisor,
         {
-            NODE_COLLECTOR: NODE_COLLECTOR,
-            NODE_DIAGNOSTICIAN: NODE_DIAGNOSTICIAN,
-            "__end__": END
+            NODE_RAG: NODE_RAG,
+            NODE_EXTRACTOR: NODE_EXTRACTOR,
+            NODE_DIAGNOSTICIAN: NODE_PLANNER,
+            "__end__": NODE_HISTORY
         }
     )
 
     # 3. 设置边 (Edge)
+    workflow.add_edge(NODE_EXTRACTOR, NODE_COLLECTOR)
+    workflow.add_edge(NODE_PLANNER, NODE_DIAGNOSTICIAN)
+    workflow.add_edge(NODE_RAG, NODE_HISTORY)
+
     # Collector 完成后，根据信息是否完整决定下一步
     workflow.add_conditional_edges(
         NODE_COLLECTOR,
         route_after_collector,
         {
-            NODE_DIAGNOSTICIAN: NODE_DIAGNOSTICIAN,
-            "__end__": END
+            NODE_DIAGNOSTICIAN: NODE_PLANNER,
+            "__end__": NODE_HISTORY
         }
     )
 
@@ -44,12 +72,21 @@ def build_graph():
         NODE_DIAGNOSTICIAN,
         route_after_diagnostician,
         {
-            "__end__": END
+            "__end__": NODE_HISTORY
         }
     )
 
+    # 本轮结束
+    workflow.add_edge(NODE_HISTORY, END)
+
     # 4. 编译（添加 Checkpoint 以保存状态）
-    # 使用内存 Checkpoint，生产环境可以换成 SqliteSaver 或 RedisSaver
-    memory = MemorySaver()
-    app = workflow.compile(checkpointer=memory)
-    return app
\ No newline at end of file
+    # 多 worker 部署时使用 sqlite / redis 后端，见 graph/checkpoints.py
+    if checkpointer is None:
+        checkpointer = get_checkpointer()
+    app = workflow.compile(checkpointer=checkpointer)
+    return app
+
+@lru_cache(maxsize=1)
+def get_graph():
+    """获取编译好的工作流单例（首次调用时构建）"""
+    return build_graph()
@@ -1,4 +1,753 @@
 """
-Optional: centralize checkpointer wiring here (sqlite/redis/etc.).
-For MVP, keep empty or add later.
+Checkpointer 集中配置
+
+LangGraph 通过 Checkpointer 保存每个 thread_id 的会话状态。可选后端：
+- memory: 进程内 BoundedMemorySaver（带 TTL 与 LRU 淘汰），适合开发和单 worker 部署
+- sqlite: 本地 SQLite 文件（WAL 模式），同一台机器上的多个 worker 进程可共享会话
+- redis:  Redis 协议后端，多台机器共享会话，无需粘性会话
+
+通过 settings.CHECKPOINT_BACKEND 选择，build_graph() 默认使用 get_checkpointer()。
 """
+from __future__ import annotations
+
+import abc
+import logging
+import queue
+import random
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from agent_app.concurrency import run_in_threadpool
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (checkpoint_id, parent_checkpoint_id, (type, checkpoint), (type, metadata))
+CheckpointRow = Tuple[str, Optional[str], Tuple[str, bytes], Tuple[str, bytes]]
+# (task_id, idx, channel, (type, value), task_path)
+WriteRow = Tuple[str, int, str, Tuple[str, bytes], str]
+
+
+class KVCheckpointSaver(BaseCheckpointSaver[str], abc.ABC):
+    """
+    基于键值存储的 Checkpointer 基类
+
+    实现 LangGraph 的 get_tuple/list/put/put_writes 语义，子类只需提供
+    checkpoint 与 pending writes 的存取原语。checkpoint 整体序列化存储，
+    异步接口在共享线程池中执行同步实现。
+    """
+
+    def __init__(self, *, serde: Optional[SerializerProtocol] = None) -> None:
+        super().__init__(serde=serde)
+
+    # ---- 存储原语（子类实现） ----
+
+    @abc.abstractmethod
+    def _save_checkpoint(self, thread_id: str, checkpoint_ns: str, row: CheckpointRow) -> None:
+        """保存一个 checkpoint（同一 checkpoint_id 覆盖）"""
+
+    @abc.abstractmethod
+    def _load_checkpoint(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]
+    ) -> Optional[CheckpointRow]:
+        """checkpoint_id 为 None 时返回最新的 checkpoint"""
+
+    @abc.abstractmethod
+    def _iter_checkpoints(
+        self,
+        thread_id: Optional[str],
+        checkpoint_ns: Optional[str],
+        before_id: Optional[str],
+    ) -> Iterator[Tuple[str, str, CheckpointRow]]:
+        """按 checkpoint_id 倒序产出 (thread_id, checkpoint_ns, row)"""
+
+    @abc.abstractmethod
+    def _save_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: List[WriteRow]) -> None:
+        """批量写入；idx >= 0 的写入已存在时保留旧值，idx < 0（错误/中断）覆盖"""
+
+    @abc.abstractmethod
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[WriteRow]:
+        """读取某个 checkpoint 的全部 pending writes（顺序不限）"""
+
+    # ---- LangGraph 接口 ----
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: CheckpointRow) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint, metadata = row
+        writes = sorted(
+            self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+            key=lambda w: writes_sort_key(w[4], w[0], w[1]),
+        )
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed(checkpoint),
+            metadata=self.serde.loads_typed(metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed(value)) for task_id, _, channel, value, _ in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        row = self._load_checkpoint(thread_id, checkpoint_ns, get_checkpoint_id(config))
+        if row is None:
+            return None
+        return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"] if config else None
+        checkpoint_ns = config["configurable"].get("checkpoint_ns") if config else None
+        config_checkpoint_id = get_checkpoint_id(config) if config else None
+        before_id = get_checkpoint_id(before) if before else None
+
+        for tid, ns, row in self._iter_checkpoints(thread_id, checkpoint_ns, before_id):
+            if config_checkpoint_id and row[0] != config_checkpoint_id:
+                continue
+            if filter:
+                metadata = self.serde.loads_typed(row[3])
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield self._to_tuple(tid, ns, row)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        row = (
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            self.serde.dumps_typed(checkpoint),
+            self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+        )
+        self._save_checkpoint(thread_id, checkpoint_ns, row)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        rows = [
+            (task_id, WRITES_IDX_MAP.get(channel, idx), channel, self.serde.dumps_typed(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        if rows:
+            self._save_writes(
+                config["configurable"]["thread_id"],
+                config["configurable"].get("checkpoint_ns", ""),
+                config["configurable"]["checkpoint_id"],
+                rows,
+            )
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---- 异步接口：在共享线程池中执行 ----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await run_in_threadpool(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await run_in_threadpool(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_in_threadpool(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await run_in_threadpool(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await run_in_threadpool(self.delete_thread, thread_id)
+
+
+class SqliteCheckpointSaver(KVCheckpointSaver):
+    """
+    SQLite Checkpointer
+
+    - WAL 模式：读写互不阻塞，多个 worker 进程可同时访问同一个数据库文件
+    - 连接池：每个连接只被一个线程同时使用，避免连接级锁竞争
+    - 批量写入：一次 put_writes 的所有写入在同一个事务中 executemany 提交
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT,
+        checkpoint BLOB,
+        metadata_type TEXT,
+        metadata BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    );
+    CREATE TABLE IF NOT EXISTS writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT,
+        value BLOB,
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    );
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        pool_size: int = 8,
+        busy_timeout_ms: int = 5000,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=pool_size)
+        self._all_connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._pool_size = pool_size
+
+        with self._connection() as conn:
+            conn.executescript(self._SCHEMA)
+        logger.info(f"SQLite Checkpointer 已就绪: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借出一个连接，用完归还"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                if len(self._all_connections) < self._pool_size:
+                    conn = self._connect()
+                    self._all_connections.append(conn)
+                else:
+                    conn = None
+            if conn is None:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        with self._pool_lock:
+            for conn in self._all_connections:
+                conn.close()
+            self._all_connections.clear()
+
+    def _save_checkpoint(self, thread_id: str, checkpoint_ns: str, row: CheckpointRow) -> None:
+        checkpoint_id, parent_id, (ctype, cblob), (mtype, mblob) = row
+        with self._connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint_id, parent_id, ctype, cblob, mtype, mblob),
+            )
+
+    def _load_checkpoint(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]
+    ) -> Optional[CheckpointRow]:
+        sql = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            sql += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            sql += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._connection() as conn:
+            found = conn.execute(sql, params).fetchone()
+        if found is None:
+            return None
+        cid, parent_id, ctype, cblob, mtype, mblob = found
+        return cid, parent_id, (ctype, cblob), (mtype, mblob)
+
+    def _iter_checkpoints(
+        self,
+        thread_id: Optional[str],
+        checkpoint_ns: Optional[str],
+        before_id: Optional[str],
+    ) -> Iterator[Tuple[str, str, CheckpointRow]]:
+        clauses, params = [], []
+        if thread_id is not None:
+            clauses.append("thread_id = ?")
+            params.append(thread_id)
+        if checkpoint_ns is not None:
+            clauses.append("checkpoint_ns = ?")
+            params.append(checkpoint_ns)
+        if before_id is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            f"metadata_type, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC"
+        )
+        with self._connection() as conn:
+            found = conn.execute(sql, params).fetchall()
+        for tid, ns, cid, parent_id, ctype, cblob, mtype, mblob in found:
+            yield tid, ns, (cid, parent_id, (ctype, cblob), (mtype, mblob))
+
+    def _save_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: List[WriteRow]) -> None:
+        params = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, vtype, vblob, task_path)
+            for task_id, idx, channel, (vtype, vblob), task_path in rows
+        ]
+        ignore = [p for p in params if p[4] >= 0]
+        replace = [p for p in params if p[4] < 0]
+        with self._connection() as conn, conn:
+            if ignore:
+                conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", ignore)
+            if replace:
+                conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", replace)
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[WriteRow]:
+        with self._connection() as conn:
+            found = conn.execute(
+                "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+        return [(task_id, idx, channel, (vtype, vblob), task_path) for task_id, idx, channel, vtype, vblob, task_path in found]
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._connection() as conn, conn:
+            conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+
+def _pack(*parts: Optional[bytes]) -> bytes:
+    """长度前缀编码多个字节串（None 编码为长度 -1）"""
+    out = bytearray()
+    for part in parts:
+        if part is None:
+            out += struct.pack(">i", -1)
+        else:
+            out += struct.pack(">i", len(part)) + part
+    return bytes(out)
+
+
+def _unpack(data: bytes) -> List[Optional[bytes]]:
+    parts: List[Optional[bytes]] = []
+    pos = 0
+    while pos < len(data):
+        (size,) = struct.unpack_from(">i", data, pos)
+        pos += 4
+        if size < 0:
+            parts.append(None)
+        else:
+            parts.append(data[pos:pos + size])
+            pos += size
+    return parts
+
+
+def _text(value: Optional[bytes]) -> Optional[str]:
+    return value.decode("utf-8") if value is not None else None
+
+
+class RedisCheckpointSaver(KVCheckpointSaver):
+    """
+    Redis 协议 Checkpointer
+
+    只依赖 hash / set / sorted set 的基本命令和 pipeline，
+    任何兼容 Redis 协议的服务（Redis、KeyDB、Dragonfly 等）都可以使用。
+
+    键布局（{p} 为前缀）：
+    - {p}:threads                          所有 thread_id
+    - {p}:ns:{thread}                      该 thread 的 checkpoint_ns 集合
+    - {p}:ckpt:{thread}:{ns}               hash: checkpoint_id -> checkpoint
+    - {p}:ids:{thread}:{ns}                sorted set（分数均为 0，按字典序）: checkpoint_id，
+                                           取最新/分页时只读需要的 checkpoint，不下载整段历史
+    - {p}:writes:{thread}:{ns}:{cid}       hash: task_id/idx -> write
+    - {p}:keys:{thread}                    该 thread 的所有 writes 键，便于删除
+    """
+
+    def __init__(self, client: Any, *, prefix: str = "agent_app", serde: Optional[SerializerProtocol] = None) -> None:
+        super().__init__(serde=serde)
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisCheckpointSaver":
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("使用 redis Checkpointer 需要安装 redis：pip install redis") from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    # 分页读取历史 checkpoint 时每批的数量
+    PAGE_SIZE = 64
+
+    def _ckpt_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}:ckpt:{thread_id}:{checkpoint_ns}"
+
+    def _ids_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}:ids:{thread_id}:{checkpoint_ns}"
+
+    def _writes_key(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"{self.prefix}:writes:{thread_id}:{checkpoint_ns}:{checkpoint_id}"
+
+    @staticmethod
+    def _decode_row(checkpoint_id: str, payload: bytes) -> CheckpointRow:
+        parent_id, ctype, cblob, mtype, mblob = _unpack(payload)
+        return checkpoint_id, _text(parent_id), (_text(ctype), cblob), (_text(mtype), mblob)
+
+    def _save_checkpoint(self, thread_id: str, checkpoint_ns: str, row: CheckpointRow) -> None:
+        checkpoint_id, parent_id, (ctype, cblob), (mtype, mblob) = row
+        payload = _pack(
+            parent_id.encode("utf-8") if parent_id else None,
+            ctype.encode("utf-8"), cblob, mtype.encode("utf-8"), mblob,
+        )
+        pipe = self.client.pipeline()
+        pipe.hset(self._ckpt_key(thread_id, checkpoint_ns), checkpoint_id, payload)
+        pipe.zadd(self._ids_key(thread_id, checkpoint_ns), {checkpoint_id: 0})
+        pipe.sadd(f"{self.prefix}:ns:{thread_id}", checkpoint_ns)
+        pipe.sadd(f"{self.prefix}:threads", thread_id)
+        pipe.execute()
+
+    def _page_ids(self, thread_id: str, checkpoint_ns: str, before_id: Optional[str], count: int) -> List[str]:
+        """按 checkpoint_id 倒序取 before_id 之前（不含）的 count 个 id"""
+        key = self._ids_key(thread_id, checkpoint_ns)
+        upper = f"({before_id}" if before_id is not None else "+"
+        return [_text(cid) for cid in self.client.zrevrangebylex(key, upper, "-", start=0, num=count)]
+
+    def _load_checkpoint(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]
+    ) -> Optional[CheckpointRow]:
+        if not checkpoint_id:
+            latest = self._page_ids(thread_id, checkpoint_ns, None, 1)
+            if not latest:
+                return None
+            checkpoint_id = latest[0]
+        payload = self.client.hget(self._ckpt_key(thread_id, checkpoint_ns), checkpoint_id)
+        return self._decode_row(checkpoint_id, payload) if payload is not None else None
+
+    def _iter_checkpoints(
+        self,
+        thread_id: Optional[str],
+        checkpoint_ns: Optional[str],
+        before_id: Optional[str],
+    ) -> Iterator[Tuple[str, str, CheckpointRow]]:
+        if thread_id is not None:
+            thread_ids = [thread_id]
+        else:
+            thread_ids = sorted(_text(t) for t in self.client.smembers(f"{self.prefix}:threads"))
+        for tid in thread_ids:
+            if checkpoint_ns is not None:
+                namespaces = [checkpoint_ns]
+            else:
+                namespaces = sorted(_text(ns) for ns in self.client.smembers(f"{self.prefix}:ns:{tid}"))
+            for ns in namespaces:
+                # 分页读取，list(limit=...) 只下载需要的 checkpoint
+                cursor = before_id
+                while True:
+                    ids = self._page_ids(tid, ns, cursor, self.PAGE_SIZE)
+                    if not ids:
+                        break
+                    payloads = self.client.hmget(self._ckpt_key(tid, ns), ids)
+                    for cid, payload in zip(ids, payloads):
+                        if payload is not None:
+                            yield tid, ns, self._decode_row(cid, payload)
+                    if len(ids) < self.PAGE_SIZE:
+                        break
+                    cursor = ids[-1]
+
+    def _save_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: List[WriteRow]) -> None:
+        key = self._writes_key(thread_id, checkpoint_ns, checkpoint_id)
+        pipe = self.client.pipeline()
+        for task_id, idx, channel, (vtype, vblob), task_path in rows:
+            field = f"{task_id}:{idx}"
+            payload = _pack(
+                task_id.encode("utf-8"), str(idx).encode("utf-8"), channel.encode("utf-8"),
+                vtype.encode("utf-8"), vblob, task_path.encode("utf-8"),
+            )
+            if idx >= 0:
+                pipe.hsetnx(key, field, payload)
+            else:
+                pipe.hset(key, field, payload)
+        pipe.sadd(f"{self.prefix}:keys:{thread_id}", key)
+        pipe.execute()
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[WriteRow]:
+        rows = []
+        for payload in self.client.hgetall(self._writes_key(thread_id, checkpoint_ns, checkpoint_id)).values():
+            task_id, idx, channel, vtype, vblob, task_path = _unpack(payload)
+            rows.append((_text(task_id), int(_text(idx)), _text(channel), (_text(vtype), vblob), _text(task_path)))
+        return rows
+
+    def delete_thread(self, thread_id: str) -> None:
+        namespaces = [_text(ns) for ns in self.client.smembers(f"{self.prefix}:ns:{thread_id}")]
+        write_keys = [_text(k) for k in self.client.smembers(f"{self.prefix}:keys:{thread_id}")]
+        keys = [self._ckpt_key(thread_id, ns) for ns in namespaces]
+        keys += [self._ids_key(thread_id, ns) for ns in namespaces] + write_keys
+        keys += [f"{self.prefix}:ns:{thread_id}", f"{self.prefix}:keys:{thread_id}"]
+        pipe = self.client.pipeline()
+        pipe.delete(*keys)
+        pipe.srem(f"{self.prefix}:threads", thread_id)
+        pipe.execute()
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    有界的进程内 Checkpointer
+
+    MemorySaver 会永久保留每个 thread_id 的全部状态历史。本类在其基础上：
+    - 会话 TTL：超过 ttl_seconds 未访问的会话在下次访问或写入时被清理
+    - LRU 淘汰：会话数超过 max_sessions 或占用字节数超过 max_bytes 时，
+      淘汰最久未访问的会话（正在写入的会话不会被淘汰）
+    - 计数器：stats() 返回常驻会话数、占用字节数、淘汰与过期次数
+
+    0 表示不限制。
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 0,
+        max_sessions: int = 0,
+        max_bytes: int = 0,
+        serde: Optional[SerializerProtocol] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.RLock()
+        # thread_id -> [最近访问时间, 占用字节数]，按访问顺序排列（最久未访问在前）
+        self._sessions: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._resident_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _touch(self, thread_id: str, added_bytes: int = 0) -> None:
+        entry = self._sessions.get(thread_id)
+        if entry is None:
+            entry = self._sessions[thread_id] = [0.0, 0]
+        entry[0] = self._clock()
+        entry[1] += added_bytes
+        self._resident_bytes += added_bytes
+        self._sessions.move_to_end(thread_id)
+
+    def _is_expired(self, thread_id: str) -> bool:
+        entry = self._sessions.get(thread_id)
+        return bool(self.ttl_seconds and entry and self._clock() - entry[0] > self.ttl_seconds)
+
+    def _drop(self, thread_id: str) -> None:
+        entry = self._sessions.pop(thread_id, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+        super().delete_thread(thread_id)
+
+    def _enforce_limits(self, keep: str) -> None:
+        """清理过期会话，并按 LRU 淘汰超出上限的会话"""
+        if self.ttl_seconds:
+            now = self._clock()
+            while self._sessions:
+                oldest, (last_access, _) = next(iter(self._sessions.items()))
+                if oldest == keep or now - last_access <= self.ttl_seconds:
+                    break
+                self._drop(oldest)
+                self.expirations += 1
+
+        def over_limit() -> bool:
+            return bool(
+                (self.max_sessions and len(self._sessions) > self.max_sessions)
+                or (self.max_bytes and self._resident_bytes > self.max_bytes)
+            )
+
+        while over_limit():
+            victim = next((tid for tid in self._sessions if tid != keep), None)
+            if victim is None:
+                break
+            self._drop(victim)
+            self.evictions += 1
+            logger.debug(f"会话被 LRU 淘汰: {victim}")
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id not in self._sessions:
+                return None
+            if self._is_expired(thread_id):
+                self._drop(thread_id)
+                self.expirations += 1
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            stored_checkpoint, stored_metadata, _ = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            added = len(stored_checkpoint[1]) + len(stored_metadata[1])
+            for channel, version in new_versions.items():
+                added += len(self.blobs[(thread_id, checkpoint_ns, channel, version)][1])
+            self._touch(thread_id, added)
+            self._enforce_limits(keep=thread_id)
+            return result
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+
+        def writes_size() -> int:
+            return sum(len(w[2][1]) for w in self.writes.get(outer_key, {}).values())
+
+        with self._lock:
+            before = writes_size()
+            super().put_writes(config, writes, task_id, task_path)
+            self._touch(thread_id, writes_size() - before)
+            self._enforce_limits(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop(thread_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """会话存储监控指标"""
+        with self._lock:
+            return {
+                "resident_sessions": len(self._sessions),
+                "resident_bytes": self._resident_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """根据 settings.CHECKPOINT_BACKEND 创建 Checkpointer"""
+    backend = settings.CHECKPOINT_BACKEND.lower()
+    if backend == "sqlite":
+        return SqliteCheckpointSaver(settings.CHECKPOINT_SQLITE_PATH, pool_size=settings.CHECKPOINT_POOL_SIZE)
+    if backend == "redis":
+        return RedisCheckpointSaver.from_url(settings.REDIS_URL)
+    if backend == "memory":
+        return BoundedMemorySaver(
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            max_sessions=settings.SESSION_MAX_COUNT,
+            max_bytes=settings.SESSION_MAX_BYTES,
+        )
+    raise ValueError(f"未知的 CHECKPOINT_BACKEND: {settings.CHECKPOINT_BACKEND}")
@@ -1,9 +1,12 @@
 # Node Names
 NODE_SUPERVISOR = "supervisor"
+NODE_EXTRACTOR = "extractor"
 NODE_COLLECTOR = "collector"
+NODE_PLANNER = "planner"
 NODE_DIAGNOSTICIAN = "diagnostician"
 NODE_CALCULATOR = "calculator"
 NODE_RAG = "rag"
+NODE_HISTORY = "history"
 
 # Graph Keys
 KEY_MESSAGES = "messages"
@@ -0,0 +1,91 @@
+"""
+对话历史窗口
+
+AgentState.messages 使用 add_messages 追加，会话越长，每轮 checkpoint 序列化
+和后续 LLM 调用的成本越高。本模块在每轮结束时：
+- 保留最近 settings.HISTORY_MAX_TURNS 轮对话原文
+- 更早的消息折叠进 history_summary（每条消息截断为一行，总长度有上限）
+- 通过 RemoveMessage 从 messages 中删除已折叠的消息
+
+这样每轮的 checkpoint 大小和 LLM 上下文长度保持恒定，不随会话长度线性增长。
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import BaseMessage, RemoveMessage, SystemMessage
+
+from agent_app.graph.state import AgentState
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_ROLE_NAMES = {"human": "用户", "ai": "助手", "system": "系统"}
+
+
+def _turn_start_index(messages: Sequence[BaseMessage], max_turns: int) -> int:
+    """返回最近 max_turns 轮对话的起始下标（一轮从一条用户消息开始）"""
+    seen = 0
+    for idx in range(len(messages) - 1, -1, -1):
+        if messages[idx].type == "human":
+            seen += 1
+            if seen == max_turns:
+                return idx
+    return 0
+
+
+def fold_summary(summary: str, messages: Sequence[BaseMessage], line_chars: int, max_chars: int) -> str:
+    """把消息折叠进摘要：每条消息一行，超出 max_chars 时丢弃最早的行"""
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        text = " ".join(str(message.content).split())
+        if len(text) > line_chars:
+            text = text[:line_chars] + "…"
+        lines.append(f"{_ROLE_NAMES.get(message.type, message.type)}: {text}")
+
+    total = sum(len(line) + 1 for line in lines)
+    start = 0
+    while total > max_chars and start < len(lines):
+        total -= len(lines[start]) + 1
+        start += 1
+    return "\n".join(lines[start:])
+
+
+def compact_history(state: AgentState) -> Dict[str, Any]:
+    """History 节点：把窗口外的消息折叠进摘要"""
+    max_turns = settings.HISTORY_MAX_TURNS
+    messages = state.get("messages", [])
+    if max_turns <= 0 or not messages:
+        return {}
+
+    cut = _turn_start_index(messages, max_turns)
+    if cut == 0:
+        return {}
+
+    folded = messages[:cut]
+    summary = fold_summary(
+        state.get("history_summary") or "",
+        folded,
+        line_chars=settings.HISTORY_SUMMARY_LINE_CHARS,
+        max_chars=settings.HISTORY_SUMMARY_MAX_CHARS,
+    )
+    logger.debug(f"折叠 {len(folded)} 条历史消息，保留 {len(messages) - cut} 条")
+    return {
+        "messages": [RemoveMessage(id=m.id) for m in folded],
+        "history_summary": summary,
+    }
+
+
+async def acompact_history(state: AgentState) -> Dict[str, Any]:
+    """compact_history 的异步版本（纯内存计算）"""
+    return compact_history(state)
+
+
+def build_context_messages(state: AgentState) -> List[BaseMessage]:
+    """构造发给 LLM 的上下文：历史摘要（如有）+ 窗口内的原文消息"""
+    messages: List[BaseMessage] = []
+    if state.get("history_summary"):
+        messages.append(SystemMessage(content=f"此前的对话摘要：\n{state['history_summary']}"))
+    messages.extend(state.get("messages", []))
+    return messages
@@ -2,12 +2,17 @@ from typing import Literal
 from agent_app.graph.state import AgentState
 from agent_app.graph.constants import *
 
-def route_supervisor(state: AgentState) -> Literal[NODE_COLLECTOR, NODE_DIAGNOSTICIAN, "__end__"]:
+def route_supervisor(state: AgentState) -> Literal[NODE_RAG, NODE_EXTRACTOR, NODE_DIAGNOSTICIAN, "__end__"]:
     """主路由逻辑"""
 
-    # 1. 检查信息是否完整
+    # 0. 以检索前缀开头的提问直接查资料，不影响信息收集和诊断进度
+    from agent_app.agents.rag import rag_query
+    if rag_query(state) is not None:
+        return NODE_RAG
+
+    # 1. 检查信息是否完整（先从客户消息中抽取字段，再交给 collector）
     if not state.get("is_info_complete"):
-        return NODE_COLLECTOR
+        return NODE_EXTRACTOR
 
     # 2. 检查是否有诊断结果
     if state.get("diagnostic_result"):
@@ -1,4 +1,4 @@
-from typing import TypedDict, Annotated, List, Optional
+from typing import Any, Dict, TypedDict, Annotated, List, Optional
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 
@@ -9,17 +9,52 @@ class CustomerInfo(TypedDict):
     controller_brand: Optional[str] # Lingbo, Leiting, etc.
     battery_type: Optional[str]     # lead_acid, lithium
     battery_voltage: Optional[float]
+    battery_capacity: Optional[float]  # 电池容量(Ah)
+    voltage_display: Optional[float]   # 仪表/小程序显示的全车电压（SOP step_1 的校验输入）
     bms_current: Optional[float]    # 锂电保护板电流
     motor_power: Optional[float]
     wire_gauge: Optional[float]     # 主线平方数
     breaker_rating: Optional[float] # 空开安数
 
+# customer_info_sources 中结构化输入（前端表单/订单系统）的来源标记；文本抽取为 "text"（见 agents/extractor.py）
+SOURCE_STRUCTURED = "structured"
+
+# 显式清空字段的取值：None 表示这一轮没有带上该字段（保留已有值），CLEAR_FIELD 表示删除该字段
+CLEAR_FIELD = "__clear__"
+
+def merge_customer_info(current: Optional[Dict[str, Any]], update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并 customer_info / customer_info_sources：只更新传入的非空字段，不会因为某一轮没有带上
+    完整信息而清空已有字段；取值为 CLEAR_FIELD 的字段从结果中删除
+    """
+    merged = dict(current or {})
+    for key, value in (update or {}).items():
+        if value is None:
+            continue
+        if value == CLEAR_FIELD:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+def structured_input(info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    把结构化输入转换成状态更新：每个非空字段记录来源 SOURCE_STRUCTURED，之后的文本抽取不会覆盖；
+    清空的字段同时清除来源
+    """
+    info = {k: v for k, v in (info or {}).items() if v not in (None, "")}
+    sources = {k: CLEAR_FIELD if v == CLEAR_FIELD else {"source": SOURCE_STRUCTURED} for k, v in info.items()}
+    return {"customer_info": info, "customer_info_sources": sources}
+
 class AgentState(TypedDict):
-    # 消息历史，自动追加
+    # 消息历史，自动追加（窗口外的消息由 history 节点折叠进 history_summary）
     messages: Annotated[List[BaseMessage], add_messages]
+    history_summary: Optional[str]
     
     # 业务状态上下文
-    customer_info: CustomerInfo
+    customer_info: Annotated[CustomerInfo, merge_customer_info]
+    customer_info_sources: Annotated[Dict[str, Dict[str, Any]], merge_customer_info]  # 字段 -> 来源（文本抽取的原文片段等）
     is_info_complete: bool
     current_step: int             # SOP 当前步骤索引
+    plan: Optional[Dict[str, Any]]  # planner 生成的步骤执行计划（见 agents/planner.py）
     diagnostic_result: Optional[str]
\ No newline at end of file
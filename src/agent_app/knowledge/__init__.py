@@ -1,3 +1,19 @@
+from .compatibility import CompatibilityTable, get_compatibility_table
+from .loader import TemplateCache, get_template_cache
 from .registry import select_template
+from .retrieval import BM25Index, get_retrieval_index
+from .sop import CompiledSOP, CompiledStep, SOPCompileError, compile_sop
 
-__all__ = ["select_template"]
+__all__ = [
+    "BM25Index",
+    "CompatibilityTable",
+    "CompiledSOP",
+    "CompiledStep",
+    "SOPCompileError",
+    "TemplateCache",
+    "compile_sop",
+    "get_compatibility_table",
+    "get_retrieval_index",
+    "get_template_cache",
+    "select_template",
+]
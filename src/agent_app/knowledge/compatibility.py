@@ -0,0 +1,249 @@
+"""
+控制器兼容性表 - 离线兼容性数据
+
+兼容性矩阵以 JSONL 或 CSV 文件维护（默认 knowledge/data/compatibility.jsonl），
+每行一条 (车型, 控制器型号) 记录：
+
+    {"vehicle_model": "九号 E100", "controller_model": "Lingbo-72182",
+     "controller_brand": "Lingbo", "compatible": true, "confidence": 0.95,
+     "reason": "...", "alternative": null, "details": {...}}
+
+CSV 使用相同的列名，details 列为 JSON 字符串，compatible 列为 true/false/空。
+
+加载后在内存中建立索引：
+- 精确查询：规范化键 -> 记录的字典，O(1)
+- 前缀查询：按 (车型, 控制器) 和 (控制器, 车型) 排序的两个键列表，bisect 定位区间
+- 品牌查询：规范化品牌 -> 规范化键列表
+
+键在建索引和查询时都会规范化（NFKC、小写、去除空白和连接符），
+"九号E100" 与 "九号 E100"、"lingbo 72182" 与 "Lingbo-72182" 视为同一个键。
+
+文件修改后下一次查询时重新加载：由发现变更的那个查询线程同步重建索引（该次查询
+等待重建完成），建好后整体替换引用；重建期间其他线程不等待，继续使用旧索引，
+不会看到加载了一半的数据。新文件解析失败时继续使用旧索引。
+"""
+from __future__ import annotations
+
+import copy
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLE_PATH = Path(__file__).parent / "data" / "compatibility.jsonl"
+
+# 记录中除键以外返回给调用方的字段
+RESULT_FIELDS = ("compatible", "confidence", "reason", "alternative", "details")
+
+_SEPARATORS = re.compile(r"[\s\-_·/]+")
+
+
+def normalize_key(text: Optional[str]) -> str:
+    """规范化车型/型号/品牌，用于建索引和查询"""
+    if not text:
+        return ""
+    return _SEPARATORS.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def _parse_bool(value: Any) -> Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes", "y", "是"):
+        return True
+    if text in ("false", "0", "no", "n", "否"):
+        return False
+    return None
+
+
+def _read_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    """逐行读取 JSONL 或 CSV"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            for row in csv.DictReader(f):
+                row["details"] = json.loads(row["details"]) if row.get("details") else {}
+                row["confidence"] = float(row["confidence"]) if row.get("confidence") else 0.5
+                row["alternative"] = row.get("alternative") or None
+                yield row
+        else:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_no}: {e}") from e
+
+
+class CompatibilityIndex:
+    """一次加载得到的只读索引，构建完成后不再修改"""
+
+    def __init__(self, rows: Iterator[Dict[str, Any]]):
+        self.exact: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # 品牌 -> 该品牌记录的规范化 (车型, 控制器型号)，与 by_vehicle 同序，可以按车型前缀二分
+        self.by_brand: Dict[str, List[Tuple[str, str]]] = {}
+        for row in rows:
+            record = {
+                "vehicle_model": row["vehicle_model"],
+                "controller_model": row["controller_model"],
+                "controller_brand": row.get("controller_brand") or None,
+                **{field: row.get(field) for field in RESULT_FIELDS},
+            }
+            record["compatible"] = _parse_bool(record["compatible"])
+            record["details"] = record["details"] or {}
+            key = (normalize_key(record["vehicle_model"]), normalize_key(record["controller_model"]))
+            if key in self.exact:
+                logger.warning(f"兼容性表存在重复记录，后者覆盖前者: {record['vehicle_model']} / {record['controller_model']}")
+            self.exact[key] = record
+
+        self.by_vehicle = sorted(self.exact)
+        self.by_controller = sorted((c, v) for v, c in self.exact)
+        for key in self.by_vehicle:
+            brand = normalize_key(self.exact[key]["controller_brand"])
+            if brand:
+                self.by_brand.setdefault(brand, []).append(key)
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+
+class CompatibilityTable:
+    """
+    可热加载的兼容性表
+
+    Args:
+        path: JSONL/CSV 文件路径
+        reload_interval: 检查文件变更的最小间隔（秒），0 表示每次查询都检查
+    """
+
+    def __init__(self, path: os.PathLike | str = DEFAULT_TABLE_PATH, *, reload_interval: float = 2.0):
+        self.path = Path(path)
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self._index = self._load()
+
+    def _stat(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> CompatibilityIndex:
+        signature = self._stat()
+        started = time.perf_counter()
+        index = CompatibilityIndex(_read_rows(self.path))
+        self._signature = signature
+        self.reloads += 1
+        logger.info(f"加载兼容性表 {self.path}: {len(index)} 条记录，耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+        return index
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        # 只有一个线程负责检查并在本线程内同步重建，其余线程不等待，继续使用当前索引
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            try:
+                if self._stat() == self._signature:
+                    return
+                self._index = self._load()
+            except (OSError, ValueError, KeyError) as e:
+                self.reload_errors += 1
+                logger.error(f"重新加载兼容性表失败，继续使用旧数据: {e}")
+        finally:
+            self._reload_lock.release()
+
+    @property
+    def index(self) -> CompatibilityIndex:
+        self._maybe_reload()
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def lookup(self, vehicle_model: str, controller_model: str) -> Optional[Dict[str, Any]]:
+        """精确查询（键规范化后比较），返回记录副本，未找到返回 None"""
+        record = self.index.exact.get((normalize_key(vehicle_model), normalize_key(controller_model)))
+        return copy.deepcopy(record) if record is not None else None
+
+    def search(
+        self,
+        vehicle_prefix: str = "",
+        controller_prefix: str = "",
+        brand: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        按车型前缀、控制器型号前缀和品牌查询
+
+        例如 search("九号", "lingbo-72") 返回九号所有车型上 Lingbo-72xxx 系列的记录。
+        """
+        index = self.index
+        vehicle_prefix = normalize_key(vehicle_prefix)
+        controller_prefix = normalize_key(controller_prefix)
+        results: List[Dict[str, Any]] = []
+
+        if brand or vehicle_prefix or not controller_prefix:
+            keys = index.by_brand.get(normalize_key(brand), []) if brand else index.by_vehicle
+            for i in range(bisect_left(keys, (vehicle_prefix,)), len(keys)):
+                vehicle, controller = keys[i]
+                if not vehicle.startswith(vehicle_prefix):
+                    break
+                if controller.startswith(controller_prefix):
+                    results.append(index.exact[(vehicle, controller)])
+                    if len(results) >= limit:
+                        break
+        else:
+            keys = index.by_controller
+            for i in range(bisect_left(keys, (controller_prefix,)), len(keys)):
+                controller, vehicle = keys[i]
+                if not controller.startswith(controller_prefix):
+                    break
+                results.append(index.exact[(vehicle, controller)])
+                if len(results) >= limit:
+                    break
+
+        return copy.deepcopy(results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "records": len(self._index),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+
+# 全局单例
+_compatibility_table: Optional[CompatibilityTable] = None
+_compatibility_table_lock = threading.Lock()
+
+
+def get_compatibility_table() -> CompatibilityTable:
+    """获取兼容性表单例（首次使用时加载）"""
+    global _compatibility_table
+    if _compatibility_table is None:
+        with _compatibility_table_lock:
+            if _compatibility_table is None:
+                _compatibility_table = CompatibilityTable(
+                    settings.COMPATIBILITY_TABLE_PATH or DEFAULT_TABLE_PATH,
+                    reload_interval=settings.COMPATIBILITY_RELOAD_INTERVAL,
+                )
+    return _compatibility_table
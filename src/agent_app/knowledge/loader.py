@@ -1,18 +1,243 @@
 """
 模板加载器 - 电动车售后诊断模板管理
 
-注意：此模块当前未在主工作流中使用。
-电动车售后诊断直接在 DiagnosticAgent 中加载 sop_diagnostic.yaml。
-此文件保留用于未来可能的多模板管理需求。
+所有 YAML 模板通过进程级的 TemplateCache 加载：
+- 优先使用 libyaml 的 CSafeLoader 解析，未安装 libyaml 时退回纯 Python 的 SafeLoader
+- 以文件 (mtime, size) 判断是否需要重新检查，以内容 SHA-256 判断是否需要重新解析
+- 文件变更后最多 reload_interval 秒内生效，新条目整体替换旧条目，
+  解析失败时继续使用旧模板，无需重启 worker
+- 可选的预编译缓存（settings.TEMPLATE_CACHE_DIR）：解析结果按内容哈希 pickle 到磁盘，
+  进程重启后内容未变的模板直接反序列化，跳过 YAML 解析
+
+缓存中的模板数据在所有会话之间共享，调用方不得修改；
+需要可修改的副本时使用 TemplateLoader.load_template / select_template。
 """
-import yaml
+from __future__ import annotations
+
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).parent / "templates"
 
+# libyaml 绑定比纯 Python 解析器快一个数量级
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# 预编译缓存格式版本，结构变化时递增使旧缓存失效
+_PICKLE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class TemplateEntry:
+    """一个已加载的模板"""
+
+    name: str
+    path: Path
+    signature: Tuple[int, int]  # (mtime_ns, size)
+    sha256: str                 # 文件内容哈希，内容变化时才会变化
+    data: Any                   # 解析结果（共享，只读）
+    source: str                 # "yaml" 或 "pickle"
+
+
+class TemplateCache:
+    """
+    可热加载的模板缓存
+
+    Args:
+        base_dir: 模板目录，模板 name 对应 base_dir/<name>.yaml
+        reload_interval: 检查文件变更的最小间隔（秒），0 表示每次访问都检查
+        cache_dir: 预编译缓存目录，None 表示不使用
+    """
+
+    def __init__(
+        self,
+        base_dir: os.PathLike | str = BASE_DIR,
+        *,
+        reload_interval: float = 2.0,
+        cache_dir: Optional[os.PathLike | str] = None,
+    ):
+        self.base_dir = Path(base_dir)
+        self.reload_interval = reload_interval
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._checked_at: Dict[str, float] = {}
+        self.parses = 0
+        self.pickle_hits = 0
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def path_for(self, name: str) -> Path:
+        return self.base_dir / f"{name}.yaml"
+
+    def entry(self, name: str) -> TemplateEntry:
+        """
+        获取模板条目（按需加载或重新加载）
+
+        Raises:
+            FileNotFoundError: 模板不存在（仅首次加载时；已加载的模板文件被删除时继续使用旧条目）
+            yaml.YAMLError: 首次加载时解析失败
+        """
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None:
+            if now - self._checked_at.get(name, 0.0) < self.reload_interval:
+                return entry
+            # 只有一个线程负责检查和重新加载，其余线程继续使用当前条目
+            if not self._lock.acquire(blocking=False):
+                return entry
+        else:
+            self._lock.acquire()
+        try:
+            entry = self._entries.get(name)
+            if entry is not None and now - self._checked_at.get(name, 0.0) < self.reload_interval:
+                return entry
+            try:
+                fresh = self._refresh(name, entry)
+            except (OSError, yaml.YAMLError) as e:
+                if entry is None:
+                    raise
+                self.reload_errors += 1
+                logger.error(f"重新加载模板 {name} 失败，继续使用旧版本: {e}")
+                fresh = entry
+            self._entries[name] = fresh
+            self._checked_at[name] = now
+            return fresh
+        finally:
+            self._lock.release()
+
+    def get(self, name: str) -> Any:
+        """获取模板内容（共享对象，不要修改）"""
+        return self.entry(name).data
+
+    def _refresh(self, name: str, old: Optional[TemplateEntry]) -> TemplateEntry:
+        path = self.path_for(name)
+        if not path.exists():
+            raise FileNotFoundError(f"Template not found: {path}")
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        if old is not None and old.signature == signature:
+            return old
+
+        raw = path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if old is not None and old.sha256 == digest:
+            # 只是 mtime 变化（touch、重新部署同一文件），无需重新解析
+            return replace(old, signature=signature)
+
+        started = time.perf_counter()
+        data = self._read_pickle(name, digest)
+        if data is not None:
+            source = "pickle"
+            self.pickle_hits += 1
+        else:
+            data = yaml.load(raw, Loader=_YAML_LOADER)
+            source = "yaml"
+            self.parses += 1
+            self._write_pickle(name, digest, data)
+        if old is not None:
+            self.reloads += 1
+        logger.info(f"加载模板 {name}（{source}），耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+        return TemplateEntry(name, path, signature, digest, data, source)
+
+    def _pickle_path(self, name: str, digest: str) -> Path:
+        return self.cache_dir / f"{name}-{digest}.pickle"
+
+    def _read_pickle(self, name: str, digest: str) -> Any:
+        """读取预编译缓存，不存在或无效时返回 None"""
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._pickle_path(name, digest), "rb") as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"模板预编译缓存无效，重新解析 {name}: {e}")
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != _PICKLE_VERSION or payload.get("sha256") != digest:
+            return None
+        return payload["data"]
+
+    def _write_pickle(self, name: str, digest: str, data: Any) -> None:
+        """写入预编译缓存（先写临时文件再替换，并清理同一模板的旧版本）"""
+        if self.cache_dir is None:
+            return
+        target = self._pickle_path(name, digest)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump({"version": _PICKLE_VERSION, "sha256": digest, "data": data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, target)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            for stale in self.cache_dir.glob(f"{name}-*.pickle"):
+                if stale != target:
+                    stale.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"写入模板预编译缓存失败: {e}")
+
+    def clear(self) -> None:
+        """清空内存中的模板（预编译缓存保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._checked_at.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "templates": {name: entry.sha256[:12] for name, entry in self._entries.items()},
+            "parses": self.parses,
+            "pickle_hits": self.pickle_hits,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "yaml_loader": _YAML_LOADER.__name__,
+        }
+
+
+# 全局单例
+_template_cache: Optional[TemplateCache] = None
+_template_cache_lock = threading.Lock()
+
+
+def get_template_cache() -> TemplateCache:
+    """获取模板缓存单例"""
+    global _template_cache
+    if _template_cache is None:
+        with _template_cache_lock:
+            if _template_cache is None:
+                _template_cache = TemplateCache(
+                    reload_interval=settings.TEMPLATE_RELOAD_INTERVAL,
+                    cache_dir=settings.TEMPLATE_CACHE_DIR or None,
+                )
+    return _template_cache
+
+
+def set_template_cache(cache: Optional[TemplateCache]) -> None:
+    """替换模板缓存（测试时使用），None 表示恢复默认"""
+    global _template_cache
+    with _template_cache_lock:
+        _template_cache = cache
+
+
 class TemplateLoader:
-    """YAML 模板加载器（预留）"""
+    """YAML 模板加载器"""
 
     @staticmethod
     def load_template(template_name: str) -> Dict[str, Any]:
@@ -23,11 +248,6 @@ class TemplateLoader:
             template_name: 模板名称，例如 "sop_diagnostic"
 
         Returns:
-            模板内容字典
+            模板内容字典（副本，可以修改）
         """
-        file_path = BASE_DIR / f"{template_name}.yaml"
-        if not file_path.exists():
-            raise FileNotFoundError(f"Template not found: {file_path}")
-
-        with open(file_path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
\ No newline at end of file
+        return copy.deepcopy(get_template_cache().get(template_name))
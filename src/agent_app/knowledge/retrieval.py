@@ -0,0 +1,648 @@
+"""
+本地 BM25 检索 - 售后手册、SOP 模板、changeLog 等文档的离线倒排索引
+
+分词：文本按 NFKC 归一化并转小写后切成"字符段"：
+- 中文等非 ASCII 字符段切成字符 n-gram（默认 2-gram，单字段保留单字）
+- 字母数字段（型号 lingbo72182、e100、72v）整体作为一个词
+
+索引目录结构：
+    manifest.json          段列表、删除记录（原子替换，读端据此热加载）
+    seg-000001.bm25 ...    不可变的段文件，mmap 打开，打开耗时与段大小无关
+
+段文件由定长文件头和若干按 8 字节对齐的数组组成（本机字节序）：
+    doc_lens      u32[文档数]          文档长度（词数）
+    meta_*        每个文档的 JSON（id、source、title、text）
+    id_*, id_order                    文档 id 及按 id 排序的下标（二分查找删除/替换）
+    term_*                            按 UTF-8 字节排序的词典（二分查找）
+    post_offsets  u64[词数 + 1]        每个词的倒排表在 post_docs/post_tfs 中的范围
+    post_docs     u32[]  post_tfs u32[]
+
+增量更新：add() 写入内存缓冲，commit() 落盘为新段；delete() 记录 (段, 文档下标) 墓碑，
+同 id 的文档再次 add 会替换旧版本；optimize() 把所有段合并为一个并清除已删除文档。
+只支持单个写入者（CLI），读取者（服务进程）可以有多个。
+
+查询：安装了 numpy 时按词向量化累加 BM25 分数（10 万段落个位数毫秒），
+否则退回纯 Python 实现（结果相同，速度较慢）。
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from agent_app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"BM25SEG\x01"
+MANIFEST_NAME = "manifest.json"
+
+# 段文件中的数组：(名称, array 类型码)，类型码为 None 表示字节块
+_SECTIONS: Tuple[Tuple[str, Optional[str]], ...] = (
+    ("doc_lens", "I"),
+    ("meta_offsets", "Q"),
+    ("meta_blob", None),
+    ("id_offsets", "Q"),
+    ("id_blob", None),
+    ("id_order", "I"),
+    ("term_offsets", "Q"),
+    ("term_blob", None),
+    ("post_offsets", "Q"),
+    ("post_docs", "I"),
+    ("post_tfs", "I"),
+)
+# magic, 字节序, 文档数, 词数, 各数组的 (偏移, 字节数)
+_HEADER = f"<8s1sxxxII{'QQ' * len(_SECTIONS)}"
+_HEADER_SIZE = (struct.calcsize(_HEADER) + 7) // 8 * 8
+_BYTEORDER = b"L" if sys.byteorder == "little" else b"B"
+
+
+def _numpy():
+    """numpy 可选：未安装时返回 None，使用纯 Python 实现"""
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return np
+
+
+_slow_path_warned = False
+
+
+def _warn_slow_path() -> None:
+    """未安装 numpy 时打开索引，提示查询走纯 Python 实现（每个进程只提示一次）"""
+    global _slow_path_warned
+    if _numpy() is None and not _slow_path_warned:
+        _slow_path_warned = True
+        logger.warning("未安装 numpy，检索索引使用纯 Python 打分，查询延迟约高一个数量级；安装：pip install 'agent_app[rag]'")
+
+
+# ---------------------------------------------------------------------------
+# 分词与切分段落
+# ---------------------------------------------------------------------------
+
+_RUNS = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[^\W_\x00-\x7f]+")
+
+
+def tokenize(text: str, ngram: int = 2) -> List[str]:
+    """
+    分词
+
+    >>> tokenize("凌博 Lingbo-72182 控制器")
+    ['凌博', 'lingbo', '72182', '控制', '制器']
+    """
+    tokens: List[str] = []
+    for run in _RUNS.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run.isascii():
+            tokens.append(run)
+        elif len(run) <= ngram:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + ngram] for i in range(len(run) - ngram + 1))
+    return tokens
+
+
+def split_passages(text: str, max_chars: int = 400) -> List[str]:
+    """按空行切分段落，相邻的短段合并到 max_chars 以内，超长段按行切分"""
+    passages: List[str] = []
+    current = ""
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        pieces = [block] if len(block) <= max_chars else [line for line in block.splitlines() if line.strip()]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+# ---------------------------------------------------------------------------
+# 段文件
+# ---------------------------------------------------------------------------
+
+def _blob(items: Sequence[bytes]) -> Tuple[array, bytes]:
+    offsets = array("Q", [0])
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    return offsets, b"".join(items)
+
+
+def write_segment(path: Path, docs: Sequence[Dict[str, Any]], ngram: int = 2) -> None:
+    """把文档写成一个段文件（先写临时文件再改名）"""
+    doc_lens = array("I")
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for local, doc in enumerate(docs):
+        counts = Counter(tokenize(doc["text"], ngram))
+        doc_lens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((local, tf))
+
+    meta_offsets, meta_blob = _blob([json.dumps(doc, ensure_ascii=False).encode("utf-8") for doc in docs])
+    ids = [doc["id"].encode("utf-8") for doc in docs]
+    id_offsets, id_blob = _blob(ids)
+    id_order = array("I", sorted(range(len(ids)), key=ids.__getitem__))
+
+    terms = sorted(postings, key=lambda t: t.encode("utf-8"))
+    term_offsets, term_blob = _blob([t.encode("utf-8") for t in terms])
+    post_offsets, post_docs, post_tfs = array("Q", [0]), array("I"), array("I")
+    for term in terms:
+        for local, tf in postings[term]:
+            post_docs.append(local)
+            post_tfs.append(tf)
+        post_offsets.append(len(post_docs))
+
+    sections = {
+        "doc_lens": doc_lens, "meta_offsets": meta_offsets, "meta_blob": meta_blob,
+        "id_offsets": id_offsets, "id_blob": id_blob, "id_order": id_order,
+        "term_offsets": term_offsets, "term_blob": term_blob,
+        "post_offsets": post_offsets, "post_docs": post_docs, "post_tfs": post_tfs,
+    }
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(_HEADER_SIZE))
+            layout: List[int] = []
+            for name, _ in _SECTIONS:
+                data = sections[name]
+                raw = data.tobytes() if isinstance(data, array) else data
+                f.write(bytes(-f.tell() % 8))
+                layout += [f.tell(), len(raw)]
+                f.write(raw)
+            f.seek(0)
+            f.write(struct.pack(_HEADER, SEGMENT_MAGIC, _BYTEORDER, len(docs), len(terms), *layout))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class Segment:
+    """mmap 打开的只读段"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = struct.unpack_from(_HEADER, self._mm, 0)
+        magic, byteorder, self.n_docs, self.n_terms = header[:4]
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"不是 BM25 段文件: {path}")
+        if byteorder != _BYTEORDER:
+            raise ValueError(f"段文件字节序与本机不一致: {path}")
+        view = memoryview(self._mm)
+        layout = header[4:]
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        for i, (name, code) in enumerate(_SECTIONS):
+            offset, length = layout[2 * i], layout[2 * i + 1]
+            self._offsets[name] = (offset, length)
+            section = view[offset:offset + length]
+            setattr(self, name, section.cast(code) if code else section)
+        self.total_len = sum(self.doc_lens)
+        self._np_cache: Dict[str, Any] = {}
+
+    def close(self) -> None:
+        for name, code in _SECTIONS:
+            getattr(self, name).release()
+        self._np_cache.clear()
+        try:
+            self._mm.close()
+        except BufferError:
+            # 仍有查询持有 numpy 视图，交给垃圾回收
+            pass
+
+    def _find(self, offsets, blob, key: bytes, lo: int, hi: int, order=None) -> int:
+        """在按字节排序的字符串表中二分查找，返回下标（order 为排序下标表），未找到返回 -1"""
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = order[mid] if order is not None else mid
+            value = bytes(blob[offsets[i]:offsets[i + 1]])
+            if value == key:
+                return i
+            if value < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def term_range(self, term: str) -> Optional[Tuple[int, int]]:
+        """词的倒排表范围 [start, end)"""
+        i = self._find(self.term_offsets, self.term_blob, term.encode("utf-8"), 0, self.n_terms)
+        if i < 0:
+            return None
+        return self.post_offsets[i], self.post_offsets[i + 1]
+
+    def find_doc(self, doc_id: str) -> int:
+        """按文档 id 查找段内下标，未找到返回 -1"""
+        return self._find(self.id_offsets, self.id_blob, doc_id.encode("utf-8"), 0, self.n_docs, self.id_order)
+
+    def doc_id(self, local: int) -> str:
+        return bytes(self.id_blob[self.id_offsets[local]:self.id_offsets[local + 1]]).decode("utf-8")
+
+    def doc(self, local: int) -> Dict[str, Any]:
+        return json.loads(bytes(self.meta_blob[self.meta_offsets[local]:self.meta_offsets[local + 1]]))
+
+    def np_array(self, name: str):
+        """段内数组的 numpy 零拷贝视图"""
+        if name not in self._np_cache:
+            np = _numpy()
+            offset, length = self._offsets[name]
+            dtype = np.uint64 if dict(_SECTIONS)[name] == "Q" else np.uint32
+            self._np_cache[name] = np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+        return self._np_cache[name]
+
+
+# ---------------------------------------------------------------------------
+# 索引
+# ---------------------------------------------------------------------------
+
+class BM25Index:
+    """
+    BM25 倒排索引
+
+    Args:
+        path: 索引目录（不存在时在首次 commit 时创建）
+        k1, b: BM25 参数
+        ngram: 非 ASCII 字符段的 n-gram 长度（建索引与查询必须一致，记录在 manifest 中）
+        reload_interval: 检查 manifest 变更的最小间隔（秒），0 表示每次查询都检查
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike | str,
+        *,
+        k1: float = 1.2,
+        b: float = 0.75,
+        ngram: int = 2,
+        reload_interval: float = 2.0,
+    ):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.ngram = ngram
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._segments: Dict[str, Segment] = {}
+        self._deleted: Dict[str, Set[int]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_deletes: Set[str] = set()
+        self._manifest: Dict[str, Any] = {"version": 1, "ngram": ngram, "next_segment": 1, "segments": [], "deleted": {}}
+        self._manifest_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._norm_cache: Dict[str, Tuple[float, Any]] = {}
+        self.reloads = 0
+        self._load_manifest()
+        _warn_slow_path()
+
+    # -- manifest ------------------------------------------------------------
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / MANIFEST_NAME
+
+    def _load_manifest(self) -> None:
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.ngram = manifest.get("ngram", self.ngram)
+        segments = {}
+        for entry in manifest["segments"]:
+            name = entry["name"]
+            segments[name] = self._segments.pop(name, None) or Segment(self.path / name)
+        # 被合并掉的旧段不主动关闭：并发中的查询可能仍在读取，随引用释放自动 unmap
+        self._segments = segments
+        self._deleted = {name: set(locals_) for name, locals_ in manifest.get("deleted", {}).items()}
+        self._manifest = manifest
+        self._manifest_mtime = mtime
+        self._norm_cache.clear()
+        self.reloads += 1
+
+    def _save_manifest(self) -> None:
+        self._manifest["segments"] = [{"name": name, "docs": seg.n_docs} for name, seg in self._segments.items()]
+        self._manifest["deleted"] = {name: sorted(locals_) for name, locals_ in self._deleted.items() if locals_}
+        self._manifest["ngram"] = self.ngram
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False)
+        os.replace(tmp, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        self._norm_cache.clear()
+
+    def refresh(self) -> None:
+        """其他进程（CLI）更新了索引时重新加载 manifest，已打开的段复用"""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self._manifest_mtime:
+                try:
+                    self._load_manifest()
+                except (OSError, ValueError) as e:
+                    logger.error(f"重新加载检索索引失败，继续使用旧版本: {e}")
+
+    # -- 写入 ------------------------------------------------------------------
+
+    def add(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """
+        添加文档（commit 后生效）
+
+        每个文档至少包含 id 和 text，可选 source、title；id 已存在的文档在 commit 时被替换。
+        """
+        count = 0
+        with self._lock:
+            for doc in docs:
+                if not doc.get("id") or not isinstance(doc.get("text"), str):
+                    raise ValueError("文档必须包含 id 和 text")
+                self._pending[doc["id"]] = {
+                    "id": doc["id"],
+                    "source": doc.get("source", ""),
+                    "title": doc.get("title", ""),
+                    "text": doc["text"],
+                }
+                count += 1
+        return count
+
+    def delete(self, doc_ids: Iterable[str]) -> None:
+        """删除文档（commit 后生效）"""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._pending.pop(doc_id, None)
+                self._pending_deletes.add(doc_id)
+
+    def delete_source(self, source: str) -> int:
+        """删除某个来源（文件）的全部文档（commit 后生效），返回删除数量"""
+        with self._lock:
+            ids = [d["id"] for d in self.iter_docs() if d.get("source") == source]
+            ids += [doc_id for doc_id, d in self._pending.items() if d.get("source") == source]
+            self.delete(ids)
+            return len(ids)
+
+    def _mark_deleted(self, doc_id: str) -> None:
+        for name, segment in self._segments.items():
+            local = segment.find_doc(doc_id)
+            if local >= 0:
+                self._deleted.setdefault(name, set()).add(local)
+
+    def commit(self) -> Optional[str]:
+        """把缓冲的新增/删除写入磁盘，返回新段名称（没有新增文档时为 None）"""
+        with self._lock:
+            if not self._pending and not self._pending_deletes:
+                return None
+            self.path.mkdir(parents=True, exist_ok=True)
+            for doc_id in self._pending_deletes | set(self._pending):
+                self._mark_deleted(doc_id)
+            name = None
+            if self._pending:
+                name = f"seg-{self._manifest['next_segment']:06d}.bm25"
+                self._manifest["next_segment"] += 1
+                write_segment(self.path / name, list(self._pending.values()), self.ngram)
+                self._segments[name] = Segment(self.path / name)
+            self._pending.clear()
+            self._pending_deletes.clear()
+            self._save_manifest()
+            return name
+
+    def optimize(self) -> None:
+        """把所有段合并为一个，清除已删除的文档"""
+        with self._lock:
+            self.commit()
+            docs = list(self.iter_docs())
+            old = list(self._segments.values())
+            self._segments, self._deleted = {}, {}
+            if docs:
+                self._pending = {d["id"]: d for d in docs}
+                self.commit()
+            else:
+                self._save_manifest()
+            for segment in old:
+                segment.close()
+                segment.path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments = {}
+
+    # -- 读取 ------------------------------------------------------------------
+
+    def iter_docs(self) -> Iterator[Dict[str, Any]]:
+        """遍历已提交且未删除的文档"""
+        for name, segment in list(self._segments.items()):
+            deleted = self._deleted.get(name, ())
+            for local in range(segment.n_docs):
+                if local not in deleted:
+                    yield segment.doc(local)
+
+    def doc_ids(self) -> Iterator[str]:
+        """遍历已提交且未删除的文档 id（不解析文档内容）"""
+        for name, segment in list(self._segments.items()):
+            deleted = self._deleted.get(name, ())
+            for local in range(segment.n_docs):
+                if local not in deleted:
+                    yield segment.doc_id(local)
+
+    def __len__(self) -> int:
+        return sum(seg.n_docs - len(self._deleted.get(name, ())) for name, seg in self._segments.items())
+
+    def _norms(self, name: str, segment: Segment, avgdl: float):
+        """k1 * (1 - b + b * dl / avgdl)，按段缓存（avgdl 变化时重算）"""
+        cached = self._norm_cache.get(name)
+        if cached is None or cached[0] != avgdl:
+            np = _numpy()
+            doc_lens = segment.np_array("doc_lens").astype(np.float32)
+            norms = (self.k1 * (1 - self.b + self.b * doc_lens / avgdl)).astype(np.float32)
+            for local in self._deleted.get(name, ()):
+                norms[local] = np.inf  # 已删除文档得分恒为 0
+            cached = (avgdl, norms)
+            self._norm_cache[name] = cached
+        return cached[1]
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        BM25 查询
+
+        Returns:
+            [{"id", "source", "title", "text", "score"}]，按分数降序
+        """
+        self.refresh()
+        with self._lock:
+            segments = list(self._segments.items())
+            deleted = {name: frozenset(locals_) for name, locals_ in self._deleted.items()}
+        terms = list(dict.fromkeys(tokenize(query, self.ngram)))
+        if not segments or not terms or top_k <= 0:
+            return []
+
+        total_docs = sum(seg.n_docs for _, seg in segments)
+        avgdl = (sum(seg.total_len for _, seg in segments) / total_docs) or 1.0
+
+        # 全局文档频率（包含已删除文档，与常见实现一致）
+        ranges = {name: {t: seg.term_range(t) for t in terms} for name, seg in segments}
+        idf: Dict[str, float] = {}
+        for term in terms:
+            df = sum(r[1] - r[0] for by_term in ranges.values() for r in [by_term[term]] if r)
+            if df:
+                idf[term] = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+        if not idf:
+            return []
+
+        np = _numpy()
+        candidates: List[Tuple[float, str, int]] = []
+        for name, segment in segments:
+            if np is not None:
+                hits = self._score_numpy(np, name, segment, ranges[name], idf, avgdl, top_k)
+            else:
+                hits = self._score_python(segment, ranges[name], idf, avgdl, deleted.get(name, frozenset()), top_k)
+            candidates.extend((score, name, local) for local, score in hits)
+
+        results = []
+        for score, name, local in heapq.nlargest(top_k, candidates):
+            doc = dict(self._segments[name].doc(local)) if name in self._segments else None
+            if doc is not None:
+                doc["score"] = round(score, 4)
+                results.append(doc)
+        return results
+
+    def _score_numpy(self, np, name, segment, ranges, idf, avgdl, top_k):
+        norms = self._norms(name, segment, avgdl)
+        post_docs, post_tfs = segment.np_array("post_docs"), segment.np_array("post_tfs")
+        scores = np.zeros(segment.n_docs, dtype=np.float32)
+        for term, weight in idf.items():
+            span = ranges[term]
+            if not span:
+                continue
+            docs = post_docs[span[0]:span[1]]
+            tfs = post_tfs[span[0]:span[1]].astype(np.float32)
+            # 同一个词的倒排表中文档不重复，可以直接按下标累加
+            scores[docs] += weight * tfs * (self.k1 + 1) / (tfs + norms[docs])
+        k = min(top_k, segment.n_docs)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [(int(local), float(scores[local])) for local in top if scores[local] > 0]
+
+    def _score_python(self, segment, ranges, idf, avgdl, deleted, top_k):
+        scores: Dict[int, float] = {}
+        doc_lens = segment.doc_lens
+        for term, weight in idf.items():
+            span = ranges[term]
+            if not span:
+                continue
+            for i in range(span[0], span[1]):
+                local = segment.post_docs[i]
+                if local in deleted:
+                    continue
+                tf = segment.post_tfs[i]
+                norm = self.k1 * (1 - self.b + self.b * doc_lens[local] / avgdl)
+                scores[local] = scores.get(local, 0.0) + weight * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "docs": len(self),
+                "segments": len(self._segments),
+                "deleted": sum(len(v) for v in self._deleted.values()),
+                "terms": sum(seg.n_terms for seg in self._segments.values()),
+                "reloads": self.reloads,
+                "backend": "numpy" if _numpy() is not None else "python",
+            }
+
+
+# ---------------------------------------------------------------------------
+# 从文件建索引
+# ---------------------------------------------------------------------------
+
+INDEXED_SUFFIXES = (".md", ".txt", ".yaml", ".yml")
+
+
+def iter_source_files(paths: Iterable[os.PathLike | str]) -> Iterator[Path]:
+    """展开目录，返回可建索引的文件"""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in INDEXED_SUFFIXES)
+        elif path.is_file():
+            yield path
+
+
+def default_sources() -> List[Path]:
+    """默认建索引的资料：SOP 等模板、changeLog 以及 data/manuals 下的手册（存在的目录）"""
+    from agent_app.knowledge.loader import BASE_DIR
+
+    candidates = [BASE_DIR, Path("changeLog"), Path("data/manuals")]
+    return [path for path in candidates if path.exists()]
+
+
+def source_name(path: os.PathLike | str) -> str:
+    """文档来源名称：当前目录下的文件用相对路径，其余用绝对路径（add/delete 据此定位同一文件）"""
+    resolved = Path(path).resolve()
+    try:
+        return resolved.relative_to(Path.cwd().resolve()).as_posix()
+    except ValueError:
+        return resolved.as_posix()
+
+
+def file_documents(path: Path, max_chars: int = 400) -> List[Dict[str, Any]]:
+    """把一个文件切成段落文档，id 为 "<来源>#<序号>"，title 取文件中第一个 Markdown 标题或文件名"""
+    text = path.read_text(encoding="utf-8")
+    match = re.search(r"^#+\s*(.+)$", text, re.MULTILINE)
+    title = match.group(1).strip() if match else path.name
+    source = source_name(path)
+    return [
+        {"id": f"{source}#{i}", "source": source, "title": title, "text": passage}
+        for i, passage in enumerate(split_passages(text, max_chars))
+    ]
+
+
+# 全局单例
+_retrieval_index: Optional[BM25Index] = None
+_retrieval_index_lock = threading.Lock()
+
+
+def get_retrieval_index() -> Optional[BM25Index]:
+    """获取检索索引单例，索引尚未建立（settings.RAG_INDEX_PATH 下没有 manifest）时返回 None"""
+    global _retrieval_index
+    if _retrieval_index is None:
+        path = Path(settings.RAG_INDEX_PATH)
+        if not (path / MANIFEST_NAME).exists():
+            return None
+        with _retrieval_index_lock:
+            if _retrieval_index is None:
+                _retrieval_index = BM25Index(path, reload_interval=settings.RAG_RELOAD_INTERVAL)
+    return _retrieval_index
+
+
+def set_retrieval_index(index: Optional[BM25Index]) -> None:
+    """替换检索索引（测试时使用），None 表示恢复默认"""
+    global _retrieval_index
+    with _retrieval_index_lock:
+        _retrieval_index = index
@@ -0,0 +1,298 @@
+"""
+SOP 编译 - 把 YAML 诊断流程编译为只读的步骤图
+
+YAML 中的 SOP 在加载时编译一次：
+- 主流程与 sub_flows 中的步骤展开到同一个步骤数组，state.current_step 直接是数组下标
+- 步骤 id -> 下标的映射，跳转目标（on_success.next / on_fail.next）预先解析为下标
+- 必填的 prompt、MCP 工具配置、跳转目标在编译时校验，配置错误在启动时以
+  SOPCompileError 报出，而不是在某个会话走到该步骤时才发现
+
+跳转目标可以是：
+- 步骤 id
+- sub_flow_<名称>：进入 sub_flows.<名称> 的第一步
+- terminals 中声明的流程出口（例如 end_success），表示流程结束
+
+branches 中的 condition 是基于 customer_info 字段的简单表达式（比较、in、and/or/not），
+编译时用 ast 白名单校验并预编译，不允许函数调用和属性访问。
+
+未配置 next 时，主流程与子流程内按顺序进入下一步；主流程最后一步之后流程结束，子流程最后一步
+返回进入它的步骤的 on_success.next（例如自学习专项排查完成后继续协议检查）。同一子流程从
+多处进入且返回位置不同时，最后一步必须显式配置 on_success.next。
+编译结果不可变，可以在所有会话、线程之间共享，每轮对话的开销与 SOP 规模无关。
+"""
+from __future__ import annotations
+
+import ast
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Collection, Dict, List, Mapping, Optional, Tuple
+
+SUB_FLOW_PREFIX = "sub_flow_"
+
+
+class SOPCompileError(ValueError):
+    """SOP 配置错误"""
+
+
+def _freeze(value: Any) -> Any:
+    """递归转换为只读结构"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+_CONDITION_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not,
+    ast.Compare, ast.Eq, ast.NotEq, ast.In, ast.NotIn, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.Name, ast.Load, ast.Constant, ast.List, ast.Tuple,
+)
+
+
+class _Fields(dict):
+    """条件表达式的变量表，缺失的字段视为 None"""
+
+    def __missing__(self, key: str) -> None:
+        return None
+
+
+def compile_condition(expr: str) -> Callable[[Mapping[str, Any]], bool]:
+    """
+    编译分支条件，例如 "controller_brand in ['Leiting', 'Meidisi']"
+
+    Raises:
+        SOPCompileError: 语法错误或使用了白名单之外的语法
+    """
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise SOPCompileError(f"条件表达式语法错误: {expr!r}: {e.msg}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _CONDITION_NODES):
+            raise SOPCompileError(f"条件表达式不支持 {type(node).__name__}: {expr!r}")
+    code = compile(tree, "<sop-condition>", "eval")
+
+    def predicate(fields: Mapping[str, Any]) -> bool:
+        try:
+            return bool(eval(code, {"__builtins__": {}}, _Fields(fields)))
+        except TypeError:
+            # 字段缺失（None）参与大小比较等
+            return False
+
+    return predicate
+
+
+@dataclass(frozen=True)
+class Branch:
+    """按 customer_info 分流的检查项"""
+
+    condition: str
+    check: str
+    predicate: Callable[[Mapping[str, Any]], bool] = field(compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class ToolConfig:
+    """步骤上的 MCP 工具调用配置"""
+
+    name: str
+    parameters: Mapping[str, str]
+    description: str = ""
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    """编译后的步骤"""
+
+    index: int
+    id: str
+    prompt: str
+    title: str = ""
+    action: Optional[str] = None
+    flow: str = "main"                      # 所属流程：main 或子流程名称
+    tool: Optional[ToolConfig] = None
+    check_logic: Optional[Mapping[str, Any]] = None
+    expected_answer: Tuple[str, ...] = ()
+    branches: Tuple[Branch, ...] = ()
+    next_index: Optional[int] = None        # 成功后的下一步，None 表示流程结束
+    next_target: Optional[str] = None       # 成功后的跳转目标原文（步骤 id 或流程出口）
+    success_message: Optional[str] = None
+    fail_index: Optional[int] = None        # 失败后的下一步，None 表示流程结束
+    fail_target: Optional[str] = None
+    fail_message: Optional[str] = None
+    raw: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))  # 原始步骤配置（只读）
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.next_index is None
+
+
+@dataclass(frozen=True)
+class CompiledSOP:
+    """编译后的 SOP"""
+
+    steps: Tuple[CompiledStep, ...]
+    index_of: Mapping[str, int]             # 步骤 id -> 下标
+    sub_flows: Mapping[str, int]            # 子流程名称 -> 第一步下标
+    terminals: frozenset
+    main_length: int                        # 主流程步骤数（子流程步骤排在其后）
+
+    @property
+    def end_index(self) -> int:
+        """流程结束时 current_step 的取值"""
+        return len(self.steps)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def step(self, index: int) -> Optional[CompiledStep]:
+        """按下标取步骤，越界（流程已结束）返回 None"""
+        if 0 <= index < len(self.steps):
+            return self.steps[index]
+        return None
+
+    def resolve_index(self, index: Optional[int]) -> int:
+        """把 next_index / fail_index 转为 current_step 的取值（None -> end_index）"""
+        return self.end_index if index is None else index
+
+
+def _tool_config(step: Dict[str, Any], where: str, tools: Optional[Collection[str]]) -> Optional[ToolConfig]:
+    config = step.get("mcp_tool")
+    if config is None:
+        return None
+    if not isinstance(config, dict) or not config.get("name"):
+        raise SOPCompileError(f"{where}: mcp_tool 必须包含 name")
+    if tools is not None and config["name"] not in tools:
+        raise SOPCompileError(f"{where}: 不支持的 MCP 工具 {config['name']!r}（可用: {sorted(tools)}）")
+    parameters = config.get("parameters") or {}
+    if not isinstance(parameters, dict):
+        raise SOPCompileError(f"{where}: mcp_tool.parameters 必须是映射")
+    return ToolConfig(config["name"], MappingProxyType(dict(parameters)), config.get("description", ""))
+
+
+def _branches(step: Dict[str, Any], where: str) -> Tuple[Branch, ...]:
+    branches = []
+    for branch in step.get("branches") or ():
+        if not isinstance(branch, dict) or not branch.get("condition") or not branch.get("check"):
+            raise SOPCompileError(f"{where}: branches 中的每一项必须包含 condition 和 check")
+        branches.append(Branch(branch["condition"], branch["check"], compile_condition(branch["condition"])))
+    return tuple(branches)
+
+
+def compile_sop(config: Dict[str, Any], *, tools: Optional[Collection[str]] = None) -> CompiledSOP:
+    """
+    编译 SOP 配置
+
+    Args:
+        config: YAML 解析得到的字典（包含 steps，可选 sub_flows、terminals）
+        tools: 支持的 MCP 工具名称，None 表示不校验工具名称
+
+    Raises:
+        SOPCompileError: 缺少 prompt、步骤 id 重复、跳转目标不存在、工具配置错误等
+    """
+    if not isinstance(config, dict) or not isinstance(config.get("steps"), list) or not config["steps"]:
+        raise SOPCompileError("SOP 配置必须包含非空的 steps 列表")
+
+    terminals = frozenset(config.get("terminals") or ())
+    # (流程名称, 步骤配置, 流程内下一步的默认下标)
+    flat: List[Tuple[str, Dict[str, Any], Optional[int]]] = []
+    sub_flows: Dict[str, int] = {}
+    last_of: Dict[str, int] = {}            # 流程名称 -> 最后一步下标
+
+    def add_flow(name: str, steps: List[Any]) -> None:
+        start = len(flat)
+        for offset, step in enumerate(steps):
+            if not isinstance(step, dict):
+                raise SOPCompileError(f"{name} 第 {offset + 1} 步必须是映射")
+            default_next = start + offset + 1 if offset + 1 < len(steps) else None
+            flat.append((name, step, default_next))
+        last_of[name] = len(flat) - 1
+
+    add_flow("main", config["steps"])
+    main_length = len(flat)
+    for name, flow in (config.get("sub_flows") or {}).items():
+        steps = (flow or {}).get("steps") if isinstance(flow, dict) else None
+        if not isinstance(steps, list) or not steps:
+            raise SOPCompileError(f"子流程 {name} 必须包含非空的 steps 列表")
+        sub_flows[name] = len(flat)
+        add_flow(name, steps)
+
+    # 子流程步骤可以省略 id，按 "sub_flow_<名称>.<序号>" 生成
+    ids: List[str] = []
+    index_of: Dict[str, int] = {}
+    for index, (flow, step, _) in enumerate(flat):
+        step_id = step.get("id") or (f"{SUB_FLOW_PREFIX}{flow}.{index - sub_flows[flow]}" if flow != "main" else None)
+        if not step_id:
+            raise SOPCompileError(f"主流程第 {index + 1} 步缺少 id")
+        ids.append(step_id)
+        if step_id in index_of:
+            raise SOPCompileError(f"步骤 id 重复: {step_id}")
+        if step_id in terminals:
+            raise SOPCompileError(f"步骤 id 与流程出口同名: {step_id}")
+        index_of[step_id] = index
+
+    def resolve(target: Optional[str], where: str, default: Optional[int]) -> Optional[int]:
+        if target is None:
+            return default
+        if target in index_of:
+            return index_of[target]
+        if target.startswith(SUB_FLOW_PREFIX) and target[len(SUB_FLOW_PREFIX):] in sub_flows:
+            return sub_flows[target[len(SUB_FLOW_PREFIX):]]
+        if target in terminals:
+            return None
+        raise SOPCompileError(f"{where}: 跳转目标 {target!r} 既不是步骤 id、子流程，也不是 terminals 中声明的流程出口")
+
+    # 子流程名称 -> 返回位置（进入它的步骤成功后的下一步）
+    returns: Dict[str, Optional[int]] = {}
+    for index, (flow, step, default_next) in enumerate(flat):
+        on_success = step.get("on_success") or {}
+        for key in ("on_success", "on_fail"):
+            target = (step.get(key) or {}).get("next")
+            name = target[len(SUB_FLOW_PREFIX):] if isinstance(target, str) and target.startswith(SUB_FLOW_PREFIX) else None
+            if name not in sub_flows or name == flow or target in index_of:
+                continue
+            back = resolve(on_success.get("next"), f"步骤 {ids[index]} on_success.next", default_next)
+            last_step = flat[last_of[name]][1]
+            if name in returns and returns[name] != back and not (last_step.get("on_success") or {}).get("next"):
+                raise SOPCompileError(f"子流程 {name} 从多处进入且返回位置不同，最后一步必须配置 on_success.next")
+            returns[name] = back
+
+    compiled: List[CompiledStep] = []
+    for index, (flow, step, default_next) in enumerate(flat):
+        step_id = ids[index]
+        where = f"步骤 {step_id}"
+        if flow != "main" and default_next is None:
+            default_next = returns.get(flow)
+        prompt = step.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise SOPCompileError(f"{where}: 缺少 prompt")
+        on_success = step.get("on_success") or {}
+        on_fail = step.get("on_fail") or {}
+        compiled.append(CompiledStep(
+            index=index,
+            id=step_id,
+            prompt=prompt,
+            title=step.get("title", ""),
+            action=step.get("action"),
+            flow=flow,
+            tool=_tool_config(step, where, tools),
+            check_logic=_freeze(step.get("check_logic")),
+            expected_answer=tuple(step.get("expected_answer") or ()),
+            branches=_branches(step, where),
+            next_index=resolve(on_success.get("next"), f"{where} on_success.next", default_next),
+            next_target=on_success.get("next"),
+            success_message=on_success.get("message"),
+            fail_index=resolve(on_fail.get("next"), f"{where} on_fail.next", None),
+            fail_target=on_fail.get("next"),
+            fail_message=on_fail.get("message"),
+            raw=_freeze(step),
+        ))
+
+    return CompiledSOP(
+        steps=tuple(compiled),
+        index_of=MappingProxyType(index_of),
+        sub_flows=MappingProxyType(sub_flows),
+        terminals=terminals,
+        main_length=main_length,
+    )
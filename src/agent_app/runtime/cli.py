@@ -1,11 +1,501 @@
 """
-CLI 入口（预留）
+CLI 入口
 
 电动车售后智能客服 - 命令行工具
-当前主要通过 FastAPI 服务器 (server.py) 和 Streamlit UI (frontend/ui.py) 使用。
-此文件保留用于未来可能的 CLI 工具需求。
+对话服务通过 FastAPI 服务器 (server.py) 和 Streamlit UI (frontend/ui.py) 使用，
+这里提供离线的批处理命令。
 
-示例用法（未实现）:
-- agent_app diagnose --order-id 12345
-- agent_app test-sop
+用法:
+- agent_app audit vehicles.csv --output results.csv --report report.json
+    全车队安全审计：逐条计算安全母线电流，统计短板组件分布，
+    找出控制器设定电流超过安全上限的车辆
+
+输入为 CSV 或 JSONL，列名与 VehicleSpecs 字段一致，另外可以包含：
+- vehicle_id / order_id / vin：车辆标识，写入结果和报告
+- configured_current：控制器当前设定的母线电流(A)，用于判断是否超限
+
+输入按块流式读取原始行，解析与计算都在进程池中进行，内存占用与文件大小无关；
+无法解析的行（JSON 错误、CSV 列数不符）作为该行的错误写入结果，不会中断审计。
+
+- agent_app index build [路径...]
+    为 NODE_RAG 建立本地 BM25 检索索引（settings.RAG_INDEX_PATH），
+    默认收录 SOP 模板、changeLog/ 与 data/manuals/；
+    add / delete 增量更新单个文件，optimize 合并段，search / stats 用于检查索引
 """
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from pydantic import ValidationError
+
+from agent_app.agents.validator import BOTTLENECK_COMPONENTS, SafetyCalculator, VehicleSpecs
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMNS = ("vehicle_id", "order_id", "vin")
+NUMERIC_COLUMNS = (
+    "voltage", "capacity_ah", "bms_current", "motor_power_rated",
+    "wire_gauge", "breaker_rating", "controller_max_current", "configured_current",
+)
+RESULT_COLUMNS = ("index", "vehicle_id", "valid", "errors", "safe_bus_current", "bottleneck", "configured_current", "over_limit")
+
+# (块在输入中的起始序号, 格式, CSV 表头, 原始记录文本)
+Chunk = Tuple[int, str, Optional[List[str]], List[str]]
+
+# 无法解析的行的错误描述
+INVALID_JSON = "invalid_json"
+INVALID_CSV_ROW = "invalid_csv_row"
+
+
+# ---------------------------------------------------------------------------
+# 输入
+# ---------------------------------------------------------------------------
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    return "csv" if Path(path).suffix.lower() == ".csv" else "jsonl"
+
+
+def _raw_records(f: TextIO, fmt: str) -> Iterator[str]:
+    """
+    按记录切分原始文本，跳过空行（不解析字段）
+
+    CSV 的引号字段中可以包含换行：引号未闭合时把下一行拼接到同一条记录。
+    """
+    if fmt != "csv":
+        yield from (line for line in f if line.strip())
+        return
+    pending = ""
+    for line in f:
+        pending += line
+        if pending.count('"') % 2 == 0:
+            if pending.strip():
+                yield pending
+            pending = ""
+    if pending.strip():
+        yield pending
+
+
+def iter_chunks(path: str, fmt: str, chunk_size: int) -> Iterator[Chunk]:
+    """按块读取原始记录，任何时刻只有一个块在内存中；解析交给工作进程"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        records = _raw_records(f, fmt)
+        header = next(csv.reader([next(records, "")]), []) if fmt == "csv" else None
+        start = 0
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                return
+            yield start, fmt, header, chunk
+            start += len(chunk)
+
+
+def parse_records(fmt: str, header: Optional[List[str]], lines: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    解析原始记录，返回 (记录, 解析错误)
+
+    无法解析的行记录为空字典，解析错误为 INVALID_JSON / INVALID_CSV_ROW，其余行为空字符串。
+    """
+    records: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    for line in lines:
+        record, error = None, ""
+        if fmt == "csv":
+            try:
+                values = next(csv.reader([line]))
+            except csv.Error:
+                values = None
+            if values is None or len(values) > len(header):
+                error = INVALID_CSV_ROW
+            else:
+                record = dict(zip(header, values))
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                pass
+            if not isinstance(record, dict):
+                record, error = None, INVALID_JSON
+        records.append(record if record is not None else {})
+        errors.append(error)
+    return records, errors
+
+
+# ---------------------------------------------------------------------------
+# 计算（在工作进程中执行）
+# ---------------------------------------------------------------------------
+
+def _to_float(value: Any) -> float:
+    if value is None or value == "":
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _vehicle_id(record: Dict[str, Any], index: int) -> str:
+    for column in ID_COLUMNS:
+        if record.get(column) not in (None, ""):
+            return str(record[column])
+    return str(index)
+
+
+def _calculate(records: List[Dict[str, Any]]) -> Tuple[List[float], List[int], List[str]]:
+    """返回 (安全电流, 短板组件编码, 错误描述)，安装了 numpy 时使用向量化计算"""
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        columns = {name: np.array([_to_float(r.get(name)) for r in records]) for name in NUMERIC_COLUMNS}
+        columns["battery_type"] = np.array([r.get("battery_type") or "" for r in records], dtype=object)
+        columns["motor_type"] = np.array([r.get("motor_type") or "standard" for r in records], dtype=object)
+        batch = SafetyCalculator.calculate_batch(columns)
+        errors = [
+            ",".join(name for name, mask in batch["errors"].items() if mask[i])
+            for i in range(len(records))
+        ]
+        return batch["safe_bus_current"].tolist(), batch["bottleneck"].tolist(), errors
+
+    safe, bottleneck, errors = [], [], []
+    for record in records:
+        try:
+            specs = VehicleSpecs(**{k: v for k, v in record.items() if v not in (None, "")})
+            result = SafetyCalculator.calculate_max_bus_current(specs)
+        except (ValidationError, ZeroDivisionError) as e:
+            safe.append(math.nan)
+            bottleneck.append(-1)
+            # 与向量化计算使用相同的规则名称
+            errors.append(",".join(SafetyCalculator.record_errors(record)) or type(e).__name__)
+            continue
+        safe.append(result["safe_bus_current"])
+        bottleneck.append(BOTTLENECK_COMPONENTS.index(result["bottleneck_component"]))
+        errors.append("")
+    return safe, bottleneck, errors
+
+
+def audit_chunk(chunk: Chunk) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """解析并计算一个块，返回 (逐条结果, 块内汇总)"""
+    start, fmt, header, lines = chunk
+    records, parse_errors = parse_records(fmt, header, lines)
+    safe, bottleneck, errors = _calculate(records)
+    errors = [parse_error or error for parse_error, error in zip(parse_errors, errors)]
+
+    rows = []
+    summary = {
+        "records": len(records),
+        "valid": 0,
+        "errors": Counter(),
+        "bottlenecks": Counter(),
+        "over_limit": [],
+        "over_limit_count": 0,
+        "safe_current_sum": 0.0,
+        "safe_current_min": math.inf,
+        "safe_current_max": -math.inf,
+    }
+    for offset, record in enumerate(records):
+        index = start + offset
+        valid = bottleneck[offset] >= 0
+        configured = _to_float(record.get("configured_current"))
+        over_limit = valid and not math.isnan(configured) and configured > safe[offset]
+        row = {
+            "index": index,
+            "vehicle_id": _vehicle_id(record, index),
+            "valid": valid,
+            "errors": errors[offset],
+            "safe_bus_current": safe[offset] if valid else None,
+            "bottleneck": BOTTLENECK_COMPONENTS[bottleneck[offset]] if valid else None,
+            "configured_current": None if math.isnan(configured) else configured,
+            "over_limit": over_limit,
+        }
+        rows.append(row)
+
+        if not valid:
+            summary["errors"].update(errors[offset].split(","))
+            continue
+        summary["valid"] += 1
+        summary["bottlenecks"][row["bottleneck"]] += 1
+        summary["safe_current_sum"] += safe[offset]
+        summary["safe_current_min"] = min(summary["safe_current_min"], safe[offset])
+        summary["safe_current_max"] = max(summary["safe_current_max"], safe[offset])
+        if over_limit:
+            summary["over_limit_count"] += 1
+            summary["over_limit"].append({
+                "vehicle_id": row["vehicle_id"],
+                "configured_current": configured,
+                "safe_bus_current": safe[offset],
+                "bottleneck": row["bottleneck"],
+            })
+    return rows, summary
+
+
+# ---------------------------------------------------------------------------
+# 输出
+# ---------------------------------------------------------------------------
+
+class AuditReport:
+    """汇总各块结果；超限车辆清单最多保留 max_listed 条，完整结果见逐条输出"""
+
+    def __init__(self, max_listed: int = 1000):
+        self.max_listed = max_listed
+        self.records = 0
+        self.valid = 0
+        self.errors: Counter = Counter()
+        self.bottlenecks: Counter = Counter()
+        self.over_limit: List[Dict[str, Any]] = []
+        self.over_limit_count = 0
+        self.safe_current_sum = 0.0
+        self.safe_current_min = math.inf
+        self.safe_current_max = -math.inf
+
+    def add(self, summary: Dict[str, Any]) -> None:
+        self.records += summary["records"]
+        self.valid += summary["valid"]
+        self.errors.update(summary["errors"])
+        self.bottlenecks.update(summary["bottlenecks"])
+        self.over_limit_count += summary["over_limit_count"]
+        room = self.max_listed - len(self.over_limit)
+        if room > 0:
+            self.over_limit.extend(summary["over_limit"][:room])
+        self.safe_current_sum += summary["safe_current_sum"]
+        self.safe_current_min = min(self.safe_current_min, summary["safe_current_min"])
+        self.safe_current_max = max(self.safe_current_max, summary["safe_current_max"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "valid": self.valid,
+            "invalid": self.records - self.valid,
+            "errors": dict(self.errors.most_common()),
+            "bottleneck_histogram": {name: self.bottlenecks.get(name, 0) for name in BOTTLENECK_COMPONENTS},
+            "safe_bus_current": {
+                "min": self.safe_current_min if self.valid else None,
+                "mean": round(self.safe_current_sum / self.valid, 2) if self.valid else None,
+                "max": self.safe_current_max if self.valid else None,
+            },
+            "over_limit_count": self.over_limit_count,
+            "over_limit": self.over_limit,
+        }
+
+
+class ResultWriter:
+    """逐条结果写入 CSV 或 JSONL（按扩展名判断）"""
+
+    def __init__(self, path: Optional[str]):
+        self._file: Optional[TextIO] = None
+        self._csv = None
+        if path:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+            if Path(path).suffix.lower() == ".csv":
+                self._csv = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS)
+                self._csv.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if self._file is None:
+            return
+        if self._csv is not None:
+            self._csv.writerows(rows)
+        else:
+            self._file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class Progress:
+    """定期向 stderr 输出进度和吞吐"""
+
+    def __init__(self, interval: float, stream: TextIO = sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.done = 0
+
+    def update(self, count: int, force: bool = False) -> None:
+        self.done += count
+        now = time.perf_counter()
+        if self.interval >= 0 and (force or now - self._last >= self.interval):
+            self._last = now
+            elapsed = max(now - self.started, 1e-9)
+            print(f"[audit] 已处理 {self.done:,} 条，{self.done / elapsed:,.0f} 条/秒，耗时 {elapsed:.1f}s", file=self.stream)
+
+
+# ---------------------------------------------------------------------------
+# audit 命令
+# ---------------------------------------------------------------------------
+
+def run_audit(
+    input_path: str,
+    *,
+    fmt: Optional[str] = None,
+    output_path: Optional[str] = None,
+    report_path: Optional[str] = None,
+    chunk_size: int = 20000,
+    workers: Optional[int] = None,
+    progress_interval: float = 2.0,
+    max_listed: int = 1000,
+) -> Dict[str, Any]:
+    """
+    执行安全审计，返回汇总报告
+
+    同时在途的块数不超过 workers * 2，结果按输入顺序写出。
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_chunks(input_path, detect_format(input_path, fmt), chunk_size)
+    report = AuditReport(max_listed)
+    writer = ResultWriter(output_path)
+    progress = Progress(progress_interval)
+
+    def consume(result: Tuple[List[Dict[str, Any]], Dict[str, Any]]) -> None:
+        rows, summary = result
+        writer.write(rows)
+        report.add(summary)
+        progress.update(summary["records"])
+
+    try:
+        if workers == 1:
+            for chunk in chunks:
+                consume(audit_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending: Deque[Future] = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(audit_chunk, chunk))
+                    if len(pending) >= workers * 2:
+                        consume(pending.popleft().result())
+                while pending:
+                    consume(pending.popleft().result())
+    finally:
+        writer.close()
+    progress.update(0, force=True)
+
+    result = report.to_dict()
+    result["elapsed_seconds"] = round(time.perf_counter() - progress.started, 3)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return result
+
+
+def _cmd_audit(args: argparse.Namespace) -> int:
+    result = run_audit(
+        args.input,
+        fmt=args.format,
+        output_path=args.output,
+        report_path=args.report,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        progress_interval=-1 if args.quiet else args.progress_interval,
+        max_listed=args.max_listed,
+    )
+    summary = {k: v for k, v in result.items() if k != "over_limit"}
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# index 命令
+# ---------------------------------------------------------------------------
+
+def _open_index(args: argparse.Namespace):
+    from agent_app.knowledge.retrieval import BM25Index
+    from agent_app.settings import settings
+
+    return BM25Index(args.index or settings.RAG_INDEX_PATH, ngram=args.ngram, reload_interval=0)
+
+
+def _cmd_index(args: argparse.Namespace) -> int:
+    from agent_app.knowledge.retrieval import default_sources, file_documents, iter_source_files, source_name
+
+    index = _open_index(args)
+    started = time.perf_counter()
+    try:
+        if args.action == "build":
+            # 全量重建：收录给定文件，删除不再存在的文档，最后合并为一个段
+            live = set(index.doc_ids())
+            files = 0
+            for path in iter_source_files(args.paths or default_sources()):
+                docs = file_documents(path, args.max_chars)
+                live.difference_update(doc["id"] for doc in docs)
+                index.add(docs)
+                files += 1
+            index.delete(live)
+            index.optimize()
+            print(f"[index] 收录 {files} 个文件", file=sys.stderr)
+        elif args.action == "add":
+            for path in iter_source_files(args.paths):
+                index.delete_source(source_name(path))
+                index.add(file_documents(path, args.max_chars))
+            index.commit()
+        elif args.action == "delete":
+            for source in args.paths:
+                removed = index.delete_source(source_name(source))
+                print(f"[index] {source}: 删除 {removed} 个段落", file=sys.stderr)
+            index.commit()
+        elif args.action == "optimize":
+            index.optimize()
+        elif args.action == "search":
+            for hit in index.search(" ".join(args.paths), top_k=args.top_k):
+                print(json.dumps(hit, ensure_ascii=False))
+            print(f"[index] 查询耗时 {(time.perf_counter() - started) * 1000:.2f}ms", file=sys.stderr)
+            return 0
+        print(json.dumps(index.stats(), ensure_ascii=False, indent=2))
+        return 0
+    finally:
+        index.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="agent_app", description="电动车售后智能客服 - 命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    audit = subparsers.add_parser("audit", help="全车队安全审计（计算安全母线电流）")
+    audit.add_argument("input", help="车辆参数文件（CSV 或 JSONL）")
+    audit.add_argument("--format", choices=["csv", "jsonl"], help="输入格式，默认按扩展名判断")
+    audit.add_argument("-o", "--output", help="逐条结果输出文件（.csv 或 .jsonl）")
+    audit.add_argument("-r", "--report", help="汇总报告输出文件（JSON）")
+    audit.add_argument("--chunk-size", type=int, default=20000, help="每块记录数（默认 20000）")
+    audit.add_argument("-j", "--workers", type=int, default=None, help="工作进程数（默认 CPU 核数）")
+    audit.add_argument("--progress-interval", type=float, default=2.0, help="进度输出间隔（秒）")
+    audit.add_argument("--max-listed", type=int, default=1000, help="报告中列出的超限车辆数上限")
+    audit.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+    audit.set_defaults(func=_cmd_audit)
+
+    index = subparsers.add_parser("index", help="本地检索索引（NODE_RAG）的建立与维护")
+    index.add_argument(
+        "action", choices=["build", "add", "delete", "optimize", "search", "stats"],
+        help="build 全量重建 / add 增量收录文件 / delete 删除文件 / optimize 合并段 / search 查询 / stats 统计",
+    )
+    index.add_argument("paths", nargs="*", help="文件或目录（search 时为查询语句）；build 不指定时使用默认资料目录")
+    index.add_argument("--index", help="索引目录，默认 settings.RAG_INDEX_PATH")
+    index.add_argument("--max-chars", type=int, default=400, help="每个段落的最大字符数（默认 400）")
+    index.add_argument("--ngram", type=int, default=2, help="中文字符 n-gram 长度（默认 2，仅新建索引时生效）")
+    index.add_argument("-k", "--top-k", type=int, default=5, help="search 返回的段落数（默认 5）")
+    index.set_defaults(func=_cmd_index)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
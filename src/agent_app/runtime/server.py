@@ -1,6 +1,18 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessageChunk, RemoveMessage
 from pydantic import BaseModel
-from agent_app.graph.build import build_graph
+from typing import Any, Dict, List
+from agent_app.graph.build import get_graph
+from agent_app.graph.state import structured_input
+from agent_app.agents.base import get_llm_gateway
+from agent_app.agents.executor import get_diagnostic_agent
+from agent_app.agents.llm_cache import get_llm_cache
+from agent_app.agents.semantic_cache import get_semantic_cache
+from agent_app.tools.mcp_client import get_mcp_client
+from agent_app.tools.prefetch import get_prefetcher
+from agent_app.concurrency import install_default_executor, shutdown_executor
+from contextlib import asynccontextmanager
 import logging
 import json
 
@@ -11,12 +23,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="电动售后智能客服", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 同步节点与阻塞调用统一使用可配置大小的线程池
+    install_default_executor()
+    # 图在启动阶段构建（LLM 客户端仍在首次使用时才创建），import 本模块不做任何初始化
+    get_graph()
+    yield
+    # 语义缓存命中后的访问时间是批量落盘的，退出前写入剩余部分
+    semantic = get_semantic_cache()
+    if semantic is not None:
+        semantic.flush()
+    shutdown_executor(wait=False)
 
-# 初始化图实例
-logger.info("正在初始化 Agent Graph...")
-agent_graph = build_graph()
-logger.info("Agent Graph 初始化完成")
+app = FastAPI(title="电动售后智能客服", version="0.1.0", lifespan=lifespan)
 
 class ChatRequest(BaseModel):
     message: str
@@ -24,6 +44,57 @@ class ChatRequest(BaseModel):
     # 模拟前端传入的用户信息（实际场景可能从数据库取）
     mock_info: dict = {}
 
+def _build_input(req: ChatRequest):
+    """构造图执行的 config 与输入状态"""
+    config = {"configurable": {"thread_id": req.thread_id}}
+
+    # 构造初始状态
+    # 注意：langgraph 会自动合并新消息
+    # mock_info 是结构化输入，记录来源后文本抽取不会覆盖这些字段；取值 CLEAR_FIELD 可以清空字段
+    input_state = {
+        "messages": [("user", req.message)],
+        **structured_input(req.mock_info),
+    }
+    return config, input_state
+
+def _build_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """从图的最终状态中提取返回给前端的字段"""
+    logger.debug(f"执行结果状态:")
+    logger.debug(f"  - is_info_complete: {result.get('is_info_complete')}")
+    logger.debug(f"  - current_step: {result.get('current_step')}")
+    logger.debug(f"  - diagnostic_result: {result.get('diagnostic_result')}")
+    logger.debug(f"  - 消息数量: {len(result.get('messages', []))}")
+
+    # 获取最新的 AI 回复
+    last_msg = result["messages"][-1]
+    logger.debug(f"最后一条消息类型: {type(last_msg)}")
+    logger.debug(f"最后一条消息内容: {last_msg.content if hasattr(last_msg, 'content') else last_msg}")
+
+    return {
+        "response": last_msg.content,
+        "current_step": result.get("current_step"),
+        "is_info_complete": result.get("is_info_complete")
+    }
+
+def _message_texts(messages: List[Any]) -> List[str]:
+    """
+    提取节点输出消息的文本（节点返回的可能是 (role, content) 元组或 BaseMessage）
+
+    跳过 history 节点用于删除旧消息的 RemoveMessage 以及没有内容的消息。
+    """
+    texts = []
+    for message in messages:
+        if isinstance(message, RemoveMessage):
+            continue
+        text = str(message[1]) if isinstance(message, tuple) else str(getattr(message, "content", message))
+        if text:
+            texts.append(text)
+    return texts
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
 @app.post("/chat")
 async def chat_endpoint(req: ChatRequest):
     logger.info(f"收到聊天请求 - Thread ID: {req.thread_id}")
@@ -31,38 +102,16 @@ async def chat_endpoint(req: ChatRequest):
     logger.debug(f"客户信息: {json.dumps(req.mock_info, ensure_ascii=False, indent=2)}")
 
     try:
-        config = {"configurable": {"thread_id": req.thread_id}}
-
-        # 构造初始状态
-        # 注意：langgraph 会自动合并新消息
-        input_state = {
-            "messages": [("user", req.message)],
-            "customer_info": req.mock_info
-        }
+        config, input_state = _build_input(req)
 
         logger.info("开始执行 Agent Graph...")
         logger.debug(f"输入状态: {json.dumps(input_state, ensure_ascii=False, default=str)}")
 
-        # 执行图
-        result = agent_graph.invoke(input_state, config=config)
+        # 执行图（异步执行，不阻塞事件循环）
+        result = await get_graph().ainvoke(input_state, config=config)
 
         logger.info("Agent Graph 执行完成")
-        logger.debug(f"执行结果状态:")
-        logger.debug(f"  - is_info_complete: {result.get('is_info_complete')}")
-        logger.debug(f"  - current_step: {result.get('current_step')}")
-        logger.debug(f"  - diagnostic_result: {result.get('diagnostic_result')}")
-        logger.debug(f"  - 消息数量: {len(result.get('messages', []))}")
-
-        # 获取最新的 AI 回复
-        last_msg = result["messages"][-1]
-        logger.debug(f"最后一条消息类型: {type(last_msg)}")
-        logger.debug(f"最后一条消息内容: {last_msg.content if hasattr(last_msg, 'content') else last_msg}")
-
-        response_data = {
-            "response": last_msg.content,
-            "current_step": result.get("current_step"),
-            "is_info_complete": result.get("is_info_complete")
-        }
+        response_data = _build_response(result)
 
         logger.info(f"返回响应: {response_data['response'][:100]}...")
         return response_data
@@ -71,6 +120,91 @@ async def chat_endpoint(req: ChatRequest):
         logger.error(f"处理请求时发生错误: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    流式聊天接口（Server-Sent Events）
+
+    事件类型：
+    - start: 请求已受理（立即返回，降低首字节时间）
+    - node: 某个节点执行完成，附带该节点输出的消息
+    - token: LLM 流式输出的 token
+    - final: 图执行完成，字段与 /chat 的响应一致
+    - error: 执行出错
+    """
+    logger.info(f"收到流式聊天请求 - Thread ID: {req.thread_id}")
+    logger.debug(f"用户消息: {req.message}")
+
+    config, input_state = _build_input(req)
+    agent_graph = get_graph()
+
+    async def event_stream():
+        yield _sse("start", {"thread_id": req.thread_id})
+        try:
+            async for mode, chunk in agent_graph.astream(
+                input_state, config=config, stream_mode=["updates", "messages"]
+            ):
+                if mode == "messages":
+                    message, metadata = chunk
+                    # 只转发 LLM 的流式 token，节点返回的完整消息通过 node 事件发送
+                    if isinstance(message, AIMessageChunk) and message.content:
+                        yield _sse("token", {
+                            "node": metadata.get("langgraph_node"),
+                            "content": message.content
+                        })
+                elif mode == "updates":
+                    for node, update in chunk.items():
+                        messages = (update or {}).get("messages", []) if isinstance(update, dict) else []
+                        yield _sse("node", {
+                            "node": node,
+                            "messages": _message_texts(messages)
+                        })
+
+            snapshot = await agent_graph.aget_state(config)
+            response_data = _build_response(snapshot.values)
+            logger.info(f"流式响应完成: {response_data['response'][:100]}...")
+            yield _sse("final", response_data)
+
+        except Exception as e:
+            logger.error(f"流式处理请求时发生错误: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats/sessions")
+async def session_stats():
+    """会话存储监控指标（仅支持提供 stats() 的 Checkpointer）"""
+    checkpointer = get_graph().checkpointer
+    if not hasattr(checkpointer, "stats"):
+        return {"backend": type(checkpointer).__name__}
+    return {"backend": type(checkpointer).__name__, **checkpointer.stats()}
+
+@app.get("/stats/llm")
+async def llm_stats():
+    """LLM 网关调用统计、响应缓存命中率与语义缓存的相似度分布"""
+    cache = get_llm_cache()
+    semantic = get_semantic_cache()
+    return {
+        **get_llm_gateway().stats(),
+        "cache": cache.stats() if cache else None,
+        "semantic_cache": semantic.stats() if semantic else None,
+    }
+
+@app.get("/stats/mcp")
+async def mcp_stats():
+    """MCP 兼容性查询的后端调用、合并、缓存命中与预取统计"""
+    prefetcher = get_prefetcher()
+    return {**get_mcp_client().stats(), "prefetch": prefetcher.stats() if prefetcher else None}
+
+@app.get("/stats/checks")
+async def check_stats():
+    """SOP 步骤校验统计：规则直接判定的比例与 LLM 兜底次数"""
+    return get_diagnostic_agent().checks.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
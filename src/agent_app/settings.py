@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Any, List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,8 +14,122 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     OPENAI_MODEL_NAME: str = "gpt-4-turbo"
     OPENAI_BASE_URL: str = "https://api.apiyi.com/v1"
+    # openai: 真实模型；fake: 本地假模型（测试/基准），固定返回 LLM_FAKE_RESPONSE
+    LLM_BACKEND: str = "openai"
+    LLM_FAKE_RESPONSE: str = "PASS"
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    # LLM 响应缓存（内存 LRU + SQLite），LLM_CACHE_PATH 为空时只使用内存
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite"
+    LLM_CACHE_MAX_MEMORY_ENTRIES: int = 2048
+    LLM_CACHE_MAX_DISK_ENTRIES: int = 200_000
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # 语义近重复缓存（MinHash/LSH，见 agents/semantic_cache.py）：同义改写的问题复用已有回答；
+    # CONTEXT_FIELDS 为影响回答的 customer_info 字段，取值不同的问题不会互相命中。
+    # 只用于自由文本问答（BaseAgent.ask_llm），目前还没有接入该路径的节点，默认关闭；
+    # SOP 校验判定不经过语义缓存（反义回复字面相似度很高）
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_PATH: str = "data/semantic_cache.sqlite"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.7
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 20_000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    SEMANTIC_CACHE_CONTEXT_FIELDS: List[str] = ["vehicle_model", "controller_model", "battery_type", "battery_voltage"]
 
     # Database / Redis (Optional)
     REDIS_URL: str = "redis://localhost:6379/0"
 
-settings = Settings()
\ No newline at end of file
+    # Checkpoint Config
+    # memory: 进程内（单 worker）；sqlite: 本地文件（多 worker 共享）；redis: 多机共享
+    CHECKPOINT_BACKEND: str = "memory"
+    CHECKPOINT_SQLITE_PATH: str = "data/checkpoints.sqlite"
+    CHECKPOINT_POOL_SIZE: int = 8
+    # memory 后端的会话上限（0 表示不限制）
+    SESSION_TTL_SECONDS: int = 2 * 3600
+    SESSION_MAX_COUNT: int = 10000
+    SESSION_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # History Config
+    # 保留最近 N 轮对话原文，更早的消息折叠为摘要（0 表示不折叠）
+    HISTORY_MAX_TURNS: int = 6
+    HISTORY_SUMMARY_LINE_CHARS: int = 80
+    HISTORY_SUMMARY_MAX_CHARS: int = 2000
+
+    # MCP Config
+    # 未配置 MCP_BASE_URL 时使用本地模拟数据
+    MCP_BASE_URL: Optional[str] = None
+    MCP_CONNECT_TIMEOUT: float = 2.0
+    MCP_READ_TIMEOUT: float = 5.0
+    MCP_MAX_CONNECTIONS: int = 20
+    MCP_HTTP2: bool = True
+    # 批量查询：每个请求的最大条数，以及异步批量查询同时在途的请求数
+    MCP_BATCH_SIZE: int = 500
+    MCP_BATCH_CONCURRENCY: int = 4
+    # 兼容性查询结果缓存，MCP_CACHE_MAX_ENTRIES=0 表示关闭；未知结果使用较短的 TTL
+    MCP_CACHE_MAX_ENTRIES: int = 4096
+    MCP_CACHE_TTL_SECONDS: float = 3600
+    MCP_CACHE_NEGATIVE_TTL_SECONDS: float = 60
+    # 批量查询（离线审计）单独的结果缓存，TTL 与交互缓存相同；0 表示批量查询不缓存
+    MCP_BATCH_CACHE_MAX_ENTRIES: int = 20000
+    # 熔断：最近 MCP_BREAKER_WINDOW_SIZE 次调用的失败率达到阈值后，
+    # MCP_BREAKER_OPEN_SECONDS 秒内直接降级，不再请求服务
+    MCP_BREAKER_ENABLED: bool = True
+    MCP_BREAKER_WINDOW_SIZE: int = 20
+    MCP_BREAKER_MIN_CALLS: int = 5
+    MCP_BREAKER_FAILURE_RATE: float = 0.5
+    MCP_BREAKER_OPEN_SECONDS: float = 30.0
+
+    # 信息收集完整时提前在后台发起兼容性查询（仅在连接真实 MCP 服务时生效）
+    MCP_PREFETCH_ENABLED: bool = True
+    MCP_PREFETCH_TTL_SECONDS: float = 600
+    MCP_PREFETCH_MAX_SESSIONS: int = 10000
+
+    # 离线兼容性表（JSONL/CSV），为空时使用 knowledge/data/compatibility.jsonl；
+    # 文件变更后最多 COMPATIBILITY_RELOAD_INTERVAL 秒内生效
+    COMPATIBILITY_TABLE_PATH: Optional[str] = None
+    COMPATIBILITY_RELOAD_INTERVAL: float = 2.0
+
+    # 升级方案求解器的配件目录（JSONL），为空时使用 knowledge/data/upgrade_catalog.jsonl 示例目录
+    UPGRADE_CATALOG_PATH: Optional[str] = None
+
+    # YAML 模板（SOP 等）变更后最多 TEMPLATE_RELOAD_INTERVAL 秒内生效；
+    # TEMPLATE_CACHE_DIR 非空时把解析结果 pickle 到该目录，重启后跳过 YAML 解析（目录须为可信路径）
+    TEMPLATE_RELOAD_INTERVAL: float = 2.0
+    TEMPLATE_CACHE_DIR: Optional[str] = None
+
+    # SOP 步骤校验：规则（range_check / expected_answer）无法判定的回复是否交给 LLM
+    CHECK_LLM_FALLBACK: bool = True
+
+    # 本地 BM25 检索（NODE_RAG）：索引目录由 `agent_app index build` 生成，
+    # 变更后最多 RAG_RELOAD_INTERVAL 秒内生效；以 RAG_QUERY_PREFIXES 开头的消息走检索而不是诊断
+    RAG_INDEX_PATH: str = "data/rag_index"
+    RAG_TOP_K: int = 3
+    RAG_RELOAD_INTERVAL: float = 2.0
+    RAG_QUERY_PREFIXES: List[str] = ["/ask", "查资料", "查手册"]
+
+    # Runtime Config
+    # 同步代码（同步节点、MCP 调用等）在线程池中执行，避免阻塞事件循环
+    GRAPH_THREAD_POOL_SIZE: int = 32
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """获取配置单例（首次调用时读取环境变量与 .env）"""
+    return Settings()
+
+class _LazySettings:
+    """
+    配置的延迟代理
+
+    import 时不读取配置，首次访问属性时才创建 Settings，
+    避免缺少 OPENAI_API_KEY 等必填项时连模块都无法导入。
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_settings(), name, value)
+
+settings = _LazySettings()
\ No newline at end of file
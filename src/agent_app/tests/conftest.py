@@ -0,0 +1,7 @@
+import os
+
+# 测试环境不需要真实的 LLM Key
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+# 缓存单例重置为 None 后按 settings 重新创建，测试中只使用内存，不写 ./data
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("SEMANTIC_CACHE_PATH", "")
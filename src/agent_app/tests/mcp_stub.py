@@ -0,0 +1,93 @@
+"""
+本地 MCP 服务替身
+
+在后台线程中启动一个 HTTP/1.1 服务，模拟 MCP 兼容性查询接口，
+并记录请求数与 TCP 连接数，便于验证连接复用、超时和故障降级。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MCPStubServer:
+    def __init__(self, responses=None, delay=0.0):
+        # (vehicle_model, controller_model) -> 响应
+        self.responses = responses or {}
+        self.delay = delay
+        # 故障注入：大于 0 时返回该 HTTP 状态码；drop 为 True 时不响应直接断开连接
+        self.fail_status = 0
+        self.drop = False
+        self.requests = 0
+        self.batch_sizes = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        # 客户端超时断开后写响应会失败，不打印堆栈
+        self.server.handle_error = lambda request, client_address: None
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.drop:
+                    self.close_connection = True
+                    return
+                if stub.fail_status:
+                    self._send(stub.fail_status, {"error": "injected failure"})
+                    return
+                self._send(200, stub.handle(self.path, body))
+
+            def _send(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def handle(self, path, body):
+        if path.endswith("/batch"):
+            self.batch_sizes.append(len(body["queries"]))
+            return {"results": [self.handle(path[:-len("/batch")], query) for query in body["queries"]]}
+        key = (body.get("vehicle_model"), body.get("controller_model"))
+        return self.responses.get(key, {
+            "compatible": None,
+            "confidence": 0.5,
+            "reason": "stub: unknown",
+            "alternative": None,
+            "details": {"source": "stub"},
+        })
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
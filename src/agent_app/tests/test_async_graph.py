@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from agent_app.graph.build import build_graph
+from agent_app.agents.executor import diagnostic_agent
+
+CUSTOMER_INFO = {
+    "vehicle_model": "九号 E100",
+    "controller_model": "Lingbo-72182",
+    "battery_type": "lithium",
+    "voltage": 72.0,
+    "bms_current": 50.0,
+    "motor_power": 1200.0,
+}
+
+
+def test_ainvoke_matches_invoke():
+    graph = build_graph()
+    sync_config = {"configurable": {"thread_id": "sync"}}
+    async_config = {"configurable": {"thread_id": "async"}}
+    turn = {"messages": [("user", "我想调大电流")], "customer_info": CUSTOMER_INFO}
+
+    sync_result = graph.invoke(turn, config=sync_config)
+    async_result = asyncio.run(graph.ainvoke(turn, config=async_config))
+
+    assert sync_result["messages"][-1].content == async_result["messages"][-1].content
+    assert sync_result["current_step"] == async_result["current_step"] == 0
+
+
+def test_concurrent_sessions_do_not_serialize(monkeypatch):
+    delay = 0.3
+    sessions = 6
+    original = diagnostic_agent.mcp_client.aquery_controller_compatibility
+
+    async def slow_query(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(diagnostic_agent.mcp_client, "aquery_controller_compatibility", slow_query)
+    graph = build_graph()
+
+    async def run_session(i: int):
+        config = {"configurable": {"thread_id": f"session-{i}"}}
+        await graph.ainvoke({"messages": [("user", "我想调大电流")], "customer_info": CUSTOMER_INFO}, config=config)
+        # 回复第一步后进入 step_2_match，触发（慢速）MCP 调用
+        return await graph.ainvoke({"messages": [("user", "72V")], "customer_info": CUSTOMER_INFO}, config=config)
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_session(i) for i in range(sessions)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+
+    assert all(r["current_step"] == 2 for r in results)
+    # 串行执行需要 sessions * delay 秒
+    assert elapsed < sessions * delay / 2
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent_app.agents import rag
+from agent_app.graph.constants import NODE_RAG
+from agent_app.graph.routing import route_supervisor
+from agent_app.knowledge import retrieval
+from agent_app.knowledge.retrieval import BM25Index, set_retrieval_index, split_passages, tokenize
+from agent_app.runtime.cli import main
+
+DOCS = [
+    {"id": "a", "source": "manual.md", "text": "控制器不转，先检查霍尔传感器接线"},
+    {"id": "b", "source": "manual.md", "text": "电池电压偏低时需要先充电"},
+    {"id": "c", "source": "wiring.md", "text": "凌博 lingbo-72182 控制器刹车断电线接法"},
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(retrieval, "_numpy", lambda: None)
+    else:
+        pytest.importorskip("numpy")
+    return request.param
+
+
+def ids(hits):
+    return [hit["id"] for hit in hits]
+
+
+def test_tokenize_uses_bigrams_for_chinese_and_words_for_models():
+    assert tokenize("凌博 Lingbo-72182 控制器") == ["凌博", "lingbo", "72182", "控制", "制器"]
+    assert tokenize("ＡＢＣ，刹") == ["abc", "刹"]
+
+
+def test_split_passages_merges_short_paragraphs():
+    text = "第一段\n\n第二段\n\n" + "长" * 50
+    assert split_passages(text, max_chars=20) == ["第一段\n第二段", "长" * 50]
+
+
+def test_search_ranks_and_reopens_from_disk(tmp_path, backend):
+    index = BM25Index(tmp_path, reload_interval=0)
+    index.add(DOCS)
+    index.commit()
+    assert ids(index.search("控制器刹车接线"))[0] == "c"
+    assert index.search("完全无关") == []
+
+    reopened = BM25Index(tmp_path, reload_interval=0)
+    assert ids(reopened.search("电池电压")) == ["b"]
+    assert reopened.search("电池电压")[0]["source"] == "manual.md"
+    index.close()
+    reopened.close()
+
+
+def test_incremental_add_replace_delete_and_optimize(tmp_path, backend):
+    index = BM25Index(tmp_path, reload_interval=0)
+    index.add(DOCS)
+    index.commit()
+    reader = BM25Index(tmp_path, reload_interval=0)
+
+    index.add([{"id": "a", "source": "manual.md", "text": "仪表显示故障码"}])
+    index.delete(["c"])
+    index.commit()
+    assert index.stats()["segments"] == 2
+    assert len(index) == 2
+    assert ids(index.search("控制器")) == []
+    assert ids(index.search("故障码")) == ["a"]
+    # 读取方按 manifest 变化热加载
+    assert ids(reader.search("故障码")) == ["a"]
+
+    index.optimize()
+    stats = index.stats()
+    assert (stats["docs"], stats["segments"], stats["deleted"]) == (2, 1, 0)
+    assert ids(reader.search("故障码")) == ["a"]
+    assert sorted(index.doc_ids()) == ["a", "b"]
+    assert index.delete_source("manual.md") == 2
+    index.commit()
+    assert len(index) == 0
+    index.close()
+    reader.close()
+
+
+def test_opening_index_without_numpy_warns_once(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(retrieval, "_numpy", lambda: None)
+    monkeypatch.setattr(retrieval, "_slow_path_warned", False)
+    with caplog.at_level("WARNING", logger=retrieval.__name__):
+        BM25Index(tmp_path).close()
+        BM25Index(tmp_path).close()
+    assert len(caplog.records) == 1 and "numpy" in caplog.records[0].message
+
+
+def test_numpy_and_python_scores_match(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    index = BM25Index(tmp_path, reload_interval=0)
+    index.add(DOCS)
+    index.commit()
+    fast = index.search("控制器接线 电池")
+    monkeypatch.setattr(retrieval, "_numpy", lambda: None)
+    assert index.search("控制器接线 电池") == fast
+    index.close()
+
+
+@pytest.fixture
+def rag_index(tmp_path):
+    index = BM25Index(tmp_path, reload_interval=0)
+    index.add(DOCS)
+    index.commit()
+    set_retrieval_index(index)
+    yield index
+    set_retrieval_index(None)
+    index.close()
+
+
+def test_rag_prefix_routes_to_rag_node_without_touching_sop_state(rag_index):
+    state = {"messages": [HumanMessage(content="/ask 刹车断电怎么接")], "current_step": 3, "is_info_complete": True}
+    assert route_supervisor(state) == NODE_RAG
+    update = rag.rag_node(state)
+    assert set(update) == {"messages"}
+    assert "wiring.md" in update["messages"][0].content
+    assert route_supervisor({"messages": [HumanMessage(content="刹车断电怎么接")], "is_info_complete": True}) != NODE_RAG
+
+
+def test_cli_build_add_delete(tmp_path, capsys):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "brake.md").write_text("# 刹车\n\n刹车断电线接控制器高电平刹车", encoding="utf-8")
+    (docs / "battery.txt").write_text("电池欠压保护", encoding="utf-8")
+    index_dir = str(tmp_path / "index")
+
+    assert main(["index", "build", str(docs), "--index", index_dir]) == 0
+    assert json.loads(capsys.readouterr().out)["docs"] == 2
+
+    assert main(["index", "search", "刹车断电", "--index", index_dir]) == 0
+    hit = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert hit["title"] == "刹车" and hit["source"].endswith("brake.md")
+
+    assert main(["index", "delete", str(docs / "brake.md"), "--index", index_dir]) == 0
+    assert json.loads(capsys.readouterr().out)["docs"] == 1
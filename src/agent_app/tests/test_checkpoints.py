@@ -0,0 +1,210 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from agent_app.graph.build import build_graph
+from agent_app.graph.checkpoints import BoundedMemorySaver, KVCheckpointSaver, RedisCheckpointSaver, SqliteCheckpointSaver
+
+CUSTOMER_INFO = {
+    "vehicle_model": "九号 E100",
+    "controller_model": "Lingbo-72182",
+    "battery_type": "lithium",
+    "bms_current": 50.0,
+    "motor_power": 1200.0,
+}
+
+
+class FakeRedis:
+    """Redis 协议替身：实现 RedisCheckpointSaver 用到的命令，返回值与 redis-py 一致（bytes）"""
+
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.sets = defaultdict(set)
+        self.zsets = defaultdict(set)
+        self.hgetall_keys = []
+
+    @staticmethod
+    def _b(value):
+        return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+    def hset(self, key, field, value):
+        self.hashes[key][self._b(field)] = self._b(value)
+
+    def hsetnx(self, key, field, value):
+        self.hashes[key].setdefault(self._b(field), self._b(value))
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(self._b(field))
+
+    def hgetall(self, key):
+        self.hgetall_keys.append(key)
+        return dict(self.hashes.get(key, {}))
+
+    def hmget(self, key, fields):
+        return [self.hget(key, f) for f in fields]
+
+    def zadd(self, key, mapping):
+        self.zsets[key].update(self._b(m) for m in mapping)
+
+    def zrevrangebylex(self, key, max, min, start=None, num=None):
+        assert min == "-"
+        members = sorted(self.zsets.get(key, ()), reverse=True)
+        if max != "+":
+            bound, inclusive = self._b(max[1:]), max[0] == "["
+            members = [m for m in members if m < bound or (inclusive and m == bound)]
+        return members[start or 0:(start or 0) + num if num is not None else None]
+
+    def sadd(self, key, *members):
+        self.sets[key].update(self._b(m) for m in members)
+
+    def srem(self, key, *members):
+        self.sets[key].difference_update(self._b(m) for m in members)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.sets.pop(key, None)
+            self.zsets.pop(key, None)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+def run_two_turns(first_graph, second_graph, thread_id="t-1"):
+    config = {"configurable": {"thread_id": thread_id}}
+    first_graph.invoke({"messages": [("user", "我想调大电流")], "customer_info": CUSTOMER_INFO}, config=config)
+    return second_graph.invoke({"messages": [("user", "72V")], "customer_info": CUSTOMER_INFO}, config=config)
+
+
+def test_sqlite_session_shared_between_workers(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    # 两个独立的 saver 模拟两个 worker 进程
+    worker_a = build_graph(SqliteCheckpointSaver(path))
+    worker_b = build_graph(SqliteCheckpointSaver(path))
+
+    result = run_two_turns(worker_a, worker_b)
+
+    assert result["current_step"] == 2
+    assert len(result["messages"]) == 5
+
+
+def test_sqlite_async_and_history(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"))
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "t-async"}}
+
+    result = asyncio.run(graph.ainvoke({"messages": [("user", "你好")], "customer_info": CUSTOMER_INFO}, config=config))
+    assert result["current_step"] == 0
+
+    history = list(saver.list(config))
+    assert history
+    assert [c.config["configurable"]["checkpoint_id"] for c in history] == sorted(
+        (c.config["configurable"]["checkpoint_id"] for c in history), reverse=True
+    )
+    assert len(list(saver.list(config, limit=2))) == 2
+
+    saver.delete_thread("t-async")
+    assert saver.get_tuple(config) is None
+
+
+def test_redis_protocol_backend():
+    client = FakeRedis()
+    worker_a = build_graph(RedisCheckpointSaver(client))
+    worker_b = build_graph(RedisCheckpointSaver(client))
+
+    result = run_two_turns(worker_a, worker_b, thread_id="t-redis")
+    assert result["current_step"] == 2
+
+    saver = RedisCheckpointSaver(client)
+    config = {"configurable": {"thread_id": "t-redis"}}
+    saver.PAGE_SIZE = 2
+    history = [c.config["configurable"]["checkpoint_id"] for c in saver.list(config)]
+    assert len(history) > 2 and history == sorted(history, reverse=True)
+    assert [c.config["configurable"]["checkpoint_id"] for c in saver.list(config, before={"configurable": {"checkpoint_id": history[1]}})] == history[2:]
+    assert saver.get_tuple(config).config["configurable"]["checkpoint_id"] == history[0]
+    # 取最新 checkpoint 和历史分页都不下载整个 checkpoint hash
+    assert not any(key.startswith("agent_app:ckpt:") for key in client.hgetall_keys)
+
+    saver.delete_thread("t-redis")
+    assert saver.get_tuple({"configurable": {"thread_id": "t-redis"}}) is None
+    assert not any(key.startswith("agent_app:ckpt:t-redis") for key in client.hashes)
+    assert not any(key.startswith("agent_app:ids:t-redis") for key in client.zsets)
+
+
+def test_kv_saver_primitives_are_abstract():
+    with pytest.raises(TypeError):
+        KVCheckpointSaver()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def start_session(graph, thread_id):
+    config = {"configurable": {"thread_id": thread_id}}
+    graph.invoke({"messages": [("user", "我想调大电流")], "customer_info": CUSTOMER_INFO}, config=config)
+    return config
+
+
+def test_bounded_memory_lru_eviction():
+    saver = BoundedMemorySaver(max_sessions=2)
+    graph = build_graph(saver)
+
+    first = start_session(graph, "s-1")
+    start_session(graph, "s-2")
+    # 访问 s-1，使 s-2 成为最久未访问的会话
+    assert graph.get_state(first).values["current_step"] == 0
+    start_session(graph, "s-3")
+
+    stats = saver.stats()
+    assert stats["resident_sessions"] == 2
+    assert stats["evictions"] == 1
+    assert saver.get_tuple({"configurable": {"thread_id": "s-2"}}) is None
+    assert saver.get_tuple(first) is not None
+
+
+def test_bounded_memory_ttl_and_bytes():
+    clock = FakeClock()
+    saver = BoundedMemorySaver(ttl_seconds=60, clock=clock)
+    graph = build_graph(saver)
+
+    config = start_session(graph, "s-ttl")
+    assert saver.stats()["resident_bytes"] > 0
+
+    clock.now += 61
+    assert saver.get_tuple(config) is None
+    stats = saver.stats()
+    assert stats["expirations"] == 1
+    assert stats["resident_sessions"] == 0
+    assert stats["resident_bytes"] == 0
+
+    # 字节上限：单个会话的大小足以把更早的会话挤出
+    one_session = BoundedMemorySaver()
+    start_session(build_graph(one_session), "probe")
+    limit = one_session.stats()["resident_bytes"] + 1
+    capped = BoundedMemorySaver(max_bytes=limit)
+    capped_graph = build_graph(capped)
+    start_session(capped_graph, "b-1")
+    start_session(capped_graph, "b-2")
+    assert capped.stats()["resident_sessions"] == 1
+    assert capped.stats()["evictions"] == 1
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent_app.agents.base import LLMGateway, set_llm_gateway
+from agent_app.agents.checks import AMBIGUOUS, FAIL, PASS, CheckEngine, extract_number
+from agent_app.agents.executor import DiagnosticAgent, format_fail_message
+from agent_app.agents.llm_cache import set_llm_cache
+from agent_app.agents.semantic_cache import SemanticCache, set_semantic_cache
+
+
+@pytest.fixture
+def agent():
+    return DiagnosticAgent()
+
+
+@pytest.fixture
+def fake_llm():
+    model = FakeListChatModel(responses=["FAIL"])
+    set_llm_gateway(LLMGateway(model))
+    set_llm_cache(None)
+    yield model
+    set_llm_gateway(None)
+
+
+def human(text, step, **info):
+    return {"messages": [AIMessage("q"), HumanMessage(text)], "current_step": step, "customer_info": info}
+
+
+def test_extract_number():
+    assert extract_number("显示７１.５Ｖ") == 71.5
+    assert extract_number("72V电池，表上显示65伏") == 65
+    assert extract_number("表上显示 65") == 65
+    assert extract_number("72V电池显示70") == 70
+    assert extract_number("72V电池70") is None
+    assert extract_number("不知道") is None
+
+
+@pytest.mark.parametrize("reply, info, outcome", [
+    ("72V", {}, PASS),
+    ("显示 65V", {}, FAIL),
+    ("表坏了看不到", {}, AMBIGUOUS),
+    ("50", {"battery_voltage": 48}, PASS),
+    ("72", {"battery_voltage": 48}, FAIL),
+    ("72V电池显示70", {}, PASS),
+    ("72V电池显示50", {}, FAIL),
+    ("72V电池70", {}, AMBIGUOUS),
+])
+def test_range_check(agent, reply, info, outcome):
+    assert agent.checks.evaluate(agent.sop.steps[0], reply, {"customer_info": info}).outcome == outcome
+
+
+@pytest.mark.parametrize("reply, outcome", [
+    ("是的，插紧了", PASS),
+    ("插好了，没问题", PASS),
+    ("没插紧", FAIL),
+    ("不是", FAIL),
+    ("插紧了但还是不转", AMBIGUOUS),
+    ("嗯", AMBIGUOUS),
+    ("不知道", AMBIGUOUS),
+    ("不太清楚", AMBIGUOUS),
+    ("不确定插没插紧", AMBIGUOUS),
+    ("没有", FAIL),
+])
+def test_expected_answer(agent, reply, outcome):
+    assert agent.checks.evaluate(agent.sop.steps[2], reply, {}).outcome == outcome
+
+
+def test_failed_range_check_ends_with_fix_message(agent):
+    result = agent.invoke(human("显示65V", 0))
+    assert result["diagnostic_result"] == "failed"
+    assert "显示为65V" in result["messages"][0][1]
+
+
+def test_llm_failure_without_value_drops_value_clause(agent, fake_llm):
+    result = agent.invoke(human("表坏了看不到", 0))
+    message = result["messages"][0][1]
+    assert result["diagnostic_result"] == "failed"
+    assert message.startswith("检测到电压异常。请检查")
+    assert "None" not in message and "{value}" not in message
+
+
+@pytest.mark.parametrize("template, value, expected", [
+    ("读数{value}V偏低。请检查插头。", 65.0, "读数65V偏低。请检查插头。"),
+    ("读数{value}V偏低。请检查插头。", None, "请检查插头。"),
+    ("读数{value}V偏低", None, None),
+    ("请检查插头", None, "请检查插头"),
+])
+def test_format_fail_message(template, value, expected):
+    assert format_fail_message(template, value) == expected
+
+
+def test_failed_confirmation_enters_sub_flow(agent):
+    result = agent.invoke(human("还没做过", 3))
+    assert result["current_step"] == agent.sop.sub_flows["learning_fix"]
+    assert result["messages"][0][1] == agent.sop.steps[5].prompt
+
+
+def test_only_ambiguous_replies_reach_the_llm(agent, fake_llm):
+    agent.invoke(human("插紧了", 2))
+    assert agent.checks.stats()["llm_calls"] == 0
+
+    result = asyncio.run(agent.ainvoke(human("插紧了但还是不转", 2)))
+    assert result["diagnostic_result"] == "failed"
+    stats = agent.checks.stats()
+    assert stats["turns"] == 2 and stats["rule_settled"] == 1
+    assert stats["llm_calls"] == stats["llm_settled"] == 1
+    assert stats["rule_settled_ratio"] == 0.5
+
+
+def test_unresolved_reply_asks_again():
+    engine = CheckEngine(llm_fallback=False)
+    agent = DiagnosticAgent()
+    agent.checks = engine
+    result = agent.invoke(human("嗯", 2))
+    assert result["current_step"] == 2
+    assert result["messages"][0][1].endswith(agent.sop.steps[2].prompt)
+    assert engine.stats()["outcomes"][AMBIGUOUS] == 1
+
+
+def test_llm_verdicts_do_not_use_the_semantic_cache(agent):
+    semantic = SemanticCache()
+    set_llm_gateway(LLMGateway(FakeListChatModel(responses=["PASS", "FAIL"])))
+    set_llm_cache(None)
+    set_semantic_cache(semantic)
+    try:
+        # 字面相似、含义不同的两条模糊回复各自交给 LLM 判定
+        first = agent.invoke(human("插紧了但还是不转，故障灯一直亮着", 2))
+        second = agent.invoke(human("插紧了但还是不转，故障灯一直灭着", 2))
+    finally:
+        set_llm_gateway(None)
+        set_semantic_cache(None)
+    assert first["current_step"] == 3
+    assert second["diagnostic_result"] == "failed"
+    assert semantic.stats()["lookups"] == 0
@@ -0,0 +1,103 @@
+import time
+
+from agent_app.tests.mcp_stub import MCPStubServer
+from agent_app.tools.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from agent_app.tools.mcp_client import MCPClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_on_failure_rate_and_recovers_through_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window_size=10, min_calls=4, failure_rate_threshold=0.5, open_seconds=30, clock=clock)
+
+    for ok in (True, False, True):
+        assert breaker.allow()
+        breaker.record_success() if ok else breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 31
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # 探测请求进行中，其余调用仍然被拒绝
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["times_opened"] == 2
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_released_probe_lets_next_call_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=1, clock=clock)
+    breaker.allow()
+    breaker.record_failure()
+    clock.now = 2
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_open_circuit_skips_backend_during_outage():
+    clock = FakeClock()
+    breaker = CircuitBreaker("mcp", min_calls=3, failure_rate_threshold=1.0, open_seconds=30, clock=clock)
+    with MCPStubServer(delay=0.3) as stub:
+        client = MCPClient(stub.url, read_timeout=0.1, breaker=breaker)
+        for i in range(3):
+            client.query_controller_compatibility("九号 E100", f"X-{i}")
+        assert breaker.state == OPEN
+
+        started = time.perf_counter()
+        result = client.query_controller_compatibility("九号 E100", "Lingbo-72182")
+        assert time.perf_counter() - started < 0.05
+        assert result["compatible"] is True
+        assert stub.requests == 3
+
+        # 服务恢复，冷却结束后的探测请求关闭熔断器
+        stub.delay = 0
+        clock.now = 31
+        result = client.query_controller_compatibility("九号 E100", "X-9")
+        client.close()
+
+    assert result["reason"] == "stub: unknown"
+    assert breaker.state == CLOSED
+    stats = client.stats()
+    assert stats["backend_calls"] == 4
+    assert stats["fallbacks"] == 4
+    assert stats["breaker"]["rejected"] == 1
+
+
+def test_dropped_connections_and_5xx_count_as_failures_but_4xx_does_not():
+    breaker = CircuitBreaker(min_calls=2, failure_rate_threshold=0.5)
+    with MCPStubServer() as stub:
+        client = MCPClient(stub.url, breaker=breaker)
+        stub.fail_status = 404
+        client.query_controller_compatibility("九号 E100", "A")
+        client.query_controller_compatibility("九号 E100", "B")
+        assert breaker.state == CLOSED
+
+        stub.fail_status = 0
+        stub.drop = True
+        client.query_controller_compatibility("九号 E100", "C")
+        stub.drop = False
+        stub.fail_status = 503
+        client.query_controller_compatibility("九号 E100", "D")
+        client.close()
+
+    assert breaker.state == OPEN
@@ -0,0 +1,111 @@
+import csv
+import json
+import sys
+
+import pytest
+
+from agent_app.runtime.cli import _calculate, main, parse_records, run_audit
+
+FIELDS = [
+    "vehicle_id", "battery_type", "voltage", "capacity_ah", "bms_current", "motor_power_rated",
+    "motor_type", "wire_gauge", "breaker_rating", "controller_max_current", "configured_current",
+]
+ROWS = [
+    # 短板在电机：1000 * 3.5 / 72 = 48.6A
+    ["V1", "lead_acid", "72", "30", "", "1000", "standard", "6", "80", "150", "60"],
+    ["V2", "lithium", "72", "", "40", "3000", "performance", "10", "100", "150", "35"],
+    ["V3", "lithium", "72", "", "", "1000", "standard", "6", "80", "150", "40"],
+    ["V4", "lithium", "60", "", "80", "1500", "standard", "4", "63", "120", ""],
+    ["V5", "lead_acid", "48", "20", "", "800", "standard", "2.5", "40", "60", "55"],
+]
+
+
+def write_csv(path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(ROWS)
+
+
+def test_audit_streams_chunks_across_processes(tmp_path):
+    source = tmp_path / "vehicles.csv"
+    output = tmp_path / "results.csv"
+    report_path = tmp_path / "report.json"
+    write_csv(source)
+
+    report = run_audit(
+        str(source), output_path=str(output), report_path=str(report_path),
+        chunk_size=2, workers=2, progress_interval=-1,
+    )
+
+    with open(output, encoding="utf-8") as f:
+        results = list(csv.DictReader(f))
+    assert [r["vehicle_id"] for r in results] == ["V1", "V2", "V3", "V4", "V5"]
+    assert results[0]["safe_bus_current"] == "48.6"
+    assert results[0]["bottleneck"] == "motor"
+    assert results[2]["valid"] == "False"
+    assert results[2]["errors"] == "missing_bms_current"
+
+    assert report == json.loads(report_path.read_text(encoding="utf-8"))
+    assert report["records"] == 5
+    assert report["invalid"] == 1
+    assert report["errors"] == {"missing_bms_current": 1}
+    assert sum(report["bottleneck_histogram"].values()) == 4
+    assert report["over_limit_count"] == 2
+    assert [v["vehicle_id"] for v in report["over_limit"]] == ["V1", "V5"]
+
+
+def test_audit_command_reads_jsonl(tmp_path, capsys):
+    source = tmp_path / "vehicles.jsonl"
+    with open(source, "w", encoding="utf-8") as f:
+        for row in ROWS:
+            record = {k: v for k, v in zip(FIELDS, row) if v != ""}
+            f.write(json.dumps(record) + "\n")
+
+    assert main(["audit", str(source), "-j", "1", "--chunk-size", "3", "-o", str(tmp_path / "out.jsonl")]) == 0
+
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["valid"] == 4
+    assert summary["over_limit_count"] == 2
+    lines = (tmp_path / "out.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["index"] for line in lines] == [0, 1, 2, 3, 4]
+
+
+def test_unparseable_lines_are_reported_per_row(tmp_path):
+    source = tmp_path / "vehicles.jsonl"
+    good = {k: v for k, v in zip(FIELDS, ROWS[0]) if v != ""}
+    source.write_text("\n".join([json.dumps(good), "{broken", "[1, 2]", json.dumps(good)]) + "\n", encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+
+    report = run_audit(str(source), output_path=str(output), chunk_size=3, workers=2, progress_interval=-1)
+
+    rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [r["errors"] for r in rows] == ["", "invalid_json", "invalid_json", ""]
+    assert [r["index"] for r in rows] == [0, 1, 2, 3]
+    assert report["valid"] == 2 and report["errors"] == {"invalid_json": 2}
+
+
+def test_csv_quoted_newlines_and_extra_columns(tmp_path):
+    source = tmp_path / "vehicles.csv"
+    write_csv(source)
+    with open(source, "a", encoding="utf-8", newline="") as f:
+        f.write('"V6\n备注",lead_acid,72,30,,1000,standard,6,80,150,60\n')
+        f.write("V7,lead_acid,72,30,,1000,standard,6,80,150,60,多余的列\n")
+
+    report = run_audit(str(source), output_path=str(tmp_path / "out.csv"), workers=1, progress_interval=-1)
+
+    assert report["records"] == 7
+    assert report["valid"] == 5
+    assert report["errors"] == {"missing_bms_current": 1, "invalid_csv_row": 1}
+
+
+def test_scalar_and_numpy_paths_report_the_same_errors(monkeypatch):
+    pytest.importorskip("numpy")
+    records, _ = parse_records("csv", FIELDS, [",".join(row) for row in ROWS])
+    records += [{}, {"battery_type": "lead_acid", "voltage": "0"}, {"battery_type": "nmc", "motor_type": "x"}]
+    _, _, vectorized = _calculate(records)
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    _, _, scalar = _calculate(records)
+    assert scalar == vectorized
+    assert vectorized[2] == "missing_bms_current"
+    assert "zero_voltage" in vectorized[-2]
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+from agent_app.knowledge.compatibility import CompatibilityTable, normalize_key
+from agent_app.tools.mcp_client import MCPClient
+
+
+def write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def row(vehicle, controller, brand="Lingbo", compatible=True, reason="ok"):
+    return {
+        "vehicle_model": vehicle,
+        "controller_model": controller,
+        "controller_brand": brand,
+        "compatible": compatible,
+        "confidence": 0.9,
+        "reason": reason,
+        "alternative": None,
+        "details": {},
+    }
+
+
+def bump_mtime(path, seconds=10):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def test_normalized_lookup_matches_spacing_and_case_variants():
+    table = CompatibilityTable()
+    assert normalize_key("九号E100") == normalize_key("九号 E100") == normalize_key("九号　ｅ100")
+    for vehicle, controller in [("九号E100", "lingbo 72182"), (" 九号  e100 ", "LINGBO_72182")]:
+        record = table.lookup(vehicle, controller)
+        assert record["compatible"] is True
+        assert record["controller_model"] == "Lingbo-72182"
+    assert table.lookup("九号 E100", "Lingbo-99999") is None
+
+
+def test_prefix_and_brand_search(tmp_path):
+    path = tmp_path / "compat.jsonl"
+    write_jsonl(path, [
+        row("九号 E100", "Lingbo-72182"),
+        row("九号 E200", "Lingbo-72190"),
+        row("九号 E200", "Leiting-60150", brand="Leiting"),
+        row("小牛 N1S", "Lingbo-72182"),
+    ])
+    table = CompatibilityTable(path)
+
+    assert [r["vehicle_model"] for r in table.search("九号")] == ["九号 E100", "九号 E200", "九号 E200"]
+    assert [r["controller_model"] for r in table.search("九号", "lingbo")] == ["Lingbo-72182", "Lingbo-72190"]
+    assert [r["vehicle_model"] for r in table.search(controller_prefix="Lingbo-72182")] == ["九号 E100", "小牛 N1S"]
+    assert [r["controller_model"] for r in table.search(brand="leiting")] == ["Leiting-60150"]
+    assert [r["vehicle_model"] for r in table.search("小牛", brand="Lingbo")] == ["小牛 N1S"]
+    assert [r["vehicle_model"] for r in table.search(controller_prefix="lingbo-7219", brand="Lingbo")] == ["九号 E200"]
+    assert table.search("九号", brand="Zhike") == []
+    assert len(table.search("九号", limit=1)) == 1
+
+
+def test_csv_source(tmp_path):
+    path = tmp_path / "compat.csv"
+    path.write_text(
+        "vehicle_model,controller_model,controller_brand,compatible,confidence,reason,alternative,details\n"
+        '雅迪 DE3,Lingbo-48100,Lingbo,false,0.8,电压不符,Lingbo-48120,"{""voltage_match"": false}"\n',
+        encoding="utf-8",
+    )
+    record = CompatibilityTable(path).lookup("雅迪DE3", "lingbo-48100")
+    assert record["compatible"] is False
+    assert record["alternative"] == "Lingbo-48120"
+    assert record["details"] == {"voltage_match": False}
+
+
+def test_hot_reload_swaps_index_and_keeps_old_data_on_bad_file(tmp_path):
+    path = tmp_path / "compat.jsonl"
+    write_jsonl(path, [row("九号 E100", "A-1", reason="v1")])
+    table = CompatibilityTable(path, reload_interval=0)
+    assert table.lookup("九号 E100", "A-1")["reason"] == "v1"
+
+    write_jsonl(path, [row("九号 E100", "A-1", reason="v2"), row("九号 E100", "A-2")])
+    bump_mtime(path)
+    assert table.lookup("九号 E100", "A-1")["reason"] == "v2"
+    assert len(table) == 2
+
+    path.write_text("{not json\n", encoding="utf-8")
+    bump_mtime(path, 20)
+    assert table.lookup("九号 E100", "A-1")["reason"] == "v2"
+    assert table.stats()["reload_errors"] == 1
+
+
+def test_lookup_stays_sub_millisecond_on_large_table(tmp_path):
+    path = tmp_path / "compat.jsonl"
+    write_jsonl(path, (row(f"车型 {i // 50}", f"Ctrl-{i}") for i in range(50_000)))
+    table = CompatibilityTable(path, reload_interval=60)
+    assert len(table) == 50_000
+
+    started = time.perf_counter()
+    for i in range(0, 50_000, 50):
+        assert table.lookup(f"车型{i // 50}", f"ctrl {i}") is not None
+        table.search(f"车型 {i // 50}", "ctrl", limit=10)
+    per_call_ms = (time.perf_counter() - started) * 1000 / 1000
+    assert per_call_ms < 1.0
+
+
+def test_offline_client_uses_table():
+    result = MCPClient().query_controller_compatibility("九号E100", "lingbo 72180")
+    assert result["compatible"] is False
+    assert result["alternative"] == "Lingbo-72182"
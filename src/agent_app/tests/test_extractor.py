@@ -0,0 +1,84 @@
+from langchain_core.messages import HumanMessage
+
+from agent_app.agents.extractor import SlotExtractor, extractor_node
+from agent_app.graph.build import build_graph
+from agent_app.graph.checkpoints import MemorySaver
+from agent_app.graph.state import CLEAR_FIELD, merge_customer_info, structured_input
+
+
+def slots(text):
+    return {slot.field: slot.value for slot in SlotExtractor().extract(text)}
+
+
+def test_extracts_numbers_types_and_models():
+    assert slots("72V 锂电 保护板50A 九号E100，电机 1200W，4平方线，空开 63安，20Ah") == {
+        "battery_voltage": 72.0,
+        "battery_type": "lithium",
+        "bms_current": 50.0,
+        "vehicle_model": "九号 E100",
+        "motor_power": 1200.0,
+        "wire_gauge": 4.0,
+        "breaker_rating": 63.0,
+        "battery_capacity": 20.0,
+    }
+
+
+def test_controller_brand_is_inferred():
+    assert slots("控制器是凌博72182")["controller_model"] == "Lingbo-72182"
+    assert slots("用的 lingbo 72182")["controller_brand"] == "Lingbo"
+    # 未收录的型号按"品牌 + 数字"识别
+    assert slots("雷霆 60199 的控制器") == {"controller_model": "Leiting-60199", "controller_brand": "Leiting"}
+    # 没有上下文关键词的电流、超出范围的数值不抽取
+    assert slots("控制器 80A，电压 3V") == {}
+
+
+def test_battery_type_takes_last_unnegated_mention():
+    assert slots("不是锂电是铅酸")["battery_type"] == "lead_acid"
+    assert slots("以前是锂电现在换了铅酸")["battery_type"] == "lead_acid"
+    assert slots("铅酸换成了锂电")["battery_type"] == "lithium"
+    assert "battery_type" not in slots("没用锂电")
+
+
+def test_displayed_voltage_is_not_the_battery_voltage():
+    assert slots("48v电池，电压显示只有30v") == {"battery_voltage": 48.0, "voltage_display": 30.0}
+    assert slots("仪表显示 65V") == {"voltage_display": 65.0}
+
+
+def test_structured_values_are_not_overwritten():
+    state = {
+        "messages": [HumanMessage("不对，是60V的铅酸，电机800W")],
+        "customer_info": {"battery_voltage": 72.0, "motor_power": 1000.0, "battery_type": "lithium"},
+        "customer_info_sources": {"battery_voltage": {"source": "text", "span": "72v"}},
+    }
+    update = extractor_node(state)
+    # 文本抽取的值可以被更正，结构化输入的值保留
+    assert update["customer_info"] == {"battery_voltage": 60.0}
+    assert update["customer_info_sources"]["battery_voltage"] == {"source": "text", "span": "60v"}
+    assert merge_customer_info(state["customer_info"], {"motor_power": None}) == state["customer_info"]
+
+
+def test_free_text_skips_clarification_round():
+    graph = build_graph(MemorySaver())
+    config = {"configurable": {"thread_id": "extract-1"}}
+    result = graph.invoke({"messages": [("user", "九号E100 凌博72182 72V 锂电 保护板50A 电机1200W")]}, config=config)
+    assert result["is_info_complete"] is True
+    assert result["customer_info"]["controller_brand"] == "Lingbo"
+    assert result["customer_info_sources"]["bms_current"]["source"] == "text"
+
+
+def test_form_value_survives_later_text():
+    graph = build_graph(MemorySaver())
+    config = {"configurable": {"thread_id": "extract-2"}}
+    # 文本 -> 表单 -> 文本：表单覆盖的字段改为结构化来源，之后的文本不再覆盖
+    graph.invoke({"messages": [("user", "我的车是72V的")]}, config=config)
+    result = graph.invoke({"messages": [("user", "表单填好了")], **structured_input({"battery_voltage": 60.0})}, config=config)
+    assert result["customer_info_sources"]["battery_voltage"] == {"source": "structured"}
+    result = graph.invoke({"messages": [("user", "电池是48V的")]}, config=config)
+    assert result["customer_info"]["battery_voltage"] == 60.0
+
+    # 结构化输入可以显式清空字段，清空后文本抽取重新生效
+    result = graph.invoke({"messages": [("user", "电压填错了")], **structured_input({"battery_voltage": CLEAR_FIELD})}, config=config)
+    assert "battery_voltage" not in result["customer_info"]
+    assert "battery_voltage" not in result["customer_info_sources"]
+    result = graph.invoke({"messages": [("user", "是48V的")]}, config=config)
+    assert result["customer_info_sources"]["battery_voltage"]["source"] == "text"
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from agent_app.agents.validator import FastSpecs, SafetyCalculator, VehicleSpecs
+
+
+def random_kwargs(rng):
+    kwargs = {
+        "battery_type": rng.choice(["lead_acid", "lithium", "nickel"]),
+        "voltage": rng.choice([48, 60, 72.0]),
+        "motor_power_rated": rng.choice([800, 1000.0, 2000]),
+        "motor_type": rng.choice(["standard", "performance", "hub"]),
+        "wire_gauge": rng.choice([4, 6.0]),
+        "breaker_rating": rng.choice([63, 80.0]),
+        "controller_max_current": rng.choice([100, 150.5]),
+    }
+    if rng.random() < 0.8:
+        kwargs["capacity_ah"] = rng.choice([0, 20, 32.0])
+    if rng.random() < 0.8:
+        kwargs["bms_current"] = rng.choice([0, 40, 60.5])
+    return kwargs
+
+
+def test_fast_validator_agrees_with_pydantic_model():
+    rng = random.Random(11)
+    for _ in range(2000):
+        kwargs = random_kwargs(rng)
+        try:
+            model = VehicleSpecs(**kwargs)
+        except ValidationError:
+            with pytest.raises(ValueError):
+                FastSpecs.create(**kwargs)
+            continue
+        fast = FastSpecs.create(**kwargs)
+        assert fast == model.to_fast()
+        assert fast.to_model() == model
+        assert SafetyCalculator.calculate_fast(fast) == SafetyCalculator.calculate_max_bus_current(model)
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"wire_gauge": None}, "缺少必填字段: wire_gauge"),
+    ({"voltage": "72V"}, "字段 voltage 不是数值"),
+    ({"bms_current": []}, "字段 bms_current 不是数值"),
+])
+def test_invalid_numbers_raise_value_error_naming_the_field(kwargs, message):
+    base = dict(battery_type="lithium", voltage=72, motor_power_rated=1000, wire_gauge=6,
+                breaker_rating=80, controller_max_current=150, bms_current=50)
+    with pytest.raises(ValueError, match=message):
+        FastSpecs.create(**{**base, **kwargs})
+
+
+def test_calculate_fast_memoizes_and_returns_independent_copies():
+    specs = FastSpecs.create("lithium", 72, 1000, 6, 80, 150, bms_current=50)
+    hits = SafetyCalculator.cache_info().hits
+    first = SafetyCalculator.calculate_fast(specs)
+    first["details"]["motor"] = 0
+    second = SafetyCalculator.calculate_fast(FastSpecs.create("lithium", 72, 1000, 6, 80, 150, bms_current=50))
+
+    assert SafetyCalculator.cache_info().hits == hits + 1
+    assert second["details"]["motor"] == pytest.approx(1000 * 3.5 / 72)
+    with pytest.raises(AttributeError):
+        specs.voltage = 60
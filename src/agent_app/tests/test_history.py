@@ -0,0 +1,38 @@
+from agent_app.graph.build import build_graph
+from agent_app.graph.checkpoints import BoundedMemorySaver
+from agent_app.settings import settings
+
+CUSTOMER_INFO = {
+    "vehicle_model": "九号 E100",
+    "controller_model": "Lingbo-72182",
+    "battery_type": "lithium",
+    "bms_current": 50.0,
+    "motor_power": 1200.0,
+}
+
+
+def test_history_window_bounds_state(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 2)
+    monkeypatch.setattr(settings, "HISTORY_SUMMARY_MAX_CHARS", 120)
+    saver = BoundedMemorySaver()
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "long"}}
+
+    sizes = []
+    for i in range(8):
+        result = graph.invoke(
+            {"messages": [("user", f"第{i}轮回复：是的，已经插紧")], "customer_info": CUSTOMER_INFO},
+            config=config,
+        )
+        sizes.append(len(result["messages"]))
+
+    human = [m for m in result["messages"] if m.type == "human"]
+    assert len(human) == 2
+    assert human[-1].content.startswith("第7轮")
+    # 达到窗口后消息数不再增长（每轮最多一问一答）
+    assert max(sizes[2:]) <= 4
+
+    summary = result["history_summary"]
+    assert 0 < len(summary) <= 120
+    assert summary.splitlines()[-1].startswith("用户")
+    assert "第5轮" in summary
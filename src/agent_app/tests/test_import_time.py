@@ -0,0 +1,53 @@
+"""
+导入耗时预算测试
+
+用 `python -X importtime` 在干净的子进程中导入服务入口，检查：
+- 导入时不加载 LLM 客户端等重量级依赖，也不要求 OPENAI_API_KEY
+- 总导入耗时不超过预算（AGENT_APP_IMPORT_BUDGET_MS，默认 3000ms）
+
+失败时输出耗时最多的模块，便于定位回归。
+"""
+import os
+import subprocess
+import sys
+
+# 这些模块只应在首次调用 LLM 时才被导入
+LAZY_MODULES = {"langchain_openai", "openai"}
+ENTRY_MODULE = "agent_app.runtime.server"
+
+
+def import_times(module: str):
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        times[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return times
+
+
+def format_top(times, n=10):
+    top = sorted(times.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+    return "\n".join(f"{self_us / 1000:8.1f}ms self  {cum_us / 1000:8.1f}ms cumulative  {name}" for name, (self_us, cum_us) in top)
+
+
+def test_entry_import_is_lazy_and_within_budget():
+    times = import_times(ENTRY_MODULE)
+
+    eager = sorted(LAZY_MODULES & set(times))
+    assert not eager, f"导入 {ENTRY_MODULE} 时加载了应延迟加载的模块: {eager}\n{format_top(times)}"
+
+    budget_ms = float(os.environ.get("AGENT_APP_IMPORT_BUDGET_MS", "3000"))
+    total_ms = times[ENTRY_MODULE][1] / 1000
+    assert total_ms <= budget_ms, f"导入耗时 {total_ms:.0f}ms 超出预算 {budget_ms:.0f}ms\n{format_top(times)}"
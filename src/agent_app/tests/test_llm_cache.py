@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from agent_app.agents.base import BaseAgent, LLMGateway, set_llm_gateway
+from agent_app.agents.llm_cache import LLMResponseCache, make_cache_key, set_llm_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_normalization():
+    a = make_cache_key("gpt", [("user", "  电压　72V\n是多少 ")])
+    b = make_cache_key("gpt", [{"role": "human", "content": "电压 72V 是多少"}])
+    assert a == b
+    assert a != make_cache_key("gpt-mini", [("user", "电压 72V 是多少")])
+    assert a != make_cache_key("gpt", [("user", "电压 72V 是多少")], {"stop": ["\n"]})
+
+
+def test_two_tiers_ttl_and_size(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMResponseCache(path, max_memory_entries=2, max_disk_entries=3, ttl_seconds=60, clock=clock)
+    for i in range(5):
+        cache.set(f"k{i}", f"v{i}")
+        clock.now += 1
+
+    # 内存只保留最近两条，其余从磁盘命中
+    assert cache.get("k4") == "v4"
+    assert cache.get("k2") == "v2"
+    assert cache.get("k0") is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["disk_entries"] == 3
+
+    # 新实例（另一个进程）共享磁盘层
+    other = LLMResponseCache(path, ttl_seconds=60, clock=clock)
+    assert other.get("k3") == "v3"
+
+    clock.now += 120
+    assert other.get("k3") is None
+    assert other.stats()["expired"] == 1
+
+
+class CountingAgent(BaseAgent):
+    pass
+
+
+class UncachedAgent(BaseAgent):
+    use_llm_cache = False
+
+
+def test_agents_switch_cache_per_agent():
+    gateway = LLMGateway(FakeListChatModel(responses=["PASS"]))
+    set_llm_gateway(gateway)
+    set_llm_cache(LLMResponseCache())
+    try:
+        prompt = [("user", "用户回复：是的，已经插紧")]
+        assert CountingAgent().call_llm(prompt).content == "PASS"
+        assert CountingAgent().call_llm(prompt).content == "PASS"
+        assert gateway.stats()["calls"] == 1
+        assert gateway.stats()["cache_hits"] == 1
+
+        UncachedAgent().call_llm(prompt)
+        assert gateway.stats()["calls"] == 2
+    finally:
+        set_llm_gateway(None)
+        set_llm_cache(None)
+
+
+def test_async_path_keeps_disk_io_off_the_event_loop(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    loop_thread = threading.get_ident()
+    disk_threads = []
+    for name in ("get_disk", "set_disk"):
+        original = getattr(cache, name)
+
+        def traced(*args, _original=original):
+            disk_threads.append(threading.get_ident())
+            return _original(*args)
+
+        setattr(cache, name, traced)
+
+    gateway = LLMGateway(FakeListChatModel(responses=["答案"]))
+    messages = [("human", "电流能调大吗")]
+    first = asyncio.run(gateway.ainvoke(messages, cache=cache))
+    second = asyncio.run(gateway.ainvoke(messages, cache=cache))
+    assert first.content == second.content == "答案"
+    assert second.response_metadata["cache_hit"]
+    # 未命中时查一次磁盘、写一次磁盘；第二次由内存命中，不再访问磁盘
+    assert len(disk_threads) == 2 and loop_thread not in disk_threads
+    assert cache.stats()["memory_hits"] == 1 and gateway.stats()["calls"] == 1
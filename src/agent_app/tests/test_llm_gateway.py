@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+
+from agent_app.agents.base import BaseAgent, LLMGateway, get_llm_gateway, set_llm_gateway
+
+
+class SlowFakeModel:
+    """记录最大并发数的假模型"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _enter(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self.lock:
+            self.active -= 1
+
+    def invoke(self, messages, **kwargs):
+        self._enter()
+        time.sleep(self.delay)
+        self._exit()
+        return AIMessage(content="ok", usage_metadata={"input_tokens": 3, "output_tokens": 1, "total_tokens": 4})
+
+    async def ainvoke(self, messages, **kwargs):
+        self._enter()
+        await asyncio.sleep(self.delay)
+        self._exit()
+        return AIMessage(content="ok", usage_metadata={"input_tokens": 3, "output_tokens": 1, "total_tokens": 4})
+
+
+def test_agents_share_gateway_with_fake_backend():
+    gateway = LLMGateway(FakeListChatModel(responses=["PASS"]))
+    set_llm_gateway(gateway)
+    try:
+        assert BaseAgent().llm is BaseAgent().llm is get_llm_gateway()
+        assert BaseAgent().llm.invoke([("user", "你好")]).content == "PASS"
+        assert asyncio.run(BaseAgent().llm.ainvoke([("user", "你好")])).content == "PASS"
+        assert gateway.stats()["calls"] == 2
+    finally:
+        set_llm_gateway(None)
+
+
+def test_concurrency_limit_and_accounting():
+    model = SlowFakeModel()
+    gateway = LLMGateway(model, max_concurrency=2)
+
+    threads = [threading.Thread(target=gateway.invoke, args=([("user", "q")],)) for _ in range(4)]
+    for t in threads:
+        t.start()
+
+    async def burst():
+        await asyncio.gather(*(gateway.ainvoke([("user", "q")]) for _ in range(4)))
+
+    asyncio.run(burst())
+    for t in threads:
+        t.join()
+
+    assert model.peak <= 2
+    stats = gateway.stats()
+    assert stats["calls"] == 8
+    assert stats["in_flight"] == 0
+    assert stats["input_tokens"] == 24
+    assert stats["output_tokens"] == 8
+    assert stats["avg_latency_ms"] >= 50
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    model = SlowFakeModel(delay=0.05)
+    gateway = LLMGateway(model, max_concurrency=1)
+
+    async def scenario():
+        running = asyncio.create_task(gateway.ainvoke([("user", "q")]))
+        await asyncio.sleep(0.01)
+        # 排队中的调用被取消（例如 SSE 客户端断开）
+        waiting = [asyncio.create_task(gateway.ainvoke([("user", "q")])) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for task in waiting:
+            task.cancel()
+        await running
+        await asyncio.gather(*waiting, return_exceptions=True)
+        # 空位全部归还，后续调用不会卡住
+        await asyncio.wait_for(asyncio.gather(*(gateway.ainvoke([("user", "q")]) for _ in range(3))), timeout=2)
+
+    asyncio.run(scenario())
+    assert gateway._slots.used == 0
+    assert gateway.stats()["calls"] == 4
+    assert model.peak == 1
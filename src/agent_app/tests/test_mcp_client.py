@@ -0,0 +1,184 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_app.tests.mcp_stub import MCPStubServer
+from agent_app.settings import settings
+from agent_app.tools import mcp_client
+from agent_app.tools.mcp_client import CompatibilityCache, MCPClient, get_mcp_client
+
+COMPATIBLE = {
+    "compatible": True,
+    "confidence": 0.99,
+    "reason": "stub: compatible",
+    "alternative": None,
+    "details": {"source": "stub"},
+}
+
+
+def test_sync_queries_reuse_one_connection():
+    with MCPStubServer({("九号 E100", "Lingbo-72182"): COMPATIBLE}) as stub:
+        client = MCPClient(stub.url)
+        for _ in range(5):
+            result = client.query_controller_compatibility("九号 E100", "Lingbo-72182", "Lingbo")
+            assert result["reason"] == "stub: compatible"
+        client.close()
+
+    assert stub.requests == 5
+    assert stub.connections == 1
+
+
+def test_async_queries_share_pool():
+    with MCPStubServer({("九号 E100", "Lingbo-72182"): COMPATIBLE}, delay=0.05) as stub:
+        client = MCPClient(stub.url, max_connections=4)
+
+        async def main():
+            results = await asyncio.gather(*(
+                client.aquery_controller_compatibility("九号 E100", f"Lingbo-{i}") for i in range(12)
+            ))
+            await client.aclose()
+            return results
+
+        results = asyncio.run(main())
+
+    assert all(r["reason"] == "stub: unknown" for r in results)
+    assert stub.requests == 12
+    assert stub.connections <= 4
+
+
+def test_read_timeout_falls_back_to_mock_data():
+    with MCPStubServer(delay=0.5) as stub:
+        client = MCPClient(stub.url, connect_timeout=0.2, read_timeout=0.1)
+        result = client.query_controller_compatibility("九号 E100", "Lingbo-72182")
+        client.close()
+
+    # 降级到本地模拟数据
+    assert result["compatible"] is True
+    assert result["reason"] != "stub: compatible"
+
+
+def test_cache_serves_repeat_lookups_and_expires_unknown_results_sooner():
+    now = [0.0]
+    cache = CompatibilityCache(ttl_seconds=100, negative_ttl_seconds=10, clock=lambda: now[0])
+    with MCPStubServer({("九号 E100", "Lingbo-72182"): COMPATIBLE}) as stub:
+        client = MCPClient(stub.url, cache=cache)
+        for _ in range(3):
+            client.query_controller_compatibility("九号 E100", "Lingbo-72182")
+            client.query_controller_compatibility("九号 E100", "X-1")
+        assert stub.requests == 2
+
+        now[0] = 50
+        client.query_controller_compatibility("九号 E100", "Lingbo-72182")
+        client.query_controller_compatibility("九号 E100", "X-1")
+        client.close()
+
+    # 未知结果已过期，已知结果仍然命中
+    assert stub.requests == 3
+    stats = client.stats()["cache"]
+    assert stats["hits"] == 5
+    assert stats["expired"] == 1
+
+
+def test_fallback_results_are_not_cached():
+    with MCPStubServer() as stub:
+        stub.fail_status = 503
+        client = MCPClient(stub.url, cache=CompatibilityCache())
+        client.query_controller_compatibility("九号 E100", "Lingbo-72182")
+        client.query_controller_compatibility("九号 E100", "Lingbo-72182")
+        client.close()
+
+    assert stub.requests == 2
+    assert client.stats()["fallbacks"] == 2
+
+
+def test_concurrent_sync_lookups_are_coalesced():
+    with MCPStubServer({("九号 E100", "Lingbo-72182"): COMPATIBLE}, delay=0.2) as stub:
+        client = MCPClient(stub.url, cache=CompatibilityCache())
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: client.query_controller_compatibility("九号 E100", "Lingbo-72182"), range(8)
+            ))
+        client.close()
+
+    assert all(r == results[0] for r in results)
+    assert stub.requests == 1
+    assert client.stats()["coalesced"] == 7
+
+
+def test_concurrent_async_lookups_are_coalesced():
+    with MCPStubServer({("九号 E100", "Lingbo-72182"): COMPATIBLE}, delay=0.1) as stub:
+        client = MCPClient(stub.url)
+
+        async def main():
+            results = await asyncio.gather(*(
+                client.aquery_controller_compatibility("九号 E100", "Lingbo-72182") for _ in range(10)
+            ))
+            await client.aclose()
+            return results
+
+        results = asyncio.run(main())
+
+    assert all(r["compatible"] is True for r in results)
+    assert stub.requests == 1
+    assert client.stats()["coalesced"] == 9
+
+
+def test_batch_dedupes_chunks_and_preserves_order():
+    pairs = [("九号 E100", f"X-{i % 7}") for i in range(20)] + [("九号 E100", "Lingbo-72182", "Lingbo")]
+    with MCPStubServer({("九号 E100", "Lingbo-72182"): COMPATIBLE}) as stub:
+        client = MCPClient(stub.url, batch_size=3, cache=CompatibilityCache(), batch_cache=CompatibilityCache())
+        results = client.query_controller_compatibility_batch(pairs)
+        # 第二次全部命中批量缓存
+        again = client.query_controller_compatibility_batch(pairs)
+        client.close()
+
+    assert stub.batch_sizes == [3, 3, 2]
+    # 批量结果不进入交互缓存
+    assert client.stats()["cache"]["entries"] == 0
+    assert client.stats()["batch_cache"]["entries"] == 8
+    assert len(results) == len(pairs)
+    assert results[-1]["compatible"] is True
+    assert all(r["reason"] == "stub: unknown" for r in results[:-1])
+    assert results[0] is not results[7]
+    assert again == results
+
+
+def test_async_batch_bounds_concurrency_and_degrades_failed_chunks():
+    pairs = [{"vehicle_model": "九号 E100", "controller_model": f"X-{i}"} for i in range(10)]
+    pairs.append({"vehicle_model": "九号 E100", "controller_model": "Lingbo-72180"})
+    with MCPStubServer(delay=0.05) as stub:
+        stub.fail_status = 503
+        client = MCPClient(stub.url, batch_size=2)
+
+        async def main():
+            results = await client.aquery_controller_compatibility_batch(pairs, max_concurrency=2)
+            await client.aclose()
+            return results
+
+        results = asyncio.run(main())
+
+    assert stub.requests == 6
+    assert stub.connections <= 2
+    assert client.stats()["fallbacks"] == 11
+    # 降级后使用本地兼容性表
+    assert results[-1]["compatible"] is False
+
+
+def test_offline_batch_uses_local_table():
+    results = MCPClient().query_controller_compatibility_batch([
+        ("九号E100", "lingbo-72182"),
+        ("小牛 N1S", "Leiting-60150"),
+        ("九号E100", "lingbo-72182"),
+        ("未知", "未知"),
+    ])
+    assert [r["compatible"] for r in results] == [True, True, True, None]
+
+
+def test_singleton_caches_batch_lookups_separately(monkeypatch):
+    monkeypatch.setattr(mcp_client, "_mcp_client", None)
+    monkeypatch.setattr(settings, "MCP_BATCH_CACHE_MAX_ENTRIES", 128)
+    client = get_mcp_client()
+    try:
+        assert client.batch_cache is not None and client.batch_cache is not client.cache
+        assert client.batch_cache.max_entries == 128
+    finally:
+        client.close()
@@ -0,0 +1,63 @@
+import pytest
+
+from agent_app.agents.executor import get_diagnostic_agent
+from agent_app.agents.planner import MODE_RESOLVED, MODE_TOOL, build_plan, planner_node
+from agent_app.graph.build import build_graph
+from agent_app.graph.checkpoints import MemorySaver
+from agent_app.knowledge.sop import SOPCompileError, compile_condition
+
+CUSTOMER_INFO = {
+    "vehicle_model": "九号 E100",
+    "controller_model": "Lingbo-72182",
+    "controller_brand": "Lingbo",
+    "battery_type": "lithium",
+    "battery_voltage": 72.0,
+    "bms_current": 50.0,
+    "motor_power": 1200.0,
+}
+
+
+def test_conditions_are_compiled_with_a_whitelist():
+    predicate = compile_condition("controller_brand in ['Leiting', 'Meidisi'] and not motor_power > 2000")
+    assert predicate({"controller_brand": "Leiting", "motor_power": 1000})
+    assert not predicate({"controller_brand": "Lingbo"})
+    assert not compile_condition("motor_power > 1000")({})
+    for expr in ["__import__('os')", "controller_brand.lower() == 'x'", "a =="]:
+        with pytest.raises(SOPCompileError):
+            compile_condition(expr)
+
+
+def test_plan_resolves_steps_from_customer_info():
+    sop = get_diagnostic_agent().sop
+    plan = build_plan(sop, {**CUSTOMER_INFO, "voltage_display": 71.5}, "k")
+    assert plan["steps"]["0"]["mode"] == MODE_RESOLVED and plan["steps"]["0"]["outcome"] == "pass"
+    assert plan["steps"]["1"] == {"mode": MODE_TOOL}
+    assert "三速功能是否开启" in plan["steps"]["4"]["prompt"]
+    assert "整车协议" not in plan["steps"]["4"]["prompt"]
+    assert plan["turns"] == 3
+    assert build_plan(sop, CUSTOMER_INFO, "k")["turns"] == 4
+
+    state = {"customer_info": CUSTOMER_INFO}
+    state.update(planner_node(state))
+    assert planner_node(state) == {}
+
+
+def run_first_turn(info, thread_id):
+    graph = build_graph(MemorySaver())
+    config = {"configurable": {"thread_id": thread_id}}
+    return graph.invoke({"messages": [("user", "我想调大电流")], "customer_info": info}, config=config)
+
+
+def test_known_voltage_collapses_steps_into_one_turn():
+    result = run_first_turn({**CUSTOMER_INFO, "voltage_display": 71.5}, "plan-1")
+    # step_1 已判定、step_2 自动核对，直接问到 step_3
+    assert result["current_step"] == 2
+    reply = result["messages"][-1].content
+    assert "确认全车电压" in reply and "✅ 核对结果" in reply
+    assert reply.endswith("请确认转接线插头是否已牢固插紧。")
+
+
+def test_resolved_failure_follows_on_fail():
+    result = run_first_turn({**CUSTOMER_INFO, "voltage_display": 60}, "plan-2")
+    assert result["diagnostic_result"] == "failed"
+    assert "显示为60V" in result["messages"][-1].content
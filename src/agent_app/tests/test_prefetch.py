@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+from agent_app.agents.executor import get_diagnostic_agent
+from agent_app.graph.build import build_graph
+from agent_app.tests.mcp_stub import MCPStubServer
+from agent_app.tools.mcp_client import MCPClient
+from agent_app.tools.prefetch import CompatibilityPrefetcher, set_prefetcher
+
+CUSTOMER_INFO = {
+    "vehicle_model": "九号 E100",
+    "controller_model": "Lingbo-72182",
+    "battery_type": "lithium",
+    "bms_current": 50.0,
+    "motor_power": 1200.0,
+}
+
+
+@pytest.fixture
+def stub():
+    with MCPStubServer(delay=0.3) as server:
+        yield server
+
+
+@pytest.fixture
+def client(stub, monkeypatch):
+    client = MCPClient(stub.url)
+    monkeypatch.setattr(get_diagnostic_agent(), "mcp_client", client)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def prefetcher(client):
+    prefetcher = CompatibilityPrefetcher(client)
+    set_prefetcher(prefetcher)
+    yield prefetcher
+    set_prefetcher(None)
+
+
+def test_take_returns_future_only_for_matching_params(client):
+    prefetcher = CompatibilityPrefetcher(client)
+    assert prefetcher.start("s1", "九号 E100", "A")
+    # 相同参数不重复发起
+    assert not prefetcher.start("s1", "九号 E100", "A")
+    assert prefetcher.start("s1", "九号 E100", "B")
+    assert prefetcher.take("s1", "九号 E100", "A") is None
+    prefetcher.start("s2", "九号 E100", "C")
+    assert prefetcher.take("s2", "九号 E100", "C").result()["reason"] == "stub: unknown"
+    prefetcher.start("s3", "九号 E100", "D")
+    prefetcher.discard("s3")
+
+    stats = prefetcher.stats()
+    assert stats["started"] == 4
+    assert stats["used"] == 1
+    assert stats["pending"] == 0
+    assert stats["cancelled"] == {"replaced": 1, "mismatched": 1, "expired": 0, "discarded": 1}
+
+
+def test_stale_prefetches_expire():
+    now = [0.0]
+    prefetcher = CompatibilityPrefetcher(MCPClient("http://127.0.0.1:9"), ttl_seconds=10, max_sessions=2, clock=lambda: now[0])
+    prefetcher.start("a", "v", "1")
+    prefetcher.start("b", "v", "2")
+    prefetcher.start("c", "v", "3")
+    now[0] = 20
+    assert prefetcher.take("b", "v", "2") is None
+    prefetcher.start("d", "v", "4")
+    assert prefetcher.stats()["cancelled"]["expired"] == 3
+    assert prefetcher.stats()["pending"] == 1
+
+
+def test_offline_mode_skips_prefetch():
+    assert not CompatibilityPrefetcher(MCPClient()).start("s", "九号 E100", "Lingbo-72182")
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_step_2_uses_result_prefetched_by_collector(stub, client, prefetcher, use_async):
+    graph = build_graph(MemorySaver())
+    config = {"configurable": {"thread_id": f"prefetch-{use_async}"}}
+
+    def run(turn):
+        if use_async:
+            return asyncio.run(graph.ainvoke(turn, config=config))
+        return graph.invoke(turn, config=config)
+
+    run({"messages": [("user", "我想调大电流")], "customer_info": CUSTOMER_INFO})
+    assert prefetcher.stats()["started"] == 1
+    # 用户回答第一步的时间里，预取已经完成
+    time.sleep(stub.delay + 0.1)
+
+    started = time.perf_counter()
+    result = run({"messages": [("user", "72V")]})
+    assert time.perf_counter() - started < stub.delay
+
+    assert "stub: unknown" in result["messages"][-1].content
+    assert stub.requests == 1
+    assert prefetcher.stats()["used"] == 1
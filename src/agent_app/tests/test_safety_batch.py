@@ -0,0 +1,87 @@
+import math
+import random
+
+import pytest
+
+from agent_app.agents.validator import BOTTLENECK_COMPONENTS, SafetyCalculator, VehicleSpecs
+
+np = pytest.importorskip("numpy")
+
+
+def random_records(n, seed=7):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        battery_type = rng.choice(["lead_acid", "lithium"])
+        records.append({
+            "battery_type": battery_type,
+            "voltage": rng.choice([48.0, 60.0, 72.0, 84.0, 96.0]),
+            "capacity_ah": rng.choice([20.0, 30.0, 32.0, 45.0]) if battery_type == "lead_acid" else None,
+            "bms_current": round(rng.uniform(20, 120), rng.choice([0, 1, 2])) if battery_type == "lithium" else None,
+            "motor_power_rated": rng.choice([800.0, 1000.0, 1200.0, 1500.0, 2000.0, 3000.0]),
+            "motor_type": rng.choice(["standard", "performance"]),
+            "wire_gauge": rng.choice([2.5, 4.0, 6.0, 8.0, 10.0]),
+            "breaker_rating": rng.choice([40.0, 63.0, 80.0, 100.0]),
+            "controller_max_current": round(rng.uniform(30, 200), rng.choice([0, 1, 2, 3])),
+        })
+    return records
+
+
+def to_columns(records):
+    return {
+        name: np.array([r[name] for r in records], dtype=object if name.endswith("_type") else np.float64)
+        for name in records[0]
+        if name not in ("capacity_ah", "bms_current")
+    } | {
+        name: np.array([np.nan if r[name] is None else r[name] for r in records])
+        for name in ("capacity_ah", "bms_current")
+    }
+
+
+def test_batch_matches_scalar_path_exactly():
+    records = random_records(5000)
+    # 恰好落在 .x5 上的值，np.round 与 round() 可能不同
+    records[0].update(battery_type="lithium", bms_current=20.25)
+    records[1].update(battery_type="lithium", bms_current=0.15, controller_max_current=500.0)
+    batch = SafetyCalculator.calculate_batch(to_columns(records))
+
+    assert batch["valid"].all()
+    for i, record in enumerate(records):
+        scalar = SafetyCalculator.calculate_max_bus_current(VehicleSpecs(**record))
+        assert batch["safe_bus_current"][i] == scalar["safe_bus_current"], (i, record)
+        assert BOTTLENECK_COMPONENTS[batch["bottleneck"][i]] == scalar["bottleneck_component"]
+        for component, value in scalar["details"].items():
+            assert batch["details"][component][i] == value
+
+
+def test_record_array_and_integer_codes():
+    records = np.rec.fromrecords(
+        [(1, 72.0, np.nan, 50.0, 1000.0, 0, 6.0, 80.0, 150.0)],
+        names="battery_type,voltage,capacity_ah,bms_current,motor_power_rated,motor_type,wire_gauge,breaker_rating,controller_max_current",
+    )
+    batch = SafetyCalculator.calculate_batch(records)
+    assert batch["safe_bus_current"][0] == 48.6
+    assert BOTTLENECK_COMPONENTS[batch["bottleneck"][0]] == "motor"
+
+
+def test_invalid_rows_are_masked_instead_of_raising():
+    columns = {
+        "battery_type": np.array(["lead_acid", "lithium", "nickel", "lithium", "lithium"]),
+        "voltage": np.array([72.0, 72.0, 72.0, 0.0, 72.0]),
+        "capacity_ah": np.array([np.nan, np.nan, np.nan, np.nan, np.nan]),
+        "bms_current": np.array([np.nan, 0.0, 50.0, 50.0, 50.0]),
+        "motor_power_rated": np.array([1000.0, 1000.0, 1000.0, 1000.0, np.nan]),
+        "wire_gauge": np.full(5, 6.0),
+        "breaker_rating": np.full(5, 80.0),
+        "controller_max_current": np.full(5, 150.0),
+    }
+    batch = SafetyCalculator.calculate_batch(columns)
+
+    assert not batch["valid"].any()
+    assert batch["errors"]["missing_capacity_ah"].tolist() == [True, False, False, False, False]
+    assert batch["errors"]["missing_bms_current"].tolist() == [False, True, False, False, False]
+    assert batch["errors"]["invalid_battery_type"].tolist() == [False, False, True, False, False]
+    assert batch["errors"]["zero_voltage"].tolist() == [False, False, False, True, False]
+    assert batch["errors"]["missing_field"].tolist() == [False, False, False, False, True]
+    assert all(math.isnan(v) for v in batch["safe_bus_current"])
+    assert (batch["bottleneck"] == -1).all()
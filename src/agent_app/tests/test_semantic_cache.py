@@ -0,0 +1,113 @@
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from agent_app.agents.base import BaseAgent, LLMGateway, set_llm_gateway
+from agent_app.agents.llm_cache import set_llm_cache
+from agent_app.agents.semantic_cache import SemanticCache, normalize_question, semantic_context, set_semantic_cache
+from agent_app.settings import settings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+E100 = {"vehicle_model": "E100"}
+
+
+def test_normalization_drops_fillers_and_punctuation():
+    assert normalize_question("请问，电流能调大吗？") == "电流调大"
+    assert normalize_question("我想 调大电流") == "调大电流"
+
+
+def test_paraphrases_hit_and_opposites_miss():
+    cache = SemanticCache()
+    cache.set("我想调大电流", "可以，但需要先确认线径", E100)
+
+    hit = cache.get("电流能调大吗", E100)
+    assert hit.answer == "可以，但需要先确认线径"
+    assert hit.question == "我想调大电流"
+    assert 0.7 <= hit.similarity < 1
+    assert cache.get("我想调大电流！", E100).similarity == 1.0
+
+    assert cache.get("电流不能调大吗", E100) is None        # 否定
+    assert cache.get("电流能调小吗", E100) is None          # 相似度不足
+    assert cache.get("电流能调大吗", {"vehicle_model": "N70C"}) is None   # 车型不同
+    cache.set("60V充电器能用吗", "不能")
+    assert cache.get("48V充电器能用吗") is None             # 数值不同
+
+    stats = cache.stats()
+    assert (stats["lookups"], stats["hits"], stats["exact_hits"]) == (6, 2, 1)
+    assert stats["similarity"]["exact"] == 1
+    assert sum(stats["similarity"].values()) == 6
+
+
+def test_lru_ttl_and_persistence(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "semantic.sqlite")
+    cache = SemanticCache(path, max_entries=2, ttl_seconds=60, clock=clock)
+    cache.set("刹车断电怎么接", "a")
+    cache.set("仪表不亮怎么办", "b")
+    clock.now += 1
+    assert cache.get("刹车断电线怎么接") is not None      # 访问后变为最近使用
+    cache.set("充电器不充电", "c")
+    assert cache.get("仪表不亮怎么办") is None
+    assert cache.stats()["evictions"] == 1
+
+    # 新实例（重启）从磁盘恢复
+    other = SemanticCache(path, max_entries=2, ttl_seconds=60, clock=clock)
+    assert other.stats()["entries"] == 2
+    assert other.get("刹车断电要怎么接").answer == "a"
+
+    clock.now += 120
+    assert other.get("充电器不充电") is None
+    assert other.stats()["expired"] == 1
+
+
+def test_access_times_are_batched_and_stale_rows_purged(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "semantic.sqlite")
+    cache = SemanticCache(path, max_entries=3, ttl_seconds=60, flush_interval=10, clock=clock)
+    cache.set("刹车断电怎么接", "a")
+    clock.now += 1
+    cache.get("刹车断电怎么接")
+    # 命中不写磁盘，访问时间留在内存中等待批量落盘
+    assert cache._conn.execute("SELECT accessed_at FROM semantic_cache").fetchone() == (1000.0,)
+    assert not cache.needs_flush
+    clock.now += 10
+    assert cache.needs_flush
+    cache.flush()
+    assert cache._conn.execute("SELECT accessed_at FROM semantic_cache").fetchone() == (1001.0,)
+
+    # 重启时删除过期行与超出 max_entries 的行
+    for i in range(4):
+        cache.set(f"问题{i}怎么办", str(i))
+    assert cache._conn.execute("SELECT COUNT(*) FROM semantic_cache").fetchone() == (3,)
+    cache._conn.execute("UPDATE semantic_cache SET created_at = 0 WHERE answer = '3'")
+    cache._conn.commit()
+    reopened = SemanticCache(path, max_entries=1, ttl_seconds=60, clock=clock)
+    assert reopened.stats()["entries"] == 1
+    assert reopened._conn.execute("SELECT answer FROM semantic_cache").fetchall() == [("2",)]
+
+
+def test_ask_llm_reuses_answers_for_paraphrases(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    model = FakeListChatModel(responses=["答案一", "答案二"])
+    set_llm_gateway(LLMGateway(model))
+    set_llm_cache(None)
+    set_semantic_cache(SemanticCache())
+    try:
+        agent = BaseAgent()
+        context = semantic_context({"vehicle_model": "E100", "phone": "138"}, step="step_1")
+        assert context == {"vehicle_model": "E100", "step": "step_1"}
+
+        first = agent.ask_llm("我想调大电流", [("human", "我想调大电流")], context=context)
+        second = agent.ask_llm("电流能调大吗", [("human", "电流能调大吗")], context=context)
+        assert first.content == second.content == "答案一"
+        assert second.response_metadata["cache_hit"]
+        assert agent.ask_llm("仪表不亮", [("human", "仪表不亮")], context=context).content == "答案二"
+    finally:
+        set_llm_gateway(None)
+        set_semantic_cache(None)
@@ -0,0 +1,49 @@
+import json
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, RemoveMessage
+
+from agent_app.runtime.server import _message_texts, app
+
+CUSTOMER_INFO = {
+    "vehicle_model": "九号 E100",
+    "controller_model": "Lingbo-72182",
+    "battery_type": "lithium",
+    "voltage": 72.0,
+    "bms_current": 50.0,
+    "motor_power": 1200.0,
+}
+
+
+def parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_ends_with_chat_response():
+    payload = {"message": "我想调大电流", "thread_id": "stream-1", "mock_info": CUSTOMER_INFO}
+    with TestClient(app) as client:
+        with client.stream("POST", "/chat/stream", json=payload) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = parse_sse(response.read().decode("utf-8"))
+
+        kinds = [kind for kind, _ in events]
+        assert kinds[0] == "start"
+        assert kinds[-1] == "final"
+        assert [data["node"] for kind, data in events if kind == "node"] == ["extractor", "collector", "planner", "diagnostician", "history"]
+
+        final = events[-1][1]
+        assert final["is_info_complete"] is True
+        assert final["current_step"] == 0
+
+        # 同一会话的下一轮通过普通接口继续，状态共享
+        reply = client.post("/chat", json={**payload, "message": "72V"}).json()
+        assert reply["current_step"] == 2
+
+
+def test_node_events_skip_removed_and_empty_messages():
+    messages = [RemoveMessage(id="old-1"), AIMessage(content=""), ("assistant", "请确认全车电压是多少。"), AIMessage(content="好的")]
+    assert _message_texts(messages) == ["请确认全车电压是多少。", "好的"]
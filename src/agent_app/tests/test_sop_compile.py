@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent_app.agents.executor import DiagnosticAgent
+from agent_app.knowledge.sop import SOPCompileError, compile_sop
+
+
+def test_bundled_sop_resolves_targets_and_sub_flows():
+    agent = DiagnosticAgent()
+    sop = agent.sop
+    assert sop.main_length == 5
+    assert sop.index_of["step_3_wiring"] == 2
+    assert sop.steps[1].tool.name == "query_controller_compatibility"
+    assert sop.steps[1].next_index == 2
+    assert sop.steps[1].fail_index is None and sop.steps[1].fail_target == "return_process"
+    # step_4 失败进入 learning_fix 子流程，子流程步骤排在主流程之后
+    assert sop.steps[3].fail_index == sop.sub_flows["learning_fix"] == 5
+    # 子流程最后一步返回进入它的步骤的 on_success.next
+    assert sop.steps[5].flow == "learning_fix" and sop.steps[5].next_index == 4
+    # 主流程最后一步成功后结束，而不是顺序进入子流程
+    assert sop.steps[4].next_index is None
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"steps": [{"id": "a"}]}, "缺少 prompt"),
+    ({"steps": [{"id": "a", "prompt": "p", "on_success": {"next": "nowhere"}}]}, "nowhere"),
+    ({"steps": [{"id": "a", "prompt": "p"}, {"id": "a", "prompt": "q"}]}, "重复"),
+    ({"steps": [{"id": "a", "prompt": "p", "mcp_tool": {"name": "rm_rf"}}]}, "rm_rf"),
+    ({"steps": [{"id": "a", "prompt": "p", "on_fail": {"next": "sub_flow_missing"}}]}, "sub_flow_missing"),
+    ({
+        "steps": [
+            {"id": "a", "prompt": "p", "on_fail": {"next": "sub_flow_fix"}},
+            {"id": "b", "prompt": "q", "on_fail": {"next": "sub_flow_fix"}},
+            {"id": "c", "prompt": "r"},
+        ],
+        "sub_flows": {"fix": {"steps": [{"prompt": "f"}]}},
+    }, "返回位置不同"),
+])
+def test_invalid_sop_fails_at_compile_time(config, message):
+    with pytest.raises(SOPCompileError, match=message):
+        compile_sop(config, tools={"query_controller_compatibility"})
+
+
+def test_user_reply_follows_compiled_next():
+    agent = DiagnosticAgent()
+    response, tool_idx = agent._advance({"messages": [HumanMessage("好了")], "current_step": 2})
+    assert tool_idx is None
+    assert response["current_step"] == 3
+    assert response["messages"][0][1] == agent.sop.steps[3].prompt
+
+    response, _ = agent._advance({"messages": [HumanMessage("好了")], "current_step": 4})
+    assert response["diagnostic_result"] == "completed"
+    assert response["messages"][0][1].startswith(agent.sop.steps[4].success_message)
+    assert response["current_step"] == agent.sop.end_index
+
+
+def test_sub_flow_returns_to_the_step_after_the_branch():
+    agent = DiagnosticAgent()
+    fix = agent.sop.sub_flows["learning_fix"]
+    response, _ = agent._advance({"messages": [AIMessage("q"), HumanMessage("改完了")], "current_step": fix})
+    assert response["current_step"] == agent.sop.index_of["step_5_protocol"]
+    assert "diagnostic_result" not in response
+
+    explicit = compile_sop({
+        "steps": [{"id": "a", "prompt": "p", "on_fail": {"next": "sub_flow_fix"}}, {"id": "b", "prompt": "q"}],
+        "sub_flows": {"fix": {"steps": [{"prompt": "f", "on_success": {"next": "a"}}]}},
+        "terminals": [],
+    })
+    assert explicit.steps[2].next_index == 0
+
+
+def test_per_turn_cost_does_not_grow_with_sop_size():
+    def synthetic(n):
+        steps = [{"id": f"s{i}", "prompt": f"第 {i} 步"} for i in range(n)]
+        # 最后一步跳回开头，使目标查找必须走映射而不是相邻下标
+        steps[-1]["on_success"] = {"next": "s0"}
+        return compile_sop({"steps": steps})
+
+    def turn_cost(n):
+        sop = synthetic(n)
+        agent = DiagnosticAgent.__new__(DiagnosticAgent)
+        agent.sop = sop
+        state = {"messages": [AIMessage("q"), HumanMessage("a")], "current_step": n - 1}
+        started = time.perf_counter()
+        for _ in range(2000):
+            response, _ = agent._advance(state)
+        assert response["current_step"] == 0
+        return time.perf_counter() - started
+
+    small, large = min(turn_cost(10) for _ in range(3)), min(turn_cost(20_000) for _ in range(3))
+    assert large < small * 5
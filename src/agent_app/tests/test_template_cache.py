@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import pytest
+import yaml
+from langchain_core.messages import AIMessage
+
+from agent_app.agents.executor import DiagnosticAgent
+from agent_app.knowledge import loader
+from agent_app.knowledge.loader import BASE_DIR, TemplateCache, set_template_cache
+from agent_app.knowledge.registry import select_template
+
+
+def bump_mtime(path, seconds=10):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def write_yaml(path, data):
+    path.write_text(yaml.safe_dump(data, allow_unicode=True), encoding="utf-8")
+    bump_mtime(path)
+
+
+def test_parses_once_and_reloads_only_on_content_change(tmp_path):
+    path = tmp_path / "t.yaml"
+    write_yaml(path, {"value": 1})
+    cache = TemplateCache(tmp_path, reload_interval=0)
+    assert cache.get("t") == {"value": 1}
+    assert cache.get("t") is cache.get("t")
+    assert cache.parses == 1
+
+    bump_mtime(path)  # 只改 mtime，内容不变
+    assert cache.get("t") == {"value": 1}
+    assert cache.parses == 1
+
+    write_yaml(path, {"value": 2})
+    assert cache.get("t") == {"value": 2}
+    assert (cache.parses, cache.reloads) == (2, 1)
+
+
+def test_broken_update_keeps_previous_version(tmp_path):
+    path = tmp_path / "t.yaml"
+    write_yaml(path, {"value": 1})
+    cache = TemplateCache(tmp_path, reload_interval=0)
+    cache.get("t")
+    path.write_text("value: [unclosed", encoding="utf-8")
+    bump_mtime(path, 20)
+    assert cache.get("t") == {"value": 1}
+    assert cache.reload_errors == 1
+    with pytest.raises(FileNotFoundError):
+        cache.get("missing")
+
+
+def test_precompiled_cache_skips_yaml_parsing(tmp_path, monkeypatch):
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    write_yaml(templates / "t.yaml", {"steps": ["a", "b"]})
+    TemplateCache(templates, cache_dir=tmp_path / "cache").get("t")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("不应重新解析 YAML")
+
+    monkeypatch.setattr(loader.yaml, "load", fail)
+    warm = TemplateCache(templates, cache_dir=tmp_path / "cache")
+    assert warm.get("t") == {"steps": ["a", "b"]}
+    assert (warm.parses, warm.pickle_hits) == (0, 1)
+
+
+def test_select_template_and_agent_share_the_cache(tmp_path):
+    shutil.copy(BASE_DIR / "sop_diagnostic.yaml", tmp_path / "sop_diagnostic.yaml")
+    cache = TemplateCache(tmp_path, reload_interval=0)
+    set_template_cache(cache)
+    try:
+        copy = select_template()
+        copy["steps"].clear()  # 返回副本，不影响缓存
+        agent = DiagnosticAgent()
+        assert cache.parses == 1
+        assert len(agent.sop.steps) == 6
+
+        config = cache.get("sop_diagnostic")
+        edited = {**config, "steps": [{**config["steps"][0], "prompt": "新的第一步"}, *config["steps"][1:]]}
+        write_yaml(tmp_path / "sop_diagnostic.yaml", edited)
+        result = agent.invoke({"messages": [AIMessage("你好")], "current_step": 0})
+        assert result["messages"][0][1] == "新的第一步"
+    finally:
+        set_template_cache(None)
@@ -0,0 +1,96 @@
+import itertools
+import random
+import time
+
+from agent_app.agents.upgrade import UPGRADE_COMPONENTS, UpgradeCatalog, UpgradeOption, get_upgrade_catalog
+from agent_app.agents.validator import SafetyCalculator, VehicleSpecs
+
+SPECS = VehicleSpecs(
+    battery_type="lithium",
+    voltage=72,
+    bms_current=40,
+    motor_power_rated=1000,
+    motor_type="standard",
+    wire_gauge=4,
+    breaker_rating=63,
+    controller_max_current=100,
+)
+
+
+def random_catalog(rng, per_component):
+    options = []
+    for component in UPGRADE_COMPONENTS:
+        for i in range(per_component):
+            options.append(UpgradeOption(
+                component,
+                f"{component}-{i}",
+                rating=rng.choice([2.5, 4, 6, 8, 10, 16]) if component == "wire" else rng.uniform(10, 4000 if component == "motor" else 250),
+                cost=round(rng.uniform(10, 2000), 2),
+                motor_type=rng.choice(["standard", "performance"]),
+            ))
+    return options
+
+
+def brute_force_cost(options, specs, target):
+    """枚举每个组件"不换或换成某个配件"的所有组合"""
+    by_field = {}
+    for option in options:
+        component, field = option.component, UPGRADE_COMPONENTS[option.component][1]
+        if component == "bms" and specs.battery_type != "lithium":
+            continue
+        if component == "battery" and specs.battery_type != "lead_acid":
+            continue
+        by_field.setdefault(field, [None]).append(option)
+    best = None
+    for combo in itertools.product(*by_field.values()):
+        changes, cost = {}, 0.0
+        for option in filter(None, combo):
+            changes[UPGRADE_COMPONENTS[option.component][1]] = option.rating
+            if option.component == "motor":
+                changes["motor_type"] = option.motor_type
+            cost += option.cost
+        limits = SafetyCalculator.calculate_max_bus_current(specs.model_copy(update=changes))["details"]
+        if min(limits.values()) >= target and (best is None or cost < best):
+            best = cost
+    return best
+
+
+def test_solver_matches_brute_force():
+    rng = random.Random(3)
+    for _ in range(30):
+        options = random_catalog(rng, per_component=3)
+        target = rng.uniform(30, 150)
+        plan = UpgradeCatalog(options).solve(SPECS, target)
+        expected = brute_force_cost(options, SPECS, target)
+        if expected is None:
+            assert not plan["feasible"]
+        else:
+            assert plan["feasible"]
+            assert abs(plan["total_cost"] - expected) < 1e-6
+            assert min(plan["after"]["details"].values()) >= target
+
+
+def test_default_catalog_plan():
+    plan = get_upgrade_catalog().solve(SPECS, 60)
+    # 电机 1000W×3.5/72=48.6A、主线 48A、保护板 40A、空开 50.4A 都低于 60A，控制器 80A 已达标
+    assert plan["feasible"]
+    assert {u["component"] for u in plan["upgrades"]} == {"motor", "wire", "bms", "breaker"}
+    assert plan["after"]["safe_bus_current"] >= 60
+    assert plan["before"]["safe_bus_current"] == 40
+
+
+def test_infeasible_target_reports_blocking_components():
+    plan = get_upgrade_catalog().solve(SPECS, 500)
+    assert not plan["feasible"]
+    assert plan["total_cost"] is None
+    assert "battery" in plan["blocking"]
+
+
+def test_query_is_interactive_on_large_catalog():
+    rng = random.Random(5)
+    catalog = UpgradeCatalog(random_catalog(rng, per_component=50_000))
+    started = time.perf_counter()
+    for target in range(40, 240, 2):
+        catalog.solve(SPECS, target)
+    per_query_ms = (time.perf_counter() - started) * 1000 / 100
+    assert per_query_ms < 50
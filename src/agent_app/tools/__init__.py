@@ -1,6 +1,13 @@
 """
 工具模块 - 电动车售后诊断工具集
 """
-from .mcp_client import MCPClient, get_mcp_client
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .mcp_client import CompatibilityCache, MCPClient, get_mcp_client
 
-__all__ = ["MCPClient", "get_mcp_client"]
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "CompatibilityCache",
+    "MCPClient",
+    "get_mcp_client",
+]
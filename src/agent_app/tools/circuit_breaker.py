@@ -0,0 +1,153 @@
+"""
+熔断器
+
+外部服务故障时，每次调用都要等到超时才能降级，故障期间所有会话都会被拖慢。
+熔断器统计最近调用的失败率，超过阈值后进入 open 状态，直接拒绝调用，调用方
+立即走降级逻辑；冷却时间过后进入 half-open 状态，放行少量探测请求，探测成功
+则恢复 closed，失败则重新 open。
+
+    closed --失败率超限--> open --冷却结束--> half_open --探测成功--> closed
+                            ^                     |
+                            +------探测失败-------+
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于 open 状态，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    基于滑动窗口失败率的熔断器（线程安全）
+
+    用法：
+        if not breaker.allow():
+            return fallback()
+        try:
+            result = call()
+        except Exception:
+            breaker.record_failure()
+            return fallback()
+        breaker.record_success()
+
+    Args:
+        name: 名称，用于日志
+        window_size: 统计失败率的最近调用次数
+        min_calls: 窗口内调用次数达到该值后才计算失败率
+        failure_rate_threshold: 失败率阈值（0-1），达到后熔断
+        open_seconds: open 状态持续时间，之后进入 half-open
+        half_open_max_calls: half-open 状态下同时放行的探测请求数
+        clock: 时间函数（测试时可替换）
+    """
+
+    def __init__(
+        self,
+        name: str = "default",
+        *,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        # 最近调用结果，True 表示失败
+        self._window: deque = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"熔断器 {self.name}: {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self._clock()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self._window.clear()
+        self._probes_in_flight = 0
+
+    def allow(self) -> bool:
+        """是否放行本次调用；放行后必须调用 record_success / record_failure / release 之一"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+            elif self._state == CLOSED:
+                self._window.append(False)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(OPEN)
+            elif self._state == CLOSED:
+                self._window.append(True)
+                if len(self._window) >= self.min_calls and self._failure_rate() >= self.failure_rate_threshold:
+                    self._transition(OPEN)
+
+    def release(self) -> None:
+        """放行的调用未得出结果（例如被取消）时归还探测名额"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+
+    def _failure_rate(self) -> float:
+        return sum(self._window) / len(self._window) if self._window else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """熔断器状态，用于监控"""
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "name": self.name,
+                "state": self._state,
+                "failure_rate": round(self._failure_rate(), 4),
+                "window_calls": len(self._window),
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "open_remaining_seconds": (
+                    round(max(0.0, self.open_seconds - (self._clock() - self._opened_at)), 2)
+                    if self._state == OPEN else 0.0
+                )
+            }
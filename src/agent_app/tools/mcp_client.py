@@ -3,30 +3,236 @@ MCP (Model Context Protocol) 工具客户端
 用于调用外部 MCP 服务查询控制器配件信息
 """
 
+import asyncio
+import copy
+import importlib.util
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Iterable, Optional, List, Sequence, Tuple, Union
 import json
 
+import httpx
+
+from agent_app.knowledge.compatibility import RESULT_FIELDS, get_compatibility_table
+from agent_app.settings import settings
+from agent_app.tools.circuit_breaker import CircuitBreaker, CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
+COMPATIBILITY_PATH = "/query/controller_compatibility"
+COMPATIBILITY_BATCH_PATH = "/query/controller_compatibility/batch"
+
+# (车型, 控制器型号, 控制器品牌)
+CompatibilityKey = Tuple[str, str, Optional[str]]
+# 批量查询的输入：(车型, 控制器型号[, 品牌]) 元组，或包含同名字段的字典
+CompatibilityPair = Union[Sequence[Optional[str]], Dict[str, Any]]
+
+
+def _as_key(pair: CompatibilityPair) -> CompatibilityKey:
+    if isinstance(pair, dict):
+        return (pair["vehicle_model"], pair["controller_model"], pair.get("controller_brand"))
+    vehicle_model, controller_model, *rest = pair
+    return (vehicle_model, controller_model, rest[0] if rest else None)
+
+
+class CompatibilityCache:
+    """
+    兼容性查询结果缓存
+
+    - LRU 淘汰，条目数不超过 max_entries
+    - 已知结果（compatible 为 True/False）在 ttl_seconds 后过期
+    - 未知结果（compatible 为 None）使用更短的 negative_ttl_seconds，
+      后台补录兼容性数据后能尽快生效
+
+    本类不加锁，由 MCPClient 在自身的锁内调用。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_seconds: float = 3600,
+        negative_ttl_seconds: float = 60,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        # key -> (结果, 过期时间)
+        self._entries: "OrderedDict[CompatibilityKey, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: CompatibilityKey) -> Optional[Dict[str, Any]]:
+        """查询缓存，未命中或已过期返回 None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self._entries[key]
+            self.expired += 1
+        self.misses += 1
+        return None
+
+    def set(self, key: CompatibilityKey, result: Dict[str, Any]) -> None:
+        ttl = self.ttl_seconds if result.get("compatible") is not None else self.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        self._entries[key] = (result, self._clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries
+        }
+
+
+class _Flight:
+    """一次正在进行的同步后端查询，相同 key 的并发调用等待同一个结果"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
 
 class MCPClient:
-    """MCP 工具客户端"""
+    """
+    MCP 工具客户端
+
+    真实服务模式下，所有请求复用同一个 httpx 连接池（keep-alive，安装了 h2 时启用
+    HTTP/2），避免每次查询都重新建立 TCP/TLS 连接。
+
+    查询结果写入 CompatibilityCache；相同 (车型, 控制器) 的并发查询只向后端发起
+    一次请求，其余调用等待并共享该结果（single-flight）。服务失败降级得到的模拟
+    数据不写入缓存。批量查询（离线审计）使用单独的 batch_cache，不会把会话中的
+    热点条目挤出交互缓存，也不占用交互查询的锁。
+
+    配置了熔断器时，服务连续故障会使熔断器打开，此后的查询不再等待超时，
+    直接降级到模拟数据，直到探测请求确认服务恢复。
+    """
     
-    def __init__(self, base_url: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        max_connections: int = 20,
+        http2: bool = True,
+        batch_size: int = 500,
+        batch_concurrency: int = 4,
+        cache: Optional[CompatibilityCache] = None,
+        batch_cache: Optional[CompatibilityCache] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
         """
         初始化 MCP 客户端
         
         Args:
             base_url: MCP 服务的基础 URL，如果为 None 则使用模拟数据
+            connect_timeout: 建立连接超时（秒）
+            read_timeout: 读取响应超时（秒）
+            max_connections: 连接池最大连接数
+            http2: 是否启用 HTTP/2（需要安装 h2，未安装时自动退回 HTTP/1.1）
+            batch_size: 批量查询时每个请求包含的最大条数
+            batch_concurrency: 异步批量查询同时在途的请求数
+            cache: 查询结果缓存，None 表示不缓存
+            batch_cache: 批量查询的结果缓存（与 cache 分开），None 表示批量查询不缓存
+            breaker: 熔断器，None 表示不熔断
         """
-        self.base_url = base_url
+        self.base_url = base_url.rstrip("/") if base_url else None
         self.use_mock = base_url is None
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self._client: Optional[httpx.Client] = None
+        self._client_lock = threading.Lock()
+        # AsyncClient 的连接绑定在创建它的事件循环上，按事件循环分别创建
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+        self.batch_size = batch_size
+        self.batch_concurrency = batch_concurrency
+        self.cache = cache
+        self.batch_cache = batch_cache
+        self.breaker = breaker
+        # 保护 batch_cache（CompatibilityCache 本身不加锁）
+        self._batch_lock = threading.Lock()
+        # 保护缓存与 in-flight 表
+        self._lock = threading.Lock()
+        self._inflight: Dict[CompatibilityKey, _Flight] = {}
+        self._async_inflight: Dict[CompatibilityKey, "asyncio.Task"] = {}
+        self.backend_calls = 0
+        self.coalesced = 0
+        self.fallbacks = 0
         
         if self.use_mock:
             logger.info("MCP 客户端使用模拟数据模式")
         else:
-            logger.info(f"MCP 客户端连接到: {base_url}")
+            logger.info(f"MCP 客户端连接到: {base_url}（HTTP/2: {self.http2}）")
+
+    @property
+    def http(self) -> httpx.Client:
+        """共享的同步 HTTP 客户端（首次使用时创建）"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        limits=self.limits,
+                        http2=self.http2
+                    )
+        return self._client
+
+    def _async_http(self) -> httpx.AsyncClient:
+        """当前事件循环共享的异步 HTTP 客户端"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def close(self) -> None:
+        """关闭同步连接池"""
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的异步连接池"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
     
     def query_controller_compatibility(
         self, 
@@ -56,8 +262,276 @@ class MCPClient:
         
         if self.use_mock:
             return self._mock_query_compatibility(vehicle_model, controller_model, controller_brand)
+
+        key = (vehicle_model, controller_model, controller_brand)
+        with self._lock:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return copy.deepcopy(cached)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = self._fetch(key)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+        return copy.deepcopy(flight.result)
+
+    async def aquery_controller_compatibility(
+        self,
+        vehicle_model: str,
+        controller_model: str,
+        controller_brand: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """query_controller_compatibility 的异步版本，参数与返回值相同"""
+        logger.info(f"异步查询控制器兼容性: 车型={vehicle_model}, 控制器={controller_model}")
+
+        if self.use_mock:
+            return self._mock_query_compatibility(vehicle_model, controller_model, controller_brand)
+
+        key = (vehicle_model, controller_model, controller_brand)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return copy.deepcopy(cached)
+            task = self._async_inflight.get(key)
+            if task is not None and task.get_loop() is loop:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(self._afetch(key))
+                self._async_inflight[key] = task
+        # shield：某个调用方被取消时不影响其他等待同一结果的调用方
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def query_controller_compatibility_batch(self, pairs: Iterable[CompatibilityPair]) -> List[Dict[str, Any]]:
+        """
+        批量查询兼容性
+
+        重复的组合只查询一次；缓存未命中的组合按 batch_size 分块批量请求服务，
+        模拟模式下直接查本地兼容性表。某个分块失败时只有该分块降级到本地数据。
+
+        Args:
+            pairs: (车型, 控制器型号[, 品牌]) 元组或字典的序列
+
+        Returns:
+            与输入顺序一一对应的结果列表，格式同 query_controller_compatibility
+        """
+        keys = [_as_key(pair) for pair in pairs]
+        results, missing = self._batch_prepare(keys)
+        for start in range(0, len(missing), self.batch_size):
+            results.update(self._fetch_batch(missing[start:start + self.batch_size]))
+        return self._batch_results(keys, results)
+
+    async def aquery_controller_compatibility_batch(
+        self,
+        pairs: Iterable[CompatibilityPair],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """query_controller_compatibility_batch 的异步版本，最多 max_concurrency 个分块请求同时在途"""
+        keys = [_as_key(pair) for pair in pairs]
+        results, missing = self._batch_prepare(keys)
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+
+        async def fetch(chunk: List[CompatibilityKey]) -> Dict[CompatibilityKey, Dict[str, Any]]:
+            async with semaphore:
+                return await self._afetch_batch(chunk)
+
+        chunks = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        for chunk_results in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+            results.update(chunk_results)
+        return self._batch_results(keys, results)
+
+    def _batch_prepare(
+        self, keys: List[CompatibilityKey]
+    ) -> Tuple[Dict[CompatibilityKey, Dict[str, Any]], List[CompatibilityKey]]:
+        """去重并查缓存，返回 (已得到的结果, 需要请求服务的组合)"""
+        unique = list(dict.fromkeys(keys))
+        if self.use_mock:
+            return {key: self._mock_query_compatibility(*key) for key in unique}, []
+
+        results: Dict[CompatibilityKey, Dict[str, Any]] = {}
+        if self.batch_cache is None:
+            return results, unique
+        missing: List[CompatibilityKey] = []
+        for key in unique:
+            # 逐条加锁，大批量审计不会长时间占住锁
+            with self._batch_lock:
+                cached = self.batch_cache.get(key)
+            if cached is not None:
+                results[key] = copy.deepcopy(cached)
+            else:
+                missing.append(key)
+        return results, missing
+
+    @staticmethod
+    def _batch_results(
+        keys: List[CompatibilityKey], results: Dict[CompatibilityKey, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """按输入顺序展开结果，重复的组合各自得到一份副本"""
+        seen = set()
+        ordered = []
+        for key in keys:
+            ordered.append(copy.deepcopy(results[key]) if key in seen else results[key])
+            seen.add(key)
+        return ordered
+
+    def _fetch_batch(self, chunk: List[CompatibilityKey]) -> Dict[CompatibilityKey, Dict[str, Any]]:
+        """批量请求一个分块，失败或熔断时整块降级"""
+        if not self._begin_call():
+            return self._fallback_batch(chunk, CircuitOpenError(f"熔断器 {self.breaker.name} 已打开"))
+        try:
+            results = self._real_query_batch(chunk)
+        except Exception as e:
+            self._end_call(e)
+            return self._fallback_batch(chunk, e)
+        except BaseException:
+            self._release_call()
+            raise
+        self._end_call(None)
+        return self._remember_batch(chunk, results)
+
+    async def _afetch_batch(self, chunk: List[CompatibilityKey]) -> Dict[CompatibilityKey, Dict[str, Any]]:
+        """_fetch_batch 的异步版本"""
+        if not self._begin_call():
+            return self._fallback_batch(chunk, CircuitOpenError(f"熔断器 {self.breaker.name} 已打开"))
+        try:
+            results = await self._areal_query_batch(chunk)
+        except Exception as e:
+            self._end_call(e)
+            return self._fallback_batch(chunk, e)
+        except BaseException:
+            self._release_call()
+            raise
+        self._end_call(None)
+        return self._remember_batch(chunk, results)
+
+    def _remember_batch(
+        self, chunk: List[CompatibilityKey], results: List[Dict[str, Any]]
+    ) -> Dict[CompatibilityKey, Dict[str, Any]]:
+        if self.batch_cache is not None:
+            for key, result in zip(chunk, results):
+                cached = copy.deepcopy(result)
+                with self._batch_lock:
+                    self.batch_cache.set(key, cached)
+        return dict(zip(chunk, results))
+
+    def _fallback_batch(
+        self, chunk: List[CompatibilityKey], error: Exception
+    ) -> Dict[CompatibilityKey, Dict[str, Any]]:
+        if isinstance(error, CircuitOpenError):
+            logger.debug(f"{error}，{len(chunk)} 条批量查询直接使用模拟数据")
         else:
-            return self._real_query_compatibility(vehicle_model, controller_model, controller_brand)
+            logger.error(f"MCP 批量查询失败（{len(chunk)} 条）: {error}")
+            logger.warning("降级到模拟数据模式")
+        with self._lock:
+            self.fallbacks += len(chunk)
+        return {key: self._mock_query_compatibility(*key) for key in chunk}
+
+    def _cache_get(self, key: CompatibilityKey) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _fetch(self, key: CompatibilityKey) -> Dict[str, Any]:
+        """向后端查询并写入缓存，失败或熔断时降级到模拟数据（不缓存）"""
+        if not self._begin_call():
+            return self._fallback(key, CircuitOpenError(f"熔断器 {self.breaker.name} 已打开"))
+        try:
+            result = self._real_query_compatibility(*key)
+        except Exception as e:
+            self._end_call(e)
+            return self._fallback(key, e)
+        except BaseException:
+            self._release_call()
+            raise
+        self._end_call(None)
+        return self._remember(key, result)
+
+    async def _afetch(self, key: CompatibilityKey) -> Dict[str, Any]:
+        """_fetch 的异步版本，完成后从 in-flight 表中移除"""
+        try:
+            if not self._begin_call():
+                return self._fallback(key, CircuitOpenError(f"熔断器 {self.breaker.name} 已打开"))
+            try:
+                result = await self._areal_query_compatibility(*key)
+            except Exception as e:
+                self._end_call(e)
+                return self._fallback(key, e)
+            except BaseException:
+                self._release_call()
+                raise
+            self._end_call(None)
+            return self._remember(key, result)
+        finally:
+            with self._lock:
+                if self._async_inflight.get(key) is asyncio.current_task():
+                    del self._async_inflight[key]
+
+    def _begin_call(self) -> bool:
+        """熔断器放行时计数并返回 True"""
+        if self.breaker is not None and not self.breaker.allow():
+            return False
+        with self._lock:
+            self.backend_calls += 1
+        return True
+
+    def _end_call(self, error: Optional[Exception]) -> None:
+        """向熔断器报告调用结果（4xx 说明服务本身可用，不计为故障）"""
+        if self.breaker is None:
+            return
+        if error is None or (
+            isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500
+        ):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _release_call(self) -> None:
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def _remember(self, key: CompatibilityKey, result: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            if self.cache is not None:
+                self.cache.set(key, result)
+        return result
+
+    def _fallback(self, key: CompatibilityKey, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, CircuitOpenError):
+            logger.debug(f"{error}，直接使用模拟数据")
+        else:
+            logger.error(f"MCP 服务调用失败: {error}")
+            logger.warning("降级到模拟数据模式")
+        with self._lock:
+            self.fallbacks += 1
+        return self._mock_query_compatibility(*key)
+
+    def stats(self) -> Dict[str, Any]:
+        """后端调用、合并与缓存命中统计"""
+        with self._lock:
+            return {
+                "mode": "mock" if self.use_mock else "remote",
+                "backend_calls": self.backend_calls,
+                "coalesced": self.coalesced,
+                "fallbacks": self.fallbacks,
+                "cache": self.cache.stats() if self.cache is not None else None,
+                "batch_cache": self.batch_cache.stats() if self.batch_cache is not None else None,
+                "breaker": self.breaker.stats() if self.breaker is not None else None
+            }
     
     def _mock_query_compatibility(
         self, 
@@ -65,53 +539,10 @@ class MCPClient:
         controller_model: str,
         controller_brand: Optional[str] = None
     ) -> Dict[str, Any]:
-        """模拟查询（用于开发和测试）"""
-        
-        # 模拟数据库
-        compatibility_db = {
-            ("九号 E100", "Lingbo-72182"): {
-                "compatible": True,
-                "confidence": 0.95,
-                "reason": "该控制器型号与车型完全匹配，已在多个批次中验证",
-                "alternative": None,
-                "details": {
-                    "voltage_match": True,
-                    "power_match": True,
-                    "protocol_match": True,
-                    "tested_batches": ["2023-Q1", "2023-Q2", "2023-Q3"],
-                    "success_rate": 0.98
-                }
-            },
-            ("九号 E100", "Lingbo-72180"): {
-                "compatible": False,
-                "confidence": 0.90,
-                "reason": "该控制器型号与车型不匹配，电压规格不符",
-                "alternative": "Lingbo-72182",
-                "details": {
-                    "voltage_match": False,
-                    "power_match": True,
-                    "protocol_match": True,
-                    "issue": "电压规格：控制器60V，车型需要72V"
-                }
-            },
-            ("小牛 N1S", "Leiting-60150"): {
-                "compatible": True,
-                "confidence": 0.92,
-                "reason": "该控制器型号与车型兼容，需要注意协议设置",
-                "alternative": None,
-                "details": {
-                    "voltage_match": True,
-                    "power_match": True,
-                    "protocol_match": True,
-                    "note": "需要设置为 CAN 协议"
-                }
-            }
-        }
-        
-        # 查找匹配
-        key = (vehicle_model, controller_model)
-        if key in compatibility_db:
-            result = compatibility_db[key]
+        """离线查询：使用本地兼容性表（开发、测试及服务降级时使用）"""
+        record = get_compatibility_table().lookup(vehicle_model, controller_model)
+        if record is not None:
+            result = {field: record[field] for field in RESULT_FIELDS}
         else:
             # 默认返回未知
             result = {
@@ -125,7 +556,8 @@ class MCPClient:
                 }
             }
         
-        logger.debug(f"模拟查询结果: {json.dumps(result, ensure_ascii=False)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"模拟查询结果: {json.dumps(result, ensure_ascii=False)}")
         return result
     
     def _real_query_compatibility(
@@ -134,29 +566,67 @@ class MCPClient:
         controller_model: str,
         controller_brand: Optional[str] = None
     ) -> Dict[str, Any]:
-        """真实的 MCP 服务查询"""
-        # TODO: 实现真实的 MCP 服务调用
-        # 这里应该调用实际的 MCP 服务 API
-        
-        import requests
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/query/controller_compatibility",
-                json={
+        """真实的 MCP 服务查询，失败时抛出异常"""
+        response = self.http.post(
+            COMPATIBILITY_PATH,
+            json={
+                "vehicle_model": vehicle_model,
+                "controller_model": controller_model,
+                "controller_brand": controller_brand
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _areal_query_compatibility(
+        self,
+        vehicle_model: str,
+        controller_model: str,
+        controller_brand: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """真实的 MCP 服务查询（异步），失败时抛出异常"""
+        response = await self._async_http().post(
+            COMPATIBILITY_PATH,
+            json={
+                "vehicle_model": vehicle_model,
+                "controller_model": controller_model,
+                "controller_brand": controller_brand
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+    @staticmethod
+    def _batch_payload(chunk: List[CompatibilityKey]) -> Dict[str, Any]:
+        return {
+            "queries": [
+                {
                     "vehicle_model": vehicle_model,
                     "controller_model": controller_model,
                     "controller_brand": controller_brand
-                },
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"MCP 服务调用失败: {e}")
-            # 降级到模拟数据
-            logger.warning("降级到模拟数据模式")
-            return self._mock_query_compatibility(vehicle_model, controller_model, controller_brand)
+                }
+                for vehicle_model, controller_model, controller_brand in chunk
+            ]
+        }
+
+    @staticmethod
+    def _batch_response(chunk: List[CompatibilityKey], response: httpx.Response) -> List[Dict[str, Any]]:
+        response.raise_for_status()
+        results = response.json()["results"]
+        if len(results) != len(chunk):
+            raise ValueError(f"批量查询返回 {len(results)} 条结果，请求了 {len(chunk)} 条")
+        return results
+
+    def _real_query_batch(self, chunk: List[CompatibilityKey]) -> List[Dict[str, Any]]:
+        """真实的 MCP 批量查询，结果与 chunk 顺序一致，失败时抛出异常"""
+        response = self.http.post(COMPATIBILITY_BATCH_PATH, json=self._batch_payload(chunk))
+        return self._batch_response(chunk, response)
+
+    async def _areal_query_batch(self, chunk: List[CompatibilityKey]) -> List[Dict[str, Any]]:
+        """真实的 MCP 批量查询（异步）"""
+        response = await self._async_http().post(COMPATIBILITY_BATCH_PATH, json=self._batch_payload(chunk))
+        return self._batch_response(chunk, response)
 
 
 # 全局单例
@@ -167,11 +637,32 @@ def get_mcp_client() -> MCPClient:
     """获取 MCP 客户端单例"""
     global _mcp_client
     if _mcp_client is None:
-        # TODO: 从配置中读取 MCP 服务 URL
-        # from agent_app.settings import settings
-        # _mcp_client = MCPClient(base_url=settings.MCP_BASE_URL)
-        
-        # 目前使用模拟模式
-        _mcp_client = MCPClient(base_url=None)
+        # MCP_BASE_URL 未配置时使用模拟模式
+        _mcp_client = MCPClient(
+            base_url=settings.MCP_BASE_URL or None,
+            connect_timeout=settings.MCP_CONNECT_TIMEOUT,
+            read_timeout=settings.MCP_READ_TIMEOUT,
+            max_connections=settings.MCP_MAX_CONNECTIONS,
+            http2=settings.MCP_HTTP2,
+            batch_size=settings.MCP_BATCH_SIZE,
+            batch_concurrency=settings.MCP_BATCH_CONCURRENCY,
+            cache=CompatibilityCache(
+                max_entries=settings.MCP_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.MCP_CACHE_TTL_SECONDS,
+                negative_ttl_seconds=settings.MCP_CACHE_NEGATIVE_TTL_SECONDS
+            ) if settings.MCP_CACHE_MAX_ENTRIES > 0 else None,
+            batch_cache=CompatibilityCache(
+                max_entries=settings.MCP_BATCH_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.MCP_CACHE_TTL_SECONDS,
+                negative_ttl_seconds=settings.MCP_CACHE_NEGATIVE_TTL_SECONDS
+            ) if settings.MCP_BATCH_CACHE_MAX_ENTRIES > 0 else None,
+            breaker=CircuitBreaker(
+                "mcp",
+                window_size=settings.MCP_BREAKER_WINDOW_SIZE,
+                min_calls=settings.MCP_BREAKER_MIN_CALLS,
+                failure_rate_threshold=settings.MCP_BREAKER_FAILURE_RATE,
+                open_seconds=settings.MCP_BREAKER_OPEN_SECONDS
+            ) if settings.MCP_BREAKER_ENABLED else None
+        )
     return _mcp_client
 
@@ -0,0 +1,180 @@
+"""
+兼容性查询预取
+
+collector 判定信息完整时，车型和控制器型号就已经确定，但 step_2_match 的
+MCP 查询要等用户回答完第一步才会发起。预取器在信息完整的那一刻就在后台线程池
+中发起查询，并按会话（thread_id）挂起结果；DiagnosticAgent 执行到该工具步骤时
+直接取用，MCP 延迟被用户回答第一步的时间覆盖，不再出现在对话的关键路径上。
+
+Future 无法写入 checkpoint，预取结果保存在进程内、以 thread_id 为键；
+取用时会核对参数，车型或型号已变化的预取会被丢弃。
+
+以下预取视为无用，会被取消并计数：
+- 同一会话以新的参数重新预取（replaced）
+- 取用时参数不一致（mismatched）
+- 超过 ttl_seconds 未被取用，或会话数超出上限（expired）
+- 诊断流程结束仍未取用（discarded）
+
+已在执行的查询无法中断，取消只是丢弃其结果；查询结果仍会进入 MCPClient 的缓存。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Optional
+
+from agent_app.concurrency import get_executor
+from agent_app.settings import settings
+from agent_app.tools.mcp_client import CompatibilityKey, MCPClient, get_mcp_client
+
+logger = logging.getLogger(__name__)
+
+
+class _Prefetch:
+    __slots__ = ("key", "future", "created_at")
+
+    def __init__(self, key: CompatibilityKey, future: Future, created_at: float):
+        self.key = key
+        self.future = future
+        self.created_at = created_at
+
+
+class CompatibilityPrefetcher:
+    """
+    按会话预取兼容性查询结果
+
+    Args:
+        client: MCP 客户端；离线（模拟）模式下查询本身是本地查表，不做预取
+        ttl_seconds: 预取结果的有效期
+        max_sessions: 同时挂起的预取数上限，超出时淘汰最早的
+        executor: 执行查询的线程池，默认使用共享线程池
+    """
+
+    def __init__(
+        self,
+        client: MCPClient,
+        *,
+        ttl_seconds: float = 600,
+        max_sessions: int = 10000,
+        executor: Optional[Executor] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._executor = executor
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[str, _Prefetch]" = OrderedDict()
+
+        self.started = 0
+        self.used = 0
+        self.cancelled: Dict[str, int] = {"replaced": 0, "mismatched": 0, "expired": 0, "discarded": 0}
+
+    def start(
+        self,
+        session_id: str,
+        vehicle_model: str,
+        controller_model: str,
+        controller_brand: Optional[str] = None
+    ) -> bool:
+        """为会话发起后台查询，返回是否新发起了预取"""
+        if self.client.use_mock:
+            return False
+        key = (vehicle_model, controller_model, controller_brand)
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            existing = self._pending.get(session_id)
+            if existing is not None:
+                if existing.key == key:
+                    return False
+                del self._pending[session_id]
+                self._cancel(existing, "replaced")
+
+            executor = self._executor or get_executor()
+            future = executor.submit(self.client.query_controller_compatibility, *key)
+            self._pending[session_id] = _Prefetch(key, future, now)
+            self.started += 1
+        logger.info(f"预取兼容性查询: 会话={session_id}, 车型={vehicle_model}, 控制器={controller_model}")
+        return True
+
+    def take(
+        self,
+        session_id: str,
+        vehicle_model: str,
+        controller_model: str,
+        controller_brand: Optional[str] = None
+    ) -> Optional[Future]:
+        """取出会话的预取结果（Future），没有可用的预取时返回 None"""
+        key = (vehicle_model, controller_model, controller_brand)
+        with self._lock:
+            entry = self._pending.pop(session_id, None)
+            if entry is None:
+                return None
+            if entry.key != key:
+                self._cancel(entry, "mismatched")
+                return None
+            if self._clock() - entry.created_at > self.ttl_seconds:
+                self._cancel(entry, "expired")
+                return None
+            self.used += 1
+        return entry.future
+
+    def discard(self, session_id: str) -> None:
+        """会话不再需要预取结果（例如诊断流程已结束）"""
+        with self._lock:
+            entry = self._pending.pop(session_id, None)
+            if entry is not None:
+                self._cancel(entry, "discarded")
+
+    def _evict(self, now: float) -> None:
+        while self._pending:
+            session_id, entry = next(iter(self._pending.items()))
+            if now - entry.created_at <= self.ttl_seconds and len(self._pending) < self.max_sessions:
+                break
+            del self._pending[session_id]
+            self._cancel(entry, "expired")
+
+    def _cancel(self, entry: _Prefetch, reason: str) -> None:
+        entry.future.cancel()
+        self.cancelled[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "pending": len(self._pending),
+                "cancelled": dict(self.cancelled),
+                "hit_ratio": round(self.used / self.started, 4) if self.started else 0.0
+            }
+
+
+# 全局单例
+_prefetcher: Optional[CompatibilityPrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Optional[CompatibilityPrefetcher]:
+    """获取预取器单例，settings.MCP_PREFETCH_ENABLED 为 False 时返回 None"""
+    global _prefetcher
+    if not settings.MCP_PREFETCH_ENABLED:
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = CompatibilityPrefetcher(
+                    get_mcp_client(),
+                    ttl_seconds=settings.MCP_PREFETCH_TTL_SECONDS,
+                    max_sessions=settings.MCP_PREFETCH_MAX_SESSIONS
+                )
+    return _prefetcher
+
+
+def set_prefetcher(prefetcher: Optional[CompatibilityPrefetcher]) -> None:
+    """替换预取器（测试时使用）"""
+    global _prefetcher
+    with _prefetcher_lock:
+        _prefetcher = prefetcher